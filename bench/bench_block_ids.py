@@ -0,0 +1,132 @@
+"""
+对比按名字 hash 的 dict 存储（老的做法）和按 block id 索引的 list 存储
+
+    PYTHONPATH=. python bench/bench_block_ids.py [n_diamonds]
+"""
+
+import sys
+import time
+
+from toy_compiler.toy_ir.ssa import (
+    block_preds,
+    compute_dominator_sets,
+    compute_idom_ids,
+    dominance_frontier_ids,
+)
+
+from bench_pipeline import build_diamond_chain
+
+
+class NamedBlock:
+    """
+    模拟改之前的 BasicBlock：按名字算 hash、按名字比较
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.preds = []
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __eq__(self, other):
+        return isinstance(other, NamedBlock) and self.name == other.name
+
+
+def legacy_dominators(nodes, entry):
+    dom = {b: ({b} if b is entry else set(nodes)) for b in nodes}
+    changed = True
+    while changed:
+        changed = False
+        for b in nodes:
+            if b is entry:
+                continue
+            new_dom = set(dom[b.preds[0]]) if b.preds else set()
+            for p in b.preds[1:]:
+                new_dom &= dom[p]
+            new_dom.add(b)
+            if new_dom != dom[b]:
+                dom[b] = new_dom
+                changed = True
+    return dom
+
+
+def legacy_idom(nodes, entry, dom):
+    idom = {entry: None}
+    for b in nodes:
+        if b is entry:
+            continue
+        candidates = dom[b] - {b}
+        for d in candidates:
+            if all(other is d or d not in dom[other] for other in candidates):
+                idom[b] = d
+                break
+    return idom
+
+
+def legacy_frontier(nodes, idom):
+    df = {b: set() for b in nodes}
+    for b in nodes:
+        for p in b.preds:
+            runner = p
+            while runner != idom[b]:
+                df[runner].add(b)
+                runner = idom[runner]
+    return df
+
+
+def timeit(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    func = build_diamond_chain(n)
+    blocks = func.blocks
+
+    named = [NamedBlock(bb.name) for bb in blocks]
+    for nb, bb in zip(named, blocks):
+        nb.preds = [named[p.id] for p in bb.preds]
+    entry = named[func.entry.id]
+
+    def legacy():
+        dom = legacy_dominators(named, entry)
+        idom = legacy_idom(named, entry, dom)
+        return idom, legacy_frontier(named, idom)
+
+    def dense():
+        idom = compute_idom_ids(func)
+        return idom, dominance_frontier_ids(len(blocks), block_preds(func), idom)
+
+    t_legacy, (idom_legacy, df_legacy) = timeit(legacy)
+    t_dense, (idom_dense, df_dense) = timeit(dense)
+    t_sets, _ = timeit(lambda: compute_dominator_sets(func))
+
+    # 两边结果要一致
+    for nb, bb in zip(named, blocks):
+        expect = idom_legacy[nb]
+        assert (expect.name if expect else None) == (blocks[idom_dense[bb.id]].name if idom_dense[bb.id] >= 0 else None)
+        assert {d.name for d in df_legacy[nb]} == {blocks[d].name for d in df_dense[bb.id]}
+
+    # 单纯的查表：名字 hash 的 dict vs list 下标
+    keyed = {nb: i for i, nb in enumerate(named)}
+    indexed = list(range(len(blocks)))
+    rounds = 200
+    t_dict, _ = timeit(lambda: [keyed[nb] for _ in range(rounds) for nb in named])
+    t_list, _ = timeit(lambda: [indexed[bb.id] for _ in range(rounds) for bb in blocks])
+
+    print(f"blocks={len(blocks)}")
+    print(f"dom+idom+df  name-keyed sets: {t_legacy * 1e3:8.2f}ms")
+    print(f"idom+df      dense ids (CHK): {t_dense * 1e3:8.2f}ms  ({t_legacy / t_dense:.0f}x)")
+    print(f"dom sets     bitsets:         {t_sets * 1e3:8.2f}ms")
+    lookups = rounds * len(blocks)
+    print(f"{lookups} lookups: dict[name-hashed] {t_dict * 1e3:.2f}ms, list[id] {t_list * 1e3:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
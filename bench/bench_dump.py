@@ -0,0 +1,65 @@
+"""
+对比逐行 print 和带缓冲的 dump_function，以及 10 万 block 上的 DOT 输出
+
+    PYTHONPATH=. python bench/bench_dump.py [n_diamonds]
+"""
+
+import contextlib
+import os
+import sys
+import time
+
+from toy_compiler.toy_ir.ssa import compute_idom_ids, build_dominator_tree, build_dominance_frontier
+from toy_compiler.toy_ir.printer import dump_function, cfg_to_dot, dom_tree_to_dot
+
+from bench_pipeline import build_diamond_chain
+
+
+def legacy_print_function(func):
+    # 改之前的 print_function
+    print(f"Function {func.name}:")
+    for bb in func.blocks:
+        print(f"  Block {bb.name}:")
+        for inst in bb.insts:
+            print(f"    {inst}")
+        if bb.terminator:
+            print(f"    {bb.terminator}")
+        print(f"    succs: {[b.name for b in bb.succs]}")
+        print(f"    preds: {[b.name for b in bb.preds]}")
+
+
+def timeit(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 33334
+    func = build_diamond_chain(n)
+    print(f"blocks={len(func.blocks)}")
+
+    with open(os.devnull, "w") as null:
+        with contextlib.redirect_stdout(null):
+            t_print = timeit(lambda: legacy_print_function(func))
+        t_dump = timeit(lambda: dump_function(func, null, edges=True))
+        t_compact = timeit(lambda: dump_function(func, null, compact=True))
+        t_filter = timeit(lambda: dump_function(func, null, blocks={"entry", f"join{n - 1}"}))
+        print(f"print per line:       {t_print * 1e3:8.1f}ms")
+        print(f"dump_function edges:  {t_dump * 1e3:8.1f}ms")
+        print(f"dump_function compact:{t_compact * 1e3:8.1f}ms")
+        print(f"dump 2 blocks:        {t_filter * 1e3:8.1f}ms")
+
+        idom_ids = compute_idom_ids(func)
+        idom = {bb: func.blocks[idom_ids[bb.id]] if idom_ids[bb.id] >= 0 else None for bb in func.blocks}
+        dom_tree = build_dominator_tree(func, idom)
+        df = build_dominance_frontier(func, idom)
+
+        t_cfg = timeit(lambda: cfg_to_dot(func, null))
+        t_dom = timeit(lambda: dom_tree_to_dot(func, dom_tree, df, null))
+        print(f"cfg_to_dot:           {t_cfg * 1e3:8.1f}ms")
+        print(f"dom_tree_to_dot + df: {t_dom * 1e3:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
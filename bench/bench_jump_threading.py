@@ -0,0 +1,98 @@
+"""
+jump threading 前后解释执行的动态指令数和代码大小
+
+    PYTHONPATH=. python bench/bench_jump_threading.py [n]
+"""
+
+import sys
+import time
+
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.interpreter import interpret
+from toy_compiler.toy_ir.pipeline import optimize, count_insts
+from toy_compiler.toy_ir.jump_threading import thread_jumps
+
+
+def build_flag_chain(n: int) -> Function:
+    """
+    n 段串起来，每段：
+        c = arg shr (i % 8); br c, A, B
+        A: flag = 1; s += 1      B: flag = 0; s += 2
+        J: t = s mul 2; br flag, X, Y
+        X: s = t add 1            Y: s = t sub 1
+    flag 只在 J 的每个前驱上是常量
+    """
+    func = Function(f"flag_chain_{n}")
+    builder = IRBuilder(func)
+
+    cur = func.new_block("entry")
+    builder.set_block(cur)
+    builder.emit(Assign("s", 0))
+
+    for i in range(n):
+        A = func.new_block(f"A{i}")
+        B = func.new_block(f"B{i}")
+        J = func.new_block(f"J{i}")
+        X = func.new_block(f"X{i}")
+        Y = func.new_block(f"Y{i}")
+        nxt = func.new_block(f"next{i}")
+
+        builder.set_block(cur)
+        builder.emit(BinaryOp("shr", "c", "arg", i % 8))
+        builder.emit_terminator(Branch("c", A, B))
+
+        for bb, flag, inc in [(A, 1, 1), (B, 0, 2)]:
+            builder.set_block(bb)
+            builder.emit(Assign("flag", flag))
+            builder.emit(BinaryOp("add", "s", "s", inc))
+            builder.emit_terminator(Jump(J))
+
+        builder.set_block(J)
+        builder.emit(BinaryOp("mul", "t", "s", 2))
+        builder.emit_terminator(Branch("flag", X, Y))
+
+        builder.set_block(X)
+        builder.emit(BinaryOp("add", "s", "t", 1))
+        builder.emit_terminator(Jump(nxt))
+
+        builder.set_block(Y)
+        builder.emit(BinaryOp("sub", "s", "t", 1))
+        builder.emit_terminator(Jump(nxt))
+
+        cur = nxt
+
+    builder.set_block(cur)
+    builder.emit_terminator(Return("s"))
+    func.build_cfg()
+    return func
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * n + 1000))
+    args = [{"arg": a} for a in (0, 0b1011_0110, 255)]
+
+    print(f"{'budget':>8s} {'threaded':>8s} {'steps':>7s} {'insts':>6s} {'blocks':>6s} {'time':>9s}")
+    base = None
+    for budget in [0, n // 2, n, 4 * n]:
+        func = build_flag_chain(n)
+        construct_ssa(func)
+        optimize(func)
+
+        start = time.perf_counter()
+        threaded = thread_jumps(func, budget=budget)
+        optimize(func)
+        elapsed = time.perf_counter() - start
+
+        results = [interpret(func, a) for a in args]
+        values = [r.value for r in results]
+        if base is None:
+            base = values
+        assert values == base, (budget, values, base)
+        steps = sum(r.steps for r in results)
+        print(f"{budget:8d} {threaded:8d} {steps:7d} {count_insts(func):6d} {len(func.blocks):6d} {elapsed * 1e3:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+对比 optimize（共享 worklist）和 run_to_fixpoint（整函数反复跑）
+
+    PYTHONPATH=. python bench/bench_pipeline.py [n_diamonds]
+"""
+
+import sys
+
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.pipeline import optimize
+
+
+def build_diamond_chain(n: int) -> Function:
+    """
+    n 个菱形串起来，每个菱形的条件都依赖上一个菱形算出来的值，
+    所以整函数重跑每一轮只能往前推进一点
+    """
+    func = Function(f"diamonds_{n}")
+    builder = IRBuilder(func)
+
+    cur = func.new_block("entry")
+    builder.set_block(cur)
+    builder.emit(Assign("x", 1))
+    builder.emit(Assign("acc", "arg"))
+
+    for i in range(n):
+        then_bb = func.new_block(f"then{i}")
+        else_bb = func.new_block(f"else{i}")
+        join = func.new_block(f"join{i}")
+
+        builder.set_block(cur)
+        builder.emit_terminator(Branch("x", then_bb, else_bb))
+
+        builder.set_block(then_bb)
+        builder.emit(BinaryOp("add", "acc", "acc", i))
+        builder.emit_terminator(Jump(join))
+
+        builder.set_block(else_bb)
+        builder.emit(BinaryOp("mul", "acc", "acc", i))
+        builder.emit(Assign("x", 0))
+        builder.emit_terminator(Jump(join))
+
+        builder.set_block(join)
+        builder.emit(BinaryOp("mul", "x", "x", 1))
+        cur = join
+
+    builder.set_block(cur)
+    builder.emit_terminator(Return("acc"))
+
+    # pass 改写之后 block 的顺序通常不是拓扑序，这里直接倒过来，
+    # 列表顺序的常量传播每一轮只能往前推进一个菱形
+    func.set_blocks([func.entry] + func.blocks[:0:-1])
+    func.build_cfg()
+    return func
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * n + 1000))
+
+    func = build_diamond_chain(n)
+    construct_ssa(func)
+    baseline = build_diamond_chain(n)
+    construct_ssa(baseline)
+
+    report = optimize(func, baseline=baseline)
+    print(f"blocks={3 * n + 1} {report}")
+
+
+if __name__ == "__main__":
+    main()
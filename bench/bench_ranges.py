@@ -0,0 +1,132 @@
+"""
+常量传播之后，区间分析还能多折叠多少 branch
+
+    PYTHONPATH=. python bench/bench_ranges.py [n]
+"""
+
+import sys
+import time
+
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.pipeline import optimize
+from toy_compiler.toy_ir.ranges import fold_branches_with_ranges
+
+from bench_pipeline import build_diamond_chain
+
+
+def build_range_diamonds(n: int) -> Function:
+    """
+    x 从 1 开始，每个菱形里 x += 1 或者 x += 3，x 一直 >= 1 但不是常量，
+    除了第一个菱形（条件是入参），后面的条件 x 都恒为真
+    """
+    func = Function(f"range_diamonds_{n}")
+    builder = IRBuilder(func)
+
+    cur = func.new_block("entry")
+    builder.set_block(cur)
+    builder.emit(Assign("x", 1))
+    builder.emit(Assign("c", "arg"))
+
+    for i in range(n):
+        then_bb = func.new_block(f"then{i}")
+        else_bb = func.new_block(f"else{i}")
+        join = func.new_block(f"join{i}")
+
+        builder.set_block(cur)
+        builder.emit_terminator(Branch("c", then_bb, else_bb))
+
+        builder.set_block(then_bb)
+        builder.emit(BinaryOp("add", "x", "x", 1))
+        builder.emit_terminator(Jump(join))
+
+        builder.set_block(else_bb)
+        builder.emit(BinaryOp("add", "x", "x", 3))
+        builder.emit_terminator(Jump(join))
+
+        builder.set_block(join)
+        builder.emit(Assign("c", "x"))
+        cur = join
+
+    builder.set_block(cur)
+    builder.emit_terminator(Return("x"))
+    func.build_cfg()
+    return func
+
+
+def build_counter_loops(n: int) -> Function:
+    """
+    n 个串起来的循环，计数器从 0 开始只增不减，循环体里 i + 1 的检查恒为真
+    """
+    func = Function(f"counter_loops_{n}")
+    builder = IRBuilder(func)
+
+    cur = func.new_block("entry")
+    builder.set_block(cur)
+    builder.emit(Assign("k", "arg"))
+
+    for j in range(n):
+        H = func.new_block(f"H{j}")
+        body = func.new_block(f"body{j}")
+        cold = func.new_block(f"cold{j}")
+        latch = func.new_block(f"latch{j}")
+        exit = func.new_block(f"exit{j}")
+
+        builder.set_block(cur)
+        builder.emit(Assign("i", 0))
+        builder.emit_terminator(Jump(H))
+
+        builder.set_block(H)
+        builder.emit(BinaryOp("sub", "k", "k", 1))
+        builder.emit_terminator(Branch("k", body, exit))
+
+        builder.set_block(body)
+        builder.emit(BinaryOp("add", "t", "i", 1))
+        builder.emit_terminator(Branch("t", latch, cold))
+
+        builder.set_block(cold)
+        builder.emit(Assign("i", -1))
+        builder.emit_terminator(Jump(latch))
+
+        builder.set_block(latch)
+        builder.emit(BinaryOp("add", "i", "i", 1))
+        builder.emit_terminator(Jump(H))
+
+        cur = exit
+
+    builder.set_block(cur)
+    builder.emit_terminator(Return("k"))
+    func.build_cfg()
+    return func
+
+
+def count_branches(func: Function) -> int:
+    return sum(isinstance(bb.terminator, Branch) for bb in func.blocks)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * n + 1000))
+
+    print(f"{'cfg':24s} {'branches':>8s} {'after cp':>8s} {'ranges':>7s} {'blocks':>13s} {'time':>9s}")
+    for build in [build_diamond_chain, build_range_diamonds, build_counter_loops]:
+        func = build(n)
+        branches = count_branches(func)
+        construct_ssa(func)
+        optimize(func)
+        after_cp = count_branches(func)
+        blocks = len(func.blocks)
+
+        start = time.perf_counter()
+        folded = fold_branches_with_ranges(func)
+        elapsed = time.perf_counter() - start
+        optimize(func)
+
+        print(
+            f"{func.name:24s} {branches:8d} {after_cp:8d} {folded:7d} "
+            f"{blocks:6d}->{len(func.blocks):<6d} {elapsed * 1e3:7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+编译服务的压测，server 和 client 都在本机
+
+    PYTHONPATH=. python bench/bench_service.py --clients 8 --requests 200 --workers 4
+    PYTHONPATH=. python bench/bench_service.py --tcp
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from toy_compiler.toy_ir.serialize import function_to_dict
+from toy_compiler.service.server import CompileServer, LatencyHistogram
+from toy_compiler.service.client import CompileClient
+
+from bench_pipeline import build_diamond_chain
+
+
+async def producer(client: CompileClient, payloads: list[dict], hist: LatencyHistogram, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(data):
+        async with sem:
+            start = time.perf_counter()
+            await client.compile_dict(data)
+            hist.record(time.perf_counter() - start)
+
+    await asyncio.gather(*[one(data) for data in payloads])
+
+
+async def run(args):
+    server = CompileServer(
+        workers=args.workers,
+        max_queue=args.max_queue,
+        batch_size=args.batch_size,
+        batch_timeout=args.batch_timeout,
+        use_processes=not args.threads,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.tcp:
+            await server.start_tcp("127.0.0.1", 0)
+        else:
+            await server.start_unix(os.path.join(tmp, "compile.sock"))
+
+        async def connect():
+            if args.tcp:
+                return await CompileClient.connect_tcp(*server.address)
+            return await CompileClient.connect_unix(server.address)
+
+        try:
+            # 不同大小的函数混在一起
+            payloads = [function_to_dict(build_diamond_chain(1 + i % args.max_size)) for i in range(args.requests)]
+            clients = [await connect() for _ in range(args.clients)]
+
+            # 预热 worker
+            await clients[0].compile_dict(payloads[0])
+
+            hist = LatencyHistogram()
+            start = time.perf_counter()
+            await asyncio.gather(
+                *[producer(c, payloads, hist, args.concurrency) for c in clients],
+            )
+            elapsed = time.perf_counter() - start
+
+            stats = await clients[0].stats()
+            for c in clients:
+                await c.close()
+        finally:
+            await server.close()
+
+    total = args.clients * args.requests
+    print(f"{total} requests in {elapsed:.3f}s, {total / elapsed:.1f} req/s")
+    client_lat = hist.to_dict()
+    print(
+        f"client latency: mean={client_lat['mean'] * 1e3:.2f}ms p50<={client_lat['p50'] * 1e3:.2f}ms "
+        f"p99<={client_lat['p99'] * 1e3:.2f}ms max={client_lat['max'] * 1e3:.2f}ms"
+    )
+    print(f"server: batches={stats['batches']} mean_batch_size={stats['mean_batch_size']:.2f}")
+    for key in ["latency", "queue_wait", "compile_time"]:
+        h = stats[key]
+        print(
+            f"  {key:12s} mean={h['mean'] * 1e3:.2f}ms p50<={h['p50'] * 1e3:.2f}ms "
+            f"p90<={h['p90'] * 1e3:.2f}ms p99<={h['p99'] * 1e3:.2f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="每个 client 发的请求数")
+    parser.add_argument("--concurrency", type=int, default=32, help="每个 client 同时在途的请求数")
+    parser.add_argument("--max-size", type=int, default=20, help="函数里菱形的最大个数")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--batch-timeout", type=float, default=0.002)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--threads", action="store_true", help="用线程池代替进程池")
+    parser.add_argument("--tcp", action="store_true", help="走 127.0.0.1 而不是 unix socket")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
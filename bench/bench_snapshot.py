@@ -0,0 +1,70 @@
+"""
+对比 deepcopy、clone_function 和 copy-on-write snapshot 的开销
+
+    PYTHONPATH=. python bench/bench_snapshot.py [n_diamonds]
+"""
+
+import copy
+import sys
+import time
+
+from toy_compiler.toy_ir.non_ssa_ir import Branch, Jump
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.pipeline import optimize
+from toy_compiler.toy_ir.snapshot import Snapshot, clone_function
+
+from bench_pipeline import build_diamond_chain
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def fold_first_branch(func):
+    bb = next(bb for bb in func.blocks if isinstance(bb.terminator, Branch))
+    func.replace_terminator(bb, Jump(bb.terminator.true_bb))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # deepcopy 和 rename_ssa 都是递归的
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 50 * n + 1000))
+
+    func = build_diamond_chain(n)
+    construct_ssa(func)
+    print(f"{func.name}: {len(func.blocks)} blocks, {sum(len(bb.insts) for bb in func.blocks)} insts")
+
+    _, t_deep = timed(lambda: copy.deepcopy(func))
+    _, t_clone = timed(lambda: clone_function(func))
+    print(f"{'deepcopy':28s} {t_deep * 1e3:9.2f}ms")
+    print(f"{'clone_function':28s} {t_clone * 1e3:9.2f}ms  ({t_deep / t_clone:.1f}x)")
+
+    # 只改一个 block 再回滚
+    def local_change():
+        snap = Snapshot(func)
+        fold_first_branch(func)
+        touched = snap.touched
+        snap.rollback()
+        return touched
+
+    touched, t_local = timed(local_change)
+    print(f"{'snapshot+local+rollback':28s} {t_local * 1e3:9.2f}ms  (touched {touched} blocks)")
+
+    # 整个 optimize 再回滚，和先 clone 再在副本上跑对比
+    def full_change():
+        snap = Snapshot(func)
+        optimize(func)
+        touched = snap.touched
+        snap.rollback()
+        return touched
+
+    touched, t_full = timed(full_change)
+    _, t_clone_opt = timed(lambda: optimize(clone_function(func)))
+    print(f"{'snapshot+optimize+rollback':28s} {t_full * 1e3:9.2f}ms  (touched {touched} blocks)")
+    print(f"{'clone+optimize':28s} {t_clone_opt * 1e3:9.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
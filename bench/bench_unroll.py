@@ -0,0 +1,79 @@
+"""
+循环展开前后解释执行的动态指令数和代码大小
+
+    PYTHONPATH=. python bench/bench_unroll.py [trips]
+"""
+
+import sys
+import time
+
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.interpreter import interpret
+from toy_compiler.toy_ir.pipeline import optimize, count_insts
+from toy_compiler.toy_ir.loops import unroll_loops
+
+
+def build_accumulate(trips: int | None) -> Function:
+    """
+    i = trips（None 时是入参 n）; s = 0
+    while i: s = s * 3 + x; i -= 1
+    return s
+    """
+    func = Function(f"accumulate_{trips if trips is not None else 'n'}")
+    entry = func.new_block("entry")
+    H = func.new_block("H")
+    body = func.new_block("body")
+    exit = func.new_block("exit")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit(Assign("i", "n" if trips is None else trips))
+    builder.emit(Assign("s", 0))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(H)
+    builder.emit_terminator(Branch("i", body, exit))
+
+    builder.set_block(body)
+    builder.emit(BinaryOp("mul", "s", "s", 3))
+    builder.emit(BinaryOp("add", "s", "s", "x"))
+    builder.emit(BinaryOp("sub", "i", "i", 1))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(exit)
+    builder.emit_terminator(Return("s"))
+    func.build_cfg()
+    return func
+
+
+def main():
+    trips = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    args = {"n": trips, "x": 5}
+
+    print(f"{'cfg':18s} {'mode':>9s} {'steps':>7s} {'insts':>6s} {'blocks':>6s} {'time':>9s}")
+    for count in [trips, None]:
+        base = None
+        for mode, factor in [("none", 0), ("x2", 2), ("x4", 4), ("full-only", 1)]:
+            func = build_accumulate(count)
+            construct_ssa(func)
+            optimize(func)
+
+            start = time.perf_counter()
+            if factor:
+                unroll_loops(func, factor=factor)
+                optimize(func)
+            elapsed = time.perf_counter() - start
+
+            result = interpret(func, args)
+            if base is None:
+                base = result.value
+            assert result.value == base, (mode, result.value, base)
+            print(
+                f"{func.name:18s} {mode:>9s} {result.steps:7d} {count_insts(func):6d} "
+                f"{len(func.blocks):6d} {elapsed * 1e3:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+对比老的 verify_function 和分级的 verifier
+
+    PYTHONPATH=. python bench/bench_verifier.py [n_diamonds]
+"""
+
+import sys
+import time
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, Phi, Branch, Jump
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.snapshot import Snapshot
+from toy_compiler.toy_ir.verifier import FULL, STRUCTURAL, collect_errors
+
+from bench_pipeline import build_diamond_chain
+
+
+def legacy_verify(func: Function):
+    """
+    改之前的 verify_function（去掉了 print）：按列表顺序查 use，
+    terminator 的目标用 `in func.blocks` 线性查找
+    """
+    errors = []
+    for bb in func.blocks:
+        if bb.terminator is None:
+            errors.append(f"Block {bb.name} has no terminator")
+        for succ in bb.succs:
+            if bb not in succ.preds:
+                errors.append(f"CFG inconsistency: {bb.name} -> {succ.name} missing back-edge")
+
+    seen_vars = set()
+    for bb in func.blocks:
+        for inst in bb.insts:
+            for v in inst.defs():
+                if v in seen_vars:
+                    errors.append(f"Variable {v} redefined in {bb.name}")
+                else:
+                    seen_vars.add(v)
+
+    for bb in func.blocks:
+        for inst in bb.insts:
+            if isinstance(inst, Phi):
+                for pred_bb in inst.incomings:
+                    if pred_bb not in bb.preds:
+                        errors.append(f"Phi {inst.dst} in {bb.name} has incoming from non-pred {pred_bb}")
+
+    defined_vars = set()
+    for bb in func.blocks:
+        for inst in bb.insts:
+            for v in inst.uses():
+                if v not in defined_vars:
+                    errors.append(f"Use of undefined variable {v} in {bb.name}")
+            defined_vars.update(inst.defs())
+
+    for bb in func.blocks:
+        term = bb.terminator
+        if isinstance(term, Jump) and term.target not in func.blocks:
+            errors.append(f"Jump to non-existent block {term.target}")
+        if isinstance(term, Branch):
+            for target in [term.true_bb, term.false_bb]:
+                if target not in func.blocks:
+                    errors.append(f"Branch to non-existent block {target}")
+    return errors
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * n + 1000))
+
+    func = build_diamond_chain(n)
+    construct_ssa(func)
+    print(f"{func.name}: {len(func.blocks)} blocks")
+
+    # 入参 c 在老的 verifier 里算未定义
+    errors, t = timed(lambda: legacy_verify(func))
+    print(f"{'legacy':18s} {t * 1e3:9.2f}ms  errors={len(errors)}")
+    for level in [STRUCTURAL, FULL]:
+        errors, t = timed(lambda: collect_errors(func, level))
+        print(f"{level:18s} {t * 1e3:9.2f}ms  errors={len(errors)}")
+
+    # 只改一个 block，增量校验 pass 动过的 block
+    snap = Snapshot(func)
+    bb = next(bb for bb in func.blocks if isinstance(bb.terminator, Branch))
+    func.replace_terminator(bb, Jump(bb.terminator.true_bb))
+    modified, removed = snap.modified(), snap.removed_defs()
+    snap.rollback()
+    for level in [STRUCTURAL, FULL]:
+        errors, t = timed(lambda: collect_errors(func, level, modified, removed))
+        print(f"{level + ' (incr)':18s} {t * 1e3:9.2f}ms  errors={len(errors)}  blocks={len(modified)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import random
+
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+
+VARS = ["a", "b", "c", "d"]
+OPS = ["add", "sub", "mul", "shr", "shl"]
+# 入参，生成的函数里不会给它们赋值
+ARGS = [dict(x=x, y=y) for x in (0, 1, 5) for y in (0, 3)]
+
+
+def build_random_function(seed: int, size: int = 12) -> Function:
+    """
+    随机生成一个结构化的非 SSA 函数：赋值、BinaryOp、if/else 和计数循环嵌套，
+    分支条件有时是常量，方便触发折叠和合并；循环都是常量次数，一定会结束
+    """
+    rng = random.Random(seed)
+    func = Function(f"random_{seed}")
+    builder = IRBuilder(func)
+    counter = 0
+
+    def operand():
+        if rng.random() < 0.3:
+            return rng.randint(0, 3)
+        return rng.choice(VARS)
+
+    def new_block(kind):
+        nonlocal counter
+        counter += 1
+        return func.new_block(f"b{counter}_{kind}")
+
+    def emit_stmts(budget, depth):
+        while budget > 0:
+            r = rng.random()
+            if depth < 2 and r < 0.15:
+                budget -= emit_loop(depth)
+            elif depth < 3 and r < 0.35:
+                budget -= emit_if(depth)
+            elif r < 0.55:
+                builder.emit(Assign(rng.choice(VARS), operand()))
+                budget -= 1
+            else:
+                op = rng.choice(OPS)
+                src2 = rng.randint(0, 2) if op in ("shr", "shl") else operand()
+                builder.emit(BinaryOp(op, rng.choice(VARS), operand(), src2))
+                budget -= 1
+
+    def emit_if(depth):
+        then, other, join = new_block("then"), new_block("else"), new_block("join")
+        cond = rng.choice(VARS)
+        if rng.random() < 0.3:
+            builder.emit(Assign(cond, rng.randint(0, 1)))
+        builder.emit_terminator(Branch(cond, then, other))
+        for bb in [then, other]:
+            builder.set_block(bb)
+            emit_stmts(rng.randint(0, 3), depth + 1)
+            builder.emit_terminator(Jump(join))
+        builder.set_block(join)
+        return 3
+
+    def emit_loop(depth):
+        i = f"i{counter}"
+        header, body, exit = new_block("header"), new_block("body"), new_block("exit")
+        builder.emit(Assign(i, rng.randint(0, 3)))
+        builder.emit_terminator(Jump(header))
+        builder.set_block(header)
+        builder.emit_terminator(Branch(i, body, exit))
+        builder.set_block(body)
+        emit_stmts(rng.randint(1, 4), depth + 1)
+        builder.emit(BinaryOp("sub", i, i, 1))
+        builder.emit_terminator(Jump(header))
+        builder.set_block(exit)
+        return 4
+
+    builder.set_block(func.new_block("b0"))
+    builder.emit(Assign("a", "x"))
+    builder.emit(Assign("b", "y"))
+    builder.emit(Assign("c", rng.randint(0, 3)))
+    builder.emit(Assign("d", rng.randint(0, 3)))
+    emit_stmts(size, 0)
+    builder.emit(BinaryOp("add", "r", "a", "b"))
+    builder.emit(BinaryOp("add", "r", "r", "c"))
+    builder.emit(BinaryOp("add", "r", "r", "d"))
+    builder.emit_terminator(Return("r"))
+
+    func.build_cfg()
+    return func
@@ -0,0 +1,36 @@
+from toy_compiler.toy_ir.ssa import compute_dominator_sets, compute_idom, compute_idom_ids
+from toy_compiler.toy_ir.non_ssa_ir import Jump
+from toy_compiler.toy_ir.transformers import remove_unreachable_blocks, simplify_cfg
+
+from test_non_ssa_ir_build import build_complex_function
+from test_pipeline import build_dead_loop_function
+
+
+def check_dense(func):
+    assert [bb.id for bb in func.blocks] == list(range(len(func.blocks)))
+
+
+def test_idom_ids_match_dominator_sets():
+    for build in [build_complex_function, build_dead_loop_function]:
+        func = build()
+        check_dense(func)
+
+        idom = compute_idom(func, compute_dominator_sets(func))
+        idom_ids = compute_idom_ids(func)
+        for bb in func.blocks:
+            expect = idom[bb].id if idom[bb] is not None else -1
+            assert idom_ids[bb.id] == expect
+
+
+def test_ids_stay_dense_after_removal():
+    func = build_dead_loop_function()
+    H, exit = func.blocks[1], func.blocks[3]
+    H.terminator = Jump(exit)
+    func.build_cfg()
+    remove_unreachable_blocks(func)
+    assert [bb.name for bb in func.blocks] == ["entry", "H", "exit"]
+    check_dense(func)
+
+    simplify_cfg(func)
+    check_dense(func)
+    assert len(compute_idom_ids(func)) == len(func.blocks)
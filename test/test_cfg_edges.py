@@ -0,0 +1,110 @@
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa, verify_function
+from toy_compiler.toy_ir.interpreter import interpret
+
+from test_profiling import build_loop_function
+
+
+def build_critical_function():
+    # entry -> J 是 critical edge：entry 有两个后继，J 有两个前驱
+    func = Function("critical")
+    entry = func.new_block("entry")
+    L = func.new_block("L")
+    J = func.new_block("J")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit(Assign("x", 1))
+    builder.emit_terminator(Branch("c", L, J))
+
+    builder.set_block(L)
+    builder.emit(BinaryOp("add", "x", "x", 10))
+    builder.emit_terminator(Jump(J))
+
+    builder.set_block(J)
+    builder.emit_terminator(Return("x"))
+
+    func.build_cfg()
+    return func
+
+
+def cfg_snapshot(func):
+    # 重建之后 preds 按 block 顺序排，只比较多重集合
+    return {bb.name: ([s.name for s in bb.succs], sorted(p.name for p in bb.preds)) for bb in func.blocks}
+
+
+def check_cfg(func):
+    # 增量改出来的 CFG 要和从 terminator 重建的一致，phi 要和 preds 对齐
+    for bb in func.blocks:
+        for phi in bb.phis():
+            assert list(phi.incomings) == list(bb.preds.unique())
+    before = cfg_snapshot(func)
+    func.build_cfg()
+    assert cfg_snapshot(func) == before
+
+
+def test_split_critical_edges():
+    func = build_critical_function()
+    construct_ssa(func)
+    entry, L, J = func.blocks
+
+    added = func.split_critical_edges()
+    assert [bb.name for bb in added] == ["entry.J"]
+    mid = added[0]
+    assert mid.id == 3
+    assert [s.name for s in entry.succs] == ["L", "entry.J"]
+    # 新 block 占住 entry 原来的位置
+    assert [p.name for p in J.preds] == ["entry.J", "L"]
+    assert str(J.insts[0]) == "x_2 = phi(entry.J: x_0, L: x_1)"
+
+    check_cfg(func)
+    verify_function(func)
+    assert interpret(func, {"c": 0}).value == 1
+    assert interpret(func, {"c": 1}).value == 11
+
+
+def test_duplicate_edges_and_replace_terminator():
+    func = build_critical_function()
+    entry, L, J = func.blocks
+    func.replace_terminator(entry, Branch("c", J, J))
+    assert [p.name for p in J.preds] == ["entry", "entry", "L"]
+    assert not L.preds
+
+    mid = func.split_edge(entry, J)
+    assert str(entry.terminator) == f"br c, {mid.name}, {mid.name}"
+    assert len(entry.succs) == 2 and len(mid.preds) == 2
+    assert len(J.preds) == 2
+    check_cfg(func)
+
+
+def test_split_edge_names_and_indexing():
+    func = build_critical_function()
+    entry, L, J = func.blocks
+    L.name = "entry.J"
+    assert [p.name for p in J.preds] == ["entry", "entry.J"]
+
+    # 默认名字和已有的 block 重名时加后缀
+    mid = func.split_edge(entry, J)
+    assert mid.name == "entry.J_1"
+    assert len({bb.name for bb in func.blocks}) == len(func.blocks)
+
+    # 下标访问的缓存在边变了之后作废
+    assert J.preds[0] is mid and J.preds[-1] is L
+    J.preds.add(entry)
+    assert J.preds[-1] is entry and len(J.preds) == 3
+    J.preds.remove(entry)
+    assert J.preds[1] is L and J.preds[0:1] == [mid]
+
+
+def test_remove_edge_drops_phi_incoming():
+    func = build_loop_function()
+    construct_ssa(func)
+    H = next(bb for bb in func.blocks if bb.name == "H")
+    latch = next(bb for bb in func.blocks if bb.name == "latch")
+
+    dropped = func.replace_terminator(latch, Return(0))
+    assert {phi.dst for phi, _ in dropped} == {phi.dst for phi in H.phis()}
+    assert [p.name for p in H.preds] == ["entry"]
+    for phi in H.phis():
+        assert list(phi.incomings) == list(H.preds.unique())
+    check_cfg(func)
@@ -0,0 +1,91 @@
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa, compute_dominator_sets, compute_idom, compute_idom_ids, dominator_analysis
+from toy_compiler.toy_ir.dataflow import LiveVariables, compute_liveness, solve_function
+from toy_compiler.toy_ir.postdom import build_reverse_cfg, compute_post_dominator_sets, compute_ipdom
+from toy_compiler.toy_ir.transformers import ConstantPropagation, constant_propagation
+
+from test_non_ssa_ir_build import build_complex_function
+from test_profiling import build_loop_function
+
+
+def test_dominators_on_framework():
+    func = build_loop_function()
+    idom = compute_idom(func, compute_dominator_sets(func))
+    idom_ids = compute_idom_ids(func)
+    assert [idom[bb].id if idom[bb] else -1 for bb in func.blocks] == idom_ids
+
+
+def test_straight_line_dominators():
+    # entry -> B：B 的 dom 集合正好是全集，不能当成走不到
+    func = Function("straight")
+    entry = func.new_block("entry")
+    B = func.new_block("B")
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit_terminator(Jump(B))
+    builder.set_block(B)
+    builder.emit_terminator(Return(0))
+    func.build_cfg()
+
+    dom = compute_dominator_sets(func)
+    assert dom == {entry: {entry}, B: {entry, B}}
+    assert compute_idom(func, dom) == {entry: None, B: entry}
+
+    rcfg = build_reverse_cfg(func)
+    pdom = compute_post_dominator_sets(func, rcfg)
+    assert pdom[entry] == {entry, B, rcfg.exit}
+    assert pdom[B] == {B, rcfg.exit}
+    assert compute_ipdom(func, rcfg, pdom) == {entry: B, B: rcfg.exit, rcfg.exit: None}
+
+
+def test_worklist_matches_round_robin():
+    func = build_complex_function()
+    # 倒过来排，按列表顺序扫要多跑好几轮
+    func.set_blocks([func.entry] + func.blocks[:0:-1])
+    construct_ssa(func)
+
+    for analysis in [dominator_analysis(len(func.blocks), func.entry.id), LiveVariables(func)]:
+        old = solve_function(func, analysis, worklist=False)
+        new = solve_function(func, analysis)
+        assert old.ins == new.ins and old.outs == new.outs
+        assert new.visits == len(func.blocks)
+        assert old.visits > new.visits
+
+    # 稀疏的常量传播：C 走不到，其余 block 各算一次
+    old = solve_function(func, ConstantPropagation(func), worklist=False)
+    new = solve_function(func, ConstantPropagation(func))
+    assert old.values == new.values and old.ins == new.ins and old.outs == new.outs
+    assert new.visits == len(func.blocks) - 1
+    assert old.visits > new.visits
+
+
+def test_conditional_constants():
+    # split 的条件是常量 1，C 走不到，D 里 x 的 phi 只看 B 这一边
+    func = build_complex_function()
+    construct_ssa(func)
+    env = constant_propagation(func)
+    assert env["y_0"] == 3
+    assert env["k_0"] == 2
+
+    # block 顺序倒过来结果一样，C 始终不可执行
+    rev = build_complex_function()
+    rev.set_blocks([rev.entry] + rev.blocks[:0:-1])
+    construct_ssa(rev)
+    result = solve_function(rev, ConstantPropagation(rev))
+    assert {v: c for v, c in result.values.items() if c is not None} == env
+    assert [bb.name for bb in rev.blocks if result.ins[bb.id] is None] == ["C"]
+
+
+def test_liveness():
+    func = build_loop_function()
+    construct_ssa(func)
+    live_in, live_out = compute_liveness(func)
+    names = {bb.name: bb.id for bb in func.blocks}
+
+    # insert_phi 没有按活跃性剪枝，H 里有一个用到入口处 c 的 phi
+    assert live_in[names["entry"]] == {"c", "n"}
+    assert live_in[names["H"]] == set()
+    assert live_out[names["H"]] == {"i_1", "sum_1"}
+    assert live_in[names["exit"]] == {"sum_1"}
+    # latch 结尾活着的是 H 里 phi 要用的值
+    assert live_out[names["latch"]] == {"c_1", "i_2", "sum_3"}
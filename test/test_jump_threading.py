@@ -0,0 +1,107 @@
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.interpreter import interpret
+from toy_compiler.toy_ir.pipeline import optimize
+from toy_compiler.toy_ir.jump_threading import branch_phi, thread_jumps
+from toy_compiler.toy_ir.transformers import rewrite_constants
+from toy_compiler.toy_ir.serialize import dumps, loads
+
+
+def build_flag_join():
+    """
+    a: f = 1, x = 10   b: f = 0, x = 20   c: f = p, x = 30
+    J: y = x add 1; br f, T, F
+    T: return y       F: return y add 100
+    """
+    func = Function("flag_join")
+    entry = func.new_block("entry")
+    sel = func.new_block("sel")
+    A = func.new_block("A")
+    B = func.new_block("B")
+    C = func.new_block("C")
+    J = func.new_block("J")
+    T = func.new_block("T")
+    F = func.new_block("F")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit_terminator(Branch("a", A, sel))
+
+    builder.set_block(sel)
+    builder.emit_terminator(Branch("b", B, C))
+
+    for bb, f, x in [(A, 1, 10), (B, 0, 20), (C, "p", 30)]:
+        builder.set_block(bb)
+        builder.emit(Assign("f", f))
+        builder.emit(Assign("x", x))
+        builder.emit_terminator(Jump(J))
+
+    builder.set_block(J)
+    builder.emit(BinaryOp("add", "y", "x", 1))
+    builder.emit_terminator(Branch("f", T, F))
+
+    builder.set_block(T)
+    builder.emit_terminator(Return("y"))
+
+    builder.set_block(F)
+    builder.emit(BinaryOp("add", "y", "y", 100))
+    builder.emit_terminator(Return("y"))
+
+    func.build_cfg()
+    return func
+
+
+ARGS = [dict(a=a, b=b, p=p) for a in (0, 1) for b in (0, 1) for p in (0, 1)]
+
+
+def run_all(func):
+    return [interpret(func, args) for args in ARGS]
+
+
+def test_thread_constant_preds():
+    func = build_flag_join()
+    construct_ssa(func)
+    optimize(func)
+    expected = run_all(func)
+
+    J = next(bb for bb in func.blocks if bb.name == "J")
+    assert branch_phi(J) is not None
+
+    # A、B 两个前驱上 f 是常量，C 上不是
+    assert thread_jumps(func) == 2
+    assert [p.name for p in J.preds] == ["C"]
+    results = run_all(func)
+    assert [r.value for r in results] == [r.value for r in expected]
+
+    optimize(func)
+    results = run_all(func)
+    assert [r.value for r in results] == [r.value for r in expected]
+    # 走 A / B 的路径省掉了 phi 和 branch
+    assert all(r.steps <= e.steps for r, e in zip(results, expected))
+    assert any(r.steps < e.steps for r, e in zip(results, expected))
+
+
+def test_budget():
+    func = build_flag_join()
+    construct_ssa(func)
+    optimize(func)
+    expected = run_all(func)
+
+    assert thread_jumps(func, budget=1) == 1
+    assert [r.value for r in run_all(func)] == [r.value for r in expected]
+    assert thread_jumps(func, block_limit=0) == 0
+
+
+def test_repeated_runs_keep_names_unique():
+    func = build_flag_join()
+    construct_ssa(func)
+    rewrite_constants(func)
+    expected = run_all(func)
+
+    # 每次只复制一个，两次都会从 t1 开始编号
+    assert thread_jumps(func, budget=1) == 1
+    assert thread_jumps(func, budget=1) == 1
+    names = [bb.name for bb in func.blocks]
+    assert len(set(names)) == len(names)
+    copy = loads(dumps(func))
+    assert [r.value for r in run_all(copy)] == [r.value for r in expected]
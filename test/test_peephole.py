@@ -0,0 +1,72 @@
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, BinaryOp, Return
+from toy_compiler.toy_ir.peephole import peephole, register_rule, PEEPHOLE_RULES
+from toy_compiler.toy_ir.transformers import eval_binary
+
+
+def build_peephole_function(insts):
+    func = Function("peephole")
+    entry = func.new_block("entry")
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    for inst in insts:
+        builder.emit(inst)
+    builder.emit_terminator(Return("x"))
+    func.build_cfg()
+    return func
+
+
+def test_peephole_rules():
+    func = build_peephole_function(
+        [
+            BinaryOp("add", "a", "x", 0),
+            BinaryOp("add", "b", 0, "x"),
+            BinaryOp("sub", "c", "x", "x"),
+            BinaryOp("mul", "d", "x", 1),
+            BinaryOp("mul", "e", 0, "x"),
+            BinaryOp("div", "f", "x", 1),
+            BinaryOp("mul", "g", "x", 8),
+            BinaryOp("mul", "h", 4, "x"),
+            BinaryOp("div", "i", "x", 16),
+            BinaryOp("mul", "j", "x", 3),
+        ]
+    )
+
+    assert peephole(func)
+    insts = [str(inst) for inst in func.entry.insts]
+    assert insts == [
+        "a = x",
+        "b = x",
+        "c = 0",
+        "d = x",
+        "e = 0",
+        "f = x",
+        "g = x shl 3",
+        "h = x shl 2",
+        "i = x shr 4",
+        "j = x mul 3",
+    ]
+
+    # 已经是不动点
+    assert not peephole(func)
+
+
+def test_shift_matches_mul_div():
+    for x in [-17, -8, -1, 0, 1, 7, 8, 100]:
+        for k in range(5):
+            assert eval_binary("shl", x, k) == eval_binary("mul", x, 1 << k)
+            assert eval_binary("shr", x, k) == eval_binary("div", x, 1 << k)
+
+
+def test_register_rule():
+    @register_rule("mul")
+    def mul_neg_one(inst):
+        if inst.src2 == -1:
+            return BinaryOp("sub", inst.dst, 0, inst.src1)
+        return None
+
+    try:
+        func = build_peephole_function([BinaryOp("mul", "a", "x", -1)])
+        assert peephole(func)
+        assert str(func.entry.insts[0]) == "a = 0 sub x"
+    finally:
+        PEEPHOLE_RULES["mul"].remove(mul_neg_one)
@@ -0,0 +1,126 @@
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return, Phi
+from toy_compiler.toy_ir.ssa import construct_ssa, verify_function
+from toy_compiler.toy_ir.pipeline import optimize, run_to_fixpoint, count_insts, compile_function
+from toy_compiler.toy_ir.interpreter import interpret
+from toy_compiler.toy_ir.transformers import cleanup_phi_nodes
+
+from test_non_ssa_ir_build import build_complex_function
+from test_unroll import build_sum_loop
+from random_ir import ARGS, build_random_function
+
+
+def dump(func):
+    lines = []
+    for bb in func.blocks:
+        lines.append(bb.name)
+        lines.extend(str(inst) for inst in bb.insts)
+        lines.append(str(bb.terminator))
+    return lines
+
+
+def build_dead_loop_function():
+    # entry -> H <-> body, H -> exit；循环变量 i 算完之后没人用
+    func = Function("dead_loop")
+    entry = func.new_block("entry")
+    H = func.new_block("H")
+    body = func.new_block("body")
+    exit = func.new_block("exit")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit(Assign("i", 0))
+    builder.emit(Assign("c", 0))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(H)
+    builder.emit_terminator(Branch("c", body, exit))
+
+    builder.set_block(body)
+    builder.emit(BinaryOp("add", "i", "i", 1))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(exit)
+    builder.emit(BinaryOp("mul", "r", "n", 2))
+    builder.emit_terminator(Return("r"))
+
+    func.build_cfg()
+    return func
+
+
+def test_optimize_matches_fixpoint_loop():
+    for build in [build_complex_function, build_dead_loop_function]:
+        expected = build()
+        construct_ssa(expected)
+        run_to_fixpoint(expected)
+
+        func = build()
+        construct_ssa(func)
+        baseline = build()
+        construct_ssa(baseline)
+        report = optimize(func, baseline=baseline)
+
+        assert not report.hit_limit
+        assert report.rerun_rounds >= 2
+        assert report.time_saved is not None
+        assert count_insts(func) <= count_insts(expected)
+        assert dump(func) == dump(expected)
+
+
+def test_optimize_complex_result():
+    func = build_complex_function()
+    construct_ssa(func)
+    optimize(func)
+
+    verify_function(func)
+    assert dump(func) == ["entry", "return 3"]
+
+
+def test_optimize_step_limit():
+    func = build_complex_function()
+    construct_ssa(func)
+    report = optimize(func, max_steps=3)
+
+    assert report.hit_limit
+    assert report.iterations == 3
+
+
+def test_simplified_phi_stays_after_phis():
+    # jump threading 之后有的 phi 化简成赋值，赋值不能留在剩下的 phi 前面
+    func = build_sum_loop(5)
+    compile_function(func)
+    for bb in func.blocks:
+        kinds = [type(inst) is Phi for inst in bb.insts]
+        assert kinds == sorted(kinds, reverse=True), bb.name
+    assert interpret(func, dict(x=7)).value == 23
+
+    # cleanup_phi_nodes 化简出来的赋值也一样
+    func = Function("join")
+    entry = func.new_block("entry")
+    A = func.new_block("A")
+    B = func.new_block("B")
+    J = func.new_block("J")
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit_terminator(Branch("c", A, B))
+    for bb in [A, B]:
+        builder.set_block(bb)
+        builder.emit_terminator(Jump(J))
+    builder.set_block(J)
+    builder.emit(Phi("p", {A: 1, B: 1}))
+    builder.emit(Phi("q", {A: "a", B: "b"}))
+    builder.emit_terminator(Return("q"))
+    func.build_cfg()
+
+    assert cleanup_phi_nodes(func)
+    assert [str(inst) for inst in J.insts] == ["q = phi(A: a, B: b)", "p = 1"]
+
+
+def test_random_functions():
+    # 1694 曾经在 try_merge 之后留下 replace 出来、还登记在被合并 block 上的指令，
+    # 结果用到了已经删掉的定义
+    for seed in [1694, *range(100)]:
+        func = build_random_function(seed)
+        expected = [interpret(func, args).value for args in ARGS]
+        construct_ssa(func)
+        optimize(func)
+        assert [interpret(func, args).value for args in ARGS] == expected, seed
@@ -0,0 +1,135 @@
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa, verify_function
+from toy_compiler.toy_ir.postdom import (
+    build_reverse_cfg,
+    compute_post_dominator_sets,
+    compute_ipdom,
+    build_control_dependence,
+    print_control_dependence,
+)
+from toy_compiler.toy_ir.transformers import dce
+
+from test_non_ssa_ir_build import build_complex_function
+
+
+def names(blocks):
+    return sorted(bb.name for bb in blocks)
+
+
+def test_post_dominators_and_control_dependence():
+    func = build_complex_function()
+
+    rcfg = build_reverse_cfg(func)
+    pdom = compute_post_dominator_sets(func, rcfg)
+    ipdom = compute_ipdom(func, rcfg, pdom)
+    cdeps = build_control_dependence(func, rcfg, ipdom)
+    print_control_dependence(cdeps)
+
+    assert ipdom[rcfg.exit] is None
+    assert {bb.name: ipdom[bb].name for bb in func.blocks} == {
+        "entry": "A",
+        "A": "split",
+        "split": "D",
+        "B": "D",
+        "C": "D",
+        "D": "end",
+        "end": "__exit__",
+    }
+    assert {bb.name: names(cdeps[bb]) for bb in func.blocks} == {
+        "entry": [],
+        "A": [],
+        "split": [],
+        "B": ["split"],
+        "C": ["split"],
+        "D": [],
+        "end": [],
+    }
+    assert not rcfg.fake_exits
+
+
+def build_useless_control_function():
+    # entry: 一个结果没人用的菱形，后面跟一个空循环
+    func = Function("useless")
+    entry = func.new_block("entry")
+    T = func.new_block("T")
+    F = func.new_block("F")
+    J = func.new_block("J")
+    H = func.new_block("H")
+    body = func.new_block("body")
+    exit = func.new_block("exit")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit(BinaryOp("sub", "c", "a", 1))
+    builder.emit_terminator(Branch("c", T, F))
+
+    builder.set_block(T)
+    builder.emit(BinaryOp("add", "t", "a", 2))
+    builder.emit_terminator(Jump(J))
+
+    builder.set_block(F)
+    builder.emit(BinaryOp("mul", "t", "a", 3))
+    builder.emit_terminator(Jump(J))
+
+    builder.set_block(J)
+    builder.emit(Assign("i", "n"))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(H)
+    builder.emit_terminator(Branch("i", body, exit))
+
+    builder.set_block(body)
+    builder.emit(BinaryOp("sub", "i", "i", 1))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(exit)
+    builder.emit(BinaryOp("add", "r", "a", 1))
+    builder.emit_terminator(Return("r"))
+
+    func.build_cfg()
+    return func
+
+
+def test_aggressive_dce_removes_dead_control():
+    func = build_useless_control_function()
+    construct_ssa(func)
+
+    # 普通 dce 保留所有 branch 和它们的条件
+    dce(func)
+    assert len(func.blocks) == 7
+
+    assert dce(func, aggressive=True)
+    assert names(func.blocks) == ["entry", "exit"]
+    assert [str(inst) for inst in func.entry.insts] == []
+    assert str(func.entry.terminator) == "jump exit"
+    assert [str(inst) for inst in func.blocks[1].insts] == ["r_0 = a add 1"]
+
+
+def test_aggressive_dce_keeps_live_control():
+    func = build_complex_function()
+    construct_ssa(func)
+
+    # y 由 phi 决定，phi 又依赖 split 的 branch，所以 branch 必须留下
+    dce(func, aggressive=True)
+    assert len(func.blocks) == 7
+    assert str(func.blocks[2].terminator) == "br c_0, B, C"
+    assert [str(inst) for inst in func.blocks[5].insts] == ["x_4 = phi(B: x_2, C: x_3)", "y_0 = x_4 add 1"]
+    verify_function(func)
+
+
+def test_aggressive_dce_keeps_infinite_loop():
+    func = Function("spin")
+    entry = func.new_block("entry")
+    loop = func.new_block("loop")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit_terminator(Jump(loop))
+    builder.set_block(loop)
+    builder.emit(Assign("x", 1))
+    builder.emit_terminator(Jump(loop))
+    func.build_cfg()
+
+    dce(func, aggressive=True)
+    assert names(func.blocks) == ["entry", "loop"]
+    assert func.blocks[1].insts == []
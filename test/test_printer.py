@@ -0,0 +1,84 @@
+import io
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, Jump, Return, print_function
+from toy_compiler.toy_ir.ssa import compute_idom, compute_dominator_sets, build_dominator_tree, build_dominance_frontier, print_dom_tree
+from toy_compiler.toy_ir.printer import dump_function, dump_functions, cfg_to_dot, dom_tree_to_dot
+
+from test_non_ssa_ir_build import build_complex_function
+from test_profiling import build_loop_function
+
+
+def test_dump_filters_and_compact():
+    func = build_complex_function()
+
+    out = io.StringIO()
+    dump_function(func, out, blocks={"split", "D"})
+    assert out.getvalue().splitlines() == [
+        "Function complex:",
+        "  Block split:",
+        "    c = 1",
+        "    br c, B, C",
+        "  Block D:",
+        "    y = x add 1",
+        "    z = 1",
+        "    k = z add 1",
+        "    jump end",
+    ]
+
+    out = io.StringIO()
+    dump_functions([func, build_loop_function()], out, functions=["loop"], blocks=lambda bb: bb.name == "H", edges=True, compact=True)
+    assert out.getvalue() == "function loop\nH: br i, body, exit  -> body exit\n"
+
+
+def test_print_function_format(capsys):
+    func = build_complex_function()
+    print_function(func)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:6] == [
+        "Function complex:",
+        "  Block entry:",
+        "    x = 0",
+        "    jump A",
+        "    succs: ['A']",
+        "    preds: []",
+    ]
+
+
+def test_dot_output():
+    func = build_complex_function()
+    out = io.StringIO()
+    cfg_to_dot(func, out)
+    dot = out.getvalue()
+    assert dot.startswith('digraph "complex" {')
+    assert '  b2 -> b3 [label="T"];' in dot
+    assert '  b2 -> b4 [label="F"];' in dot
+    assert dot.count("->") == 7
+
+    idom = compute_idom(func, compute_dominator_sets(func))
+    out = io.StringIO()
+    dom_tree_to_dot(func, build_dominator_tree(func, idom), build_dominance_frontier(func, idom), out)
+    dot = out.getvalue()
+    assert "  b2 -> b5;\n" in dot
+    assert "  b3 -> b5 [style=dashed, color=gray, constraint=false];\n" in dot
+
+
+def test_deep_dom_tree():
+    # 一条很长的链，递归实现会爆栈
+    n = 20000
+    func = Function("chain")
+    blocks = [func.new_block(f"b{i}") for i in range(n)]
+    for a, b in zip(blocks, blocks[1:]):
+        a.terminator = Jump(b)
+    blocks[-1].terminator = Return(0)
+    func.build_cfg()
+
+    dom_tree = {a: [b] for a, b in zip(blocks, blocks[1:])}
+    out = io.StringIO()
+    dom_tree_to_dot(func, dom_tree, out=out)
+    assert out.getvalue().count("->") == n - 1
+
+    # print_dom_tree 每层都会缩进，输出本身是平方级的，只取前 3000 个
+    out = io.StringIO()
+    dom_tree[blocks[2999]] = []
+    print_dom_tree(dom_tree, func.entry, out=out)
+    assert len(out.getvalue().splitlines()) == 3000
@@ -0,0 +1,113 @@
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.interpreter import interpret
+from toy_compiler.toy_ir.profiling import EdgeProfile, ProfileDB, function_hash, profile_function
+from toy_compiler.toy_ir.layout import layout_blocks, fallthrough_weight
+
+
+def build_loop_function():
+    """
+    sum = 0; i = n
+    while i: (i == 5 时走 cold) sum += i; i -= 1
+    return sum
+    block 故意按很差的顺序创建
+    """
+    func = Function("loop")
+    entry = func.new_block("entry")
+    exit = func.new_block("exit")
+    cold = func.new_block("cold")
+    latch = func.new_block("latch")
+    H = func.new_block("H")
+    hot = func.new_block("hot")
+    body = func.new_block("body")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit(Assign("sum", 0))
+    builder.emit(Assign("i", "n"))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(H)
+    builder.emit_terminator(Branch("i", body, exit))
+
+    builder.set_block(body)
+    builder.emit(BinaryOp("sub", "c", "i", 5))
+    builder.emit_terminator(Branch("c", hot, cold))
+
+    builder.set_block(hot)
+    builder.emit(BinaryOp("add", "sum", "sum", "i"))
+    builder.emit_terminator(Jump(latch))
+
+    builder.set_block(cold)
+    builder.emit(BinaryOp("mul", "sum", "sum", 2))
+    builder.emit_terminator(Jump(latch))
+
+    builder.set_block(latch)
+    builder.emit(BinaryOp("sub", "i", "i", 1))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(exit)
+    builder.emit_terminator(Return("sum"))
+
+    func.build_cfg()
+    return func
+
+
+def test_interpret():
+    func = build_loop_function()
+    assert interpret(func, {"n": 3}).value == 6
+    # i == 5 的时候 sum 翻倍
+    assert interpret(func, {"n": 6}).value == (6 * 2) + 4 + 3 + 2 + 1
+
+    construct_ssa(func)
+    result = interpret(func, {"n": 6})
+    assert result.value == 22
+    assert result.steps > 6 * 4
+
+
+def test_profile_and_layout(tmp_path):
+    func = build_loop_function()
+    profile = profile_function(func, [{"n": n} for n in range(10)])
+    assert profile.runs == 10
+    assert profile.edges[("H", "body")] == sum(range(10))
+    assert profile.edges[("body", "cold")] == 5
+
+    before = fallthrough_weight(func, profile)
+    assert layout_blocks(func, profile)
+    assert [bb.name for bb in func.blocks] == ["entry", "H", "body", "hot", "latch", "exit", "cold"]
+    assert fallthrough_weight(func, profile) > before
+    assert interpret(func, {"n": 6}).value == 22
+
+    # 已经是最优顺序
+    assert not layout_blocks(func, profile)
+
+    # 持久化之后按 hash 找回来，重新编译出来的函数也能用
+    db = ProfileDB()
+    db.add(profile)
+    path = tmp_path / "profile.json"
+    db.save(path)
+
+    rebuilt = build_loop_function()
+    assert function_hash(rebuilt) == function_hash(func)
+    loaded = ProfileDB.load(path).lookup(rebuilt)
+    assert loaded is not None
+    assert loaded.edges == profile.edges
+
+    assert layout_blocks(rebuilt, loaded)
+    assert [bb.name for bb in rebuilt.blocks] == [bb.name for bb in func.blocks]
+
+
+def test_profile_db_merge():
+    func = build_loop_function()
+    db = ProfileDB()
+    db.add(profile_function(func, [{"n": 2}]))
+    db.add(profile_function(func, [{"n": 3}]))
+
+    profile = db.lookup(func)
+    assert profile.runs == 2
+    assert profile.edges[("latch", "H")] == 5
+
+    other = Function("other")
+    other.new_block("entry").terminator = Return(0)
+    assert db.lookup(other) is None
+    assert EdgeProfile.for_function(other).func_hash != profile.func_hash
@@ -0,0 +1,82 @@
+import math
+
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.interpreter import interpret
+from toy_compiler.toy_ir.pipeline import optimize
+from toy_compiler.toy_ir.ranges import compute_value_ranges, fold_branches_with_ranges, eval_range
+
+
+def build_counter_loop():
+    """
+    i = 0
+    while n: (i + 1 恒非 0，cold 走不到) i += 1
+    return i
+    """
+    func = Function("counter")
+    entry = func.new_block("entry")
+    H = func.new_block("H")
+    body = func.new_block("body")
+    hot = func.new_block("hot")
+    cold = func.new_block("cold")
+    latch = func.new_block("latch")
+    exit = func.new_block("exit")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit(Assign("i", 0))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(H)
+    builder.emit(BinaryOp("sub", "n", "n", 1))
+    builder.emit_terminator(Branch("n", body, exit))
+
+    builder.set_block(body)
+    builder.emit(BinaryOp("add", "t", "i", 1))
+    builder.emit_terminator(Branch("t", hot, cold))
+
+    builder.set_block(hot)
+    builder.emit_terminator(Jump(latch))
+
+    builder.set_block(cold)
+    builder.emit(Assign("i", -100))
+    builder.emit_terminator(Jump(latch))
+
+    builder.set_block(latch)
+    builder.emit(BinaryOp("add", "i", "i", 1))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(exit)
+    builder.emit_terminator(Return("i"))
+
+    func.build_cfg()
+    return func
+
+
+def test_eval_range():
+    assert eval_range("add", (0, 3), (1, 1)) == (1, 4)
+    assert eval_range("sub", (0, 3), (1, 2)) == (-2, 2)
+    assert eval_range("mul", (-2, 3), (0, math.inf)) == (-math.inf, math.inf)
+    assert eval_range("mul", (0, 3), (2, math.inf)) == (0, math.inf)
+    assert eval_range("div", (-7, 7), (2, 2)) == (-4, 3)
+    assert eval_range("div", (1, 2), (-1, 1)) == (-math.inf, math.inf)
+    assert eval_range("shl", (1, 3), (1, 2)) == (2, 12)
+
+
+def test_widening_and_fold():
+    func = build_counter_loop()
+    construct_ssa(func)
+
+    info = compute_value_ranges(func)
+    phi = next(inst for inst in func.blocks[1].insts if inst.defs()[0].startswith("i_"))
+    # cold 走不到，i 只会从 0 往上长，在 loop header 上 widening 到 +inf
+    assert info.get(phi.dst) == (0, math.inf)
+    assert not info.reached[4]
+
+    # 常量传播折叠不了 br t
+    optimize(func)
+    assert any(bb.name == "cold" for bb in func.blocks)
+
+    assert fold_branches_with_ranges(func) == 1
+    assert [bb.name for bb in func.blocks] == ["entry", "H", "body", "hot", "latch", "exit"]
+    assert interpret(func, {"n": 4}).value == 3
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from toy_compiler.toy_ir.serialize import dumps, loads
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.pipeline import compile_function
+from toy_compiler.service.server import CompileServer, LatencyHistogram
+from toy_compiler.service.client import CompileClient, CompileError
+from toy_compiler.service.protocol import HEADER, encode_message, read_message
+
+from test_non_ssa_ir_build import build_complex_function
+
+
+def test_serialize_roundtrip():
+    func = build_complex_function()
+    assert dumps(loads(dumps(func))) == dumps(func)
+
+    ssa = build_complex_function()
+    construct_ssa(ssa)
+    copy = loads(dumps(ssa))
+    assert dumps(copy) == dumps(ssa)
+    assert [b.name for b in copy.blocks[5].preds] == ["B", "C"]
+
+
+def test_latency_histogram():
+    hist = LatencyHistogram()
+    for us in [1, 3, 100, 100, 5000]:
+        hist.record(us / 1e6)
+    assert hist.count == 5
+    # 桶的宽度是 1/8，插值之后误差在一个桶以内
+    assert abs(hist.percentile(50) - 100 / 1e6) <= 100 / 8 / 1e6
+    assert abs(hist.percentile(90) - 5000 / 1e6) <= 5000 / 8 / 1e6
+    assert hist.percentile(100) == 5000 / 1e6
+
+    # 都落在 262~524ms（2^18~2^19 us）这一个 2 的幂区间里，各个百分位还要分得开
+    hist = LatencyHistogram()
+    for ms in range(270, 520):
+        hist.record(ms / 1e3)
+    p50, p90, p99 = (hist.percentile(p) for p in (50, 90, 99))
+    assert p50 < p90 < p99 <= hist.max
+    assert abs(p50 - 0.395) < 0.02 and abs(p90 - 0.495) < 0.02
+    assert len(hist.to_dict()["buckets_us"]) == 8
+
+
+async def compile_many(server, n):
+    client = await CompileClient.connect_unix(server.address)
+    funcs = await asyncio.gather(*[client.compile(build_complex_function()) for _ in range(n)])
+
+    bad_data = {"name": "bad", "entry": "entry", "blocks": [{"name": "entry", "insts": [], "term": ["jump", "nowhere"]}]}
+    with pytest.raises(CompileError):
+        await client.compile_dict(bad_data)
+
+    stats = await client.stats()
+    await client.close()
+    return funcs, stats
+
+
+def test_compile_service(tmp_path):
+    expected = build_complex_function()
+    compile_function(expected)
+
+    async def run():
+        # 小队列 + 小 batch，顺便走一遍背压的路径
+        server = CompileServer(workers=2, max_queue=4, batch_size=3, use_processes=False)
+        await server.start_unix(str(tmp_path / "compile.sock"))
+        try:
+            return await compile_many(server, 20)
+        finally:
+            await server.close()
+
+    funcs, stats = asyncio.run(run())
+
+    assert len(funcs) == 20
+    assert all(dumps(f) == dumps(expected) for f in funcs)
+    assert stats["requests"] == 21
+    assert stats["errors"] == 1
+    assert stats["latency"]["count"] == 21
+    assert stats["mean_batch_size"] > 1
+
+
+def test_compile_service_tcp_process_pool():
+    async def run():
+        server = CompileServer(workers=2, use_processes=True)
+        await server.start_tcp("127.0.0.1", 0)
+        try:
+            client = await CompileClient.connect_tcp(*server.address)
+            func = await client.compile(build_complex_function())
+            await client.close()
+            return func
+        finally:
+            await server.close()
+
+    func = asyncio.run(run())
+    assert [str(inst) for inst in func.entry.insts] == []
+    assert str(func.entry.terminator) == "return 3"
+
+
+def test_malformed_requests(tmp_path):
+    async def send_raw(server, body: bytes):
+        reader, writer = await asyncio.open_unix_connection(server.address)
+        writer.write(HEADER.pack(len(body)) + body)
+        await writer.drain()
+        reply = await read_message(reader)
+        # 服务端回完错误就断开
+        assert await read_message(reader) is None
+        writer.close()
+        return reply
+
+    async def run():
+        server = CompileServer(workers=1, use_processes=False)
+        await server.start_unix(str(tmp_path / "compile.sock"))
+        try:
+            # 缺 function 的 compile 只回错误，连接还能接着用
+            reader, writer = await asyncio.open_unix_connection(server.address)
+            writer.write(encode_message({"id": 1, "op": "compile"}))
+            writer.write(encode_message({"id": 2, "op": "stats"}))
+            await writer.drain()
+            missing = await read_message(reader)
+            stats = await read_message(reader)
+            writer.close()
+
+            bad_json = await send_raw(server, b"{not json")
+            not_object = await send_raw(server, b"[1, 2]")
+            return missing, stats, bad_json, not_object
+        finally:
+            await server.close()
+
+    missing, stats, bad_json, not_object = asyncio.run(run())
+    assert missing == {"id": 1, "ok": False, "error": "compile needs a function object"}
+    assert stats["ok"] and stats["stats"]["requests"] == 0
+    assert not bad_json["ok"] and bad_json["error"].startswith("protocol error: malformed message")
+    assert not_object["error"] == "protocol error: message must be a json object, got list"
@@ -0,0 +1,122 @@
+import io
+
+import pytest
+
+from toy_compiler.toy_ir.non_ssa_ir import Branch, Jump
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.interpreter import interpret
+from toy_compiler.toy_ir.pipeline import compile_function, count_insts, optimize
+from toy_compiler.toy_ir.printer import dump_function
+from toy_compiler.toy_ir.transformers import aggressive_dce, simplify_cfg
+from toy_compiler.toy_ir.loops import unroll_loops
+from toy_compiler.toy_ir.snapshot import Snapshot, clone_function, speculate
+
+from test_non_ssa_ir_build import build_complex_function
+from test_pipeline import build_dead_loop_function
+from test_jump_threading import build_flag_join
+from test_unroll import build_sum_loop
+
+
+def dump(func) -> str:
+    out = io.StringIO()
+    dump_function(func, out, edges=True)
+    return out.getvalue()
+
+
+def test_clone_function():
+    func = build_complex_function()
+    construct_ssa(func)
+    text = dump(func)
+
+    copy = clone_function(func, "copy")
+    assert copy.name == "copy"
+    assert dump(copy).replace("copy", func.name, 1) == text
+    assert copy.entry is copy.blocks[0]
+    assert [bb.id for bb in copy.blocks] == list(range(len(copy.blocks)))
+
+    # 不和原来的共享 block / 指令
+    old = {id(x) for bb in func.blocks for x in [bb, *bb.insts, bb.terminator]}
+    for bb in copy.blocks:
+        assert all(id(x) not in old for x in [bb, *bb.insts, bb.terminator])
+        for inst in bb.phis():
+            assert all(p in copy.blocks for p in inst.incomings)
+        assert all(s in copy.blocks for s in bb.terminator.successors())
+
+    optimize(copy)
+    assert dump(func) == text
+    assert interpret(copy).value == interpret(func).value
+
+
+@pytest.mark.parametrize(
+    "build, passes",
+    [
+        (build_complex_function, lambda f: compile_function(f)),
+        (build_dead_loop_function, lambda f: (construct_ssa(f), aggressive_dce(f), simplify_cfg(f))),
+        (build_flag_join, lambda f: compile_function(f)),
+        (lambda: build_sum_loop(5), lambda f: (construct_ssa(f), unroll_loops(f), optimize(f))),
+        (build_sum_loop, lambda f: (construct_ssa(f), unroll_loops(f, factor=3), optimize(f))),
+    ],
+)
+def test_rollback_restores(build, passes):
+    func = build()
+    text = dump(func)
+
+    snap = Snapshot(func)
+    passes(func)
+    assert dump(func) != text
+    snap.rollback()
+    assert func.journal is None
+    assert dump(func) == text
+
+    # 回滚之后还能正常编译
+    ref = build()
+    passes(ref)
+    passes(func)
+    assert dump(func) == dump(ref)
+
+
+def test_copy_on_write():
+    func = build_complex_function()
+    construct_ssa(func)
+    blocks = len(func.blocks)
+
+    snap = Snapshot(func)
+    with pytest.raises(ValueError):
+        Snapshot(func)
+
+    # 只改一个 block 的 terminator
+    bb = next(bb for bb in func.blocks if isinstance(bb.terminator, Branch))
+    func.replace_terminator(bb, Jump(bb.terminator.true_bb))
+    assert snap.touched <= 3 < blocks
+
+    snap.commit()
+    assert func.journal is None
+    assert isinstance(bb.terminator, Jump)
+
+
+def test_speculate():
+    func = build_sum_loop()
+    construct_ssa(func)
+    optimize(func)
+    text = dump(func)
+    base = count_insts(func)
+
+    def unroll(f):
+        unroll_loops(f, factor=3)
+        optimize(f)
+
+    # 按 factor 展开代码会变大，只要求更小就回滚
+    assert not speculate(func, unroll, lambda f: count_insts(f) < base)
+    assert dump(func) == text
+
+    assert speculate(func, unroll, lambda f: count_insts(f) > base)
+    assert count_insts(func) > base
+    assert [interpret(func, dict(n=n, x=7)).value for n in range(4)] == [0, 7, 8, 15]
+
+    def broken(f):
+        optimize(f)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        speculate(func, broken, lambda f: True)
+    assert func.journal is None
@@ -0,0 +1,166 @@
+import io
+
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.interpreter import interpret
+from toy_compiler.toy_ir.pipeline import optimize
+from toy_compiler.toy_ir.loops import find_loops, trip_count, unroll_loops
+from toy_compiler.toy_ir.transformers import constant_propagation
+from toy_compiler.toy_ir.printer import dump_function
+from toy_compiler.toy_ir.serialize import dumps, loads
+
+
+def build_sum_loop(count=None):
+    """
+    i = count（None 时是入参 n）; s = 0
+    H: t = s + i; br i, body, exit
+    body: 奇数 i 加 x，偶数 i 加 1; i -= 1
+    exit: return t
+    """
+    func = Function("sum")
+    entry = func.new_block("entry")
+    H = func.new_block("H")
+    body = func.new_block("body")
+    odd = func.new_block("odd")
+    even = func.new_block("even")
+    latch = func.new_block("latch")
+    exit = func.new_block("exit")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit(Assign("i", "n" if count is None else count))
+    builder.emit(Assign("s", 0))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(H)
+    builder.emit(BinaryOp("add", "t", "s", "i"))
+    builder.emit_terminator(Branch("i", body, exit))
+
+    builder.set_block(body)
+    builder.emit(BinaryOp("shr", "h", "i", 1))
+    builder.emit(BinaryOp("shl", "h", "h", 1))
+    builder.emit(BinaryOp("sub", "h", "i", "h"))
+    builder.emit_terminator(Branch("h", odd, even))
+
+    builder.set_block(odd)
+    builder.emit(BinaryOp("add", "s", "s", "x"))
+    builder.emit_terminator(Jump(latch))
+
+    builder.set_block(even)
+    builder.emit(BinaryOp("add", "s", "s", 1))
+    builder.emit_terminator(Jump(latch))
+
+    builder.set_block(latch)
+    builder.emit(BinaryOp("sub", "i", "i", 1))
+    builder.emit_terminator(Jump(H))
+
+    builder.set_block(exit)
+    builder.emit_terminator(Return("t"))
+
+    func.build_cfg()
+    return func
+
+
+def dump(func) -> str:
+    out = io.StringIO()
+    dump_function(func, out, edges=True)
+    return out.getvalue()
+
+
+def run(func, **args):
+    return interpret(func, args).value
+
+
+def test_find_loops_and_trip_count():
+    func = build_sum_loop(5)
+    construct_ssa(func)
+    loops = find_loops(func)
+    assert len(loops) == 1
+    loop = loops[0]
+    assert loop.header.name == "H"
+    assert [bb.name for bb in loop.latches] == ["latch"]
+    assert {bb.name for bb in loop.blocks} == {"H", "body", "odd", "even", "latch"}
+    assert [(a.name, b.name) for a, b in loop.exits] == [("H", "exit")]
+    # i = 5..1 进 body，i = 0 时退出
+    assert trip_count(loop, constant_propagation(func)) == 6
+
+
+def test_full_unroll():
+    func = build_sum_loop(5)
+    construct_ssa(func)
+    expected = [run(func, x=x) for x in range(4)]
+
+    assert unroll_loops(func) == (1, 0)
+    assert find_loops(func) == []
+    assert [run(func, x=x) for x in range(4)] == expected
+
+    optimize(func)
+    assert [run(func, x=x) for x in range(4)] == expected
+    # 只剩一个 block: 3 个奇数 i 加 x
+    assert len(func.blocks) == 1
+
+
+def test_partial_unroll():
+    for factor in (2, 3):
+        func = build_sum_loop()
+        construct_ssa(func)
+        expected = [run(func, n=n, x=7) for n in range(8)]
+
+        assert unroll_loops(func, factor=factor) == (0, 1)
+        assert len(find_loops(func)) == 1
+        assert [run(func, n=n, x=7) for n in range(8)] == expected
+
+        optimize(func)
+        assert [run(func, n=n, x=7) for n in range(8)] == expected
+
+
+def test_single_trip_loop_is_skipped():
+    # i = 0：第一次进 header 就退出，trip count 是 1，没有可以展开的
+    func = build_sum_loop(0)
+    construct_ssa(func)
+    loop = find_loops(func)[0]
+    assert trip_count(loop, constant_propagation(func)) == 1
+
+    before = dump(func)
+    assert unroll_loops(func, factor=4) == (0, 0)
+    assert dump(func) == before
+    assert run(func, x=7) == 0
+
+
+def test_unreachable_blocks_around_loop():
+    # U 走不到，自己是自己唯一的前驱，分别连进循环体和循环出口
+    for target in ["body", "exit"]:
+        func = build_sum_loop()
+        bb = next(bb for bb in func.blocks if bb.name == target)
+        U = func.new_block("U")
+        U.insts.append(BinaryOp("add", "s", "s", 1))
+        U.terminator = Branch("n", U, bb)
+        func.build_cfg()
+        expected = [run(func, n=n, x=7) for n in range(6)]
+        construct_ssa(func)
+
+        assert {bb.name for bb in find_loops(func)[0].blocks} == {"H", "body", "odd", "even", "latch"}
+        assert unroll_loops(func, factor=3) == (0, 1)
+        assert [run(func, n=n, x=7) for n in range(6)] == expected
+
+
+def test_repeated_unroll_names():
+    func = build_sum_loop()
+    construct_ssa(func)
+    expected = [run(func, n=n, x=7) for n in range(8)]
+    assert unroll_loops(func, factor=2) == (0, 1)
+    assert unroll_loops(func, factor=2) == (0, 1)
+
+    names = [bb.name for bb in func.blocks]
+    assert len(set(names)) == len(names)
+    copy = loads(dumps(func))
+    assert [run(copy, n=n, x=7) for n in range(8)] == expected
+
+
+def test_budget():
+    func = build_sum_loop(100)
+    construct_ssa(func)
+    # 完全展开超过 budget，也没有要求按 factor 展开
+    assert unroll_loops(func, budget=100) == (0, 0)
+    assert unroll_loops(func, factor=4, budget=100) == (0, 1)
+    assert run(func, x=2) == 150
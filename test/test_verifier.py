@@ -0,0 +1,166 @@
+import pytest
+
+from toy_compiler.toy_ir.non_ssa_ir import IRBuilder, Function, Assign, BinaryOp, Branch, Jump, Return
+from toy_compiler.toy_ir.ssa import construct_ssa, verify_function
+from toy_compiler.toy_ir.pipeline import compile_function
+from toy_compiler.toy_ir.snapshot import Snapshot
+from toy_compiler.toy_ir.verifier import FULL, STRUCTURAL, collect_errors, verify_ir
+
+from test_non_ssa_ir_build import build_complex_function
+from test_unroll import build_sum_loop
+
+
+def build_out_of_order():
+    """
+    block 列表里使用排在定义前面，但定义所在的 block 支配使用：
+        entry -> D -> U，列表顺序是 entry, U, D
+    """
+    func = Function("out_of_order")
+    entry = func.new_block("entry")
+    U = func.new_block("U")
+    D = func.new_block("D")
+
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit_terminator(Jump(D))
+
+    builder.set_block(U)
+    builder.emit(BinaryOp("add", "y", "x", "n"))
+    builder.emit_terminator(Return("y"))
+
+    builder.set_block(D)
+    builder.emit(Assign("x", 1))
+    builder.emit_terminator(Jump(U))
+
+    func.build_cfg()
+    return func
+
+
+def find(func, name):
+    return next(bb for bb in func.blocks if bb.name == name)
+
+
+def test_valid_functions(capsys):
+    # 入参 n 没有定义，use 排在 def 前面，都不算错
+    func = build_out_of_order()
+    assert collect_errors(func, FULL) == []
+
+    # build_sum_loop(5) 上 optimize 曾经把 phi 化简出的赋值留在别的 phi 前面
+    for func in [build_complex_function(), build_sum_loop(), build_sum_loop(5)]:
+        construct_ssa(func)
+        assert collect_errors(func, FULL) == []
+        compile_function(func, verify=FULL)
+
+    verify_function(func, verbose=False)
+    assert capsys.readouterr().out == ""
+    verify_function(func)
+    assert "passed verification" in capsys.readouterr().out
+
+
+def test_structural_errors():
+    func = build_out_of_order()
+    U, D = find(func, "U"), find(func, "D")
+    D.succs.remove(U)
+    assert collect_errors(func) == [
+        "CFG inconsistency: D -> U missing forward edge",
+        "Block D succs [] do not match its terminator",
+    ]
+
+    func = build_out_of_order()
+    func.blocks[2].terminator = Jump(func.blocks[0])
+    with pytest.raises(ValueError, match="IR Verification Failed"):
+        verify_ir(func)
+
+    func = build_out_of_order()
+    ghost = Function("other").new_block("ghost")
+    find(func, "D").terminator = Jump(ghost)
+    assert "D jumps to non-existent block ghost" in collect_errors(func)
+
+
+def test_dominance_errors():
+    func = build_sum_loop()
+    construct_ssa(func)
+    # odd 里定义的值在 latch 里直接用，even 过来的路径上没有定义
+    odd, latch = find(func, "odd"), find(func, "latch")
+    s_odd = odd.insts[0].dst
+    latch.insts.append(Assign("bad", s_odd))
+    assert collect_errors(func, STRUCTURAL) == []
+    assert collect_errors(func, FULL) == [f"Use of {s_odd} in latch is not dominated by its definition in odd"]
+
+    # 同一个 block 里先用后定义
+    func = build_out_of_order()
+    find(func, "D").insts.insert(0, Assign("z", "x"))
+    assert collect_errors(func, FULL) == ["Use of x before its definition in D"]
+
+
+def test_phi_alignment():
+    func = build_sum_loop()
+    construct_ssa(func)
+    H = find(func, "H")
+    phi = H.phis()[0]
+    phi.incomings = dict(reversed(list(phi.incomings.items())))
+    assert collect_errors(func, STRUCTURAL) == []
+    assert collect_errors(func, FULL) == [f"Phi {phi.dst} in H is not aligned with preds ['entry', 'latch']"]
+
+
+def test_incremental():
+    func = build_sum_loop()
+    construct_ssa(func)
+
+    snap = Snapshot(func)
+    odd = find(func, "odd")
+    func.touch(odd)
+    odd.insts.insert(0, Assign("early", odd.insts[0].dst))
+    modified = snap.modified()
+    snap.commit()
+
+    assert modified == [odd]
+    assert collect_errors(func, FULL, [find(func, "exit")]) == []
+    assert collect_errors(func, FULL, modified) == [f"Use of {odd.insts[1].dst} before its definition in odd"]
+
+    # odd 里的定义被删掉了，没改过的 latch 还在用：要把删掉的定义一起交给 verifier
+    func = build_sum_loop()
+    construct_ssa(func)
+    odd = find(func, "odd")
+    s_odd = odd.insts[0].dst
+    snap = Snapshot(func)
+    func.touch(odd)
+    del odd.insts[0]
+    modified, removed = snap.modified(), snap.removed_defs()
+    snap.commit()
+
+    assert removed == {s_odd}
+    assert collect_errors(func, FULL, modified) == []
+    assert collect_errors(func, FULL, modified, removed) == [f"Use of {s_odd} in latch after its definition was removed"]
+
+
+def test_incremental_cfg_change():
+    # P 改跳到 C 之后，D 不再支配 C2，但 C、C2 都没被改过
+    func = Function("cfg")
+    entry, D, P, C, C2, R = (func.new_block(name) for name in ["entry", "D", "P", "C", "C2", "R"])
+    builder = IRBuilder(func)
+    builder.set_block(entry)
+    builder.emit_terminator(Branch("a", D, P))
+    builder.set_block(D)
+    builder.emit(Assign("x", 1))
+    builder.emit_terminator(Jump(C))
+    builder.set_block(P)
+    builder.emit_terminator(Jump(R))
+    builder.set_block(C)
+    builder.emit_terminator(Jump(C2))
+    builder.set_block(C2)
+    builder.emit_terminator(Return("x"))
+    builder.set_block(R)
+    builder.emit_terminator(Return(0))
+    func.build_cfg()
+    assert collect_errors(func, FULL) == []
+
+    snap = Snapshot(func)
+    func.replace_terminator(P, Jump(C))
+    modified, removed = snap.modified(), snap.removed_defs()
+    snap.commit()
+
+    assert C2 not in modified
+    expected = ["Use of x in C2 is not dominated by its definition in D"]
+    assert collect_errors(func, FULL) == expected
+    assert collect_errors(func, FULL, modified, removed) == expected
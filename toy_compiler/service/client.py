@@ -0,0 +1,85 @@
+import asyncio
+import itertools
+
+from toy_compiler.toy_ir.non_ssa_ir import Function
+from toy_compiler.toy_ir.serialize import function_from_dict, function_to_dict
+from toy_compiler.service.protocol import ProtocolError, encode_message, read_message
+
+
+class CompileError(Exception):
+    pass
+
+
+class CompileClient:
+    """
+    编译服务的客户端，一个连接上可以同时挂很多请求，按 id 匹配结果
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count()
+        self.pending: dict[int, asyncio.Future] = {}
+        self.receiver = asyncio.create_task(self.receive())
+
+    @classmethod
+    async def connect_unix(cls, path: str):
+        reader, writer = await asyncio.open_unix_connection(path)
+        return cls(reader, writer)
+
+    @classmethod
+    async def connect_tcp(cls, host: str = "127.0.0.1", port: int = 7878):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def receive(self):
+        error = ConnectionError("connection closed")
+        try:
+            while True:
+                msg = await read_message(self.reader)
+                if msg is None:
+                    break
+                fut = self.pending.pop(msg.get("id"), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(msg)
+        except (ProtocolError, ConnectionError) as e:
+            error = e
+        finally:
+            for fut in self.pending.values():
+                if not fut.done():
+                    fut.set_exception(error)
+            self.pending.clear()
+
+    async def request(self, msg: dict) -> dict:
+        if self.receiver.done():
+            raise ConnectionError("connection closed")
+        req_id = next(self.ids)
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[req_id] = fut
+        self.writer.write(encode_message({**msg, "id": req_id}))
+        # 服务端队列满时 drain 会等，请求自然就慢下来了
+        await self.writer.drain()
+        return await fut
+
+    async def compile_dict(self, data: dict) -> dict:
+        resp = await self.request({"op": "compile", "function": data})
+        if not resp["ok"]:
+            raise CompileError(resp["error"])
+        return resp["function"]
+
+    async def compile(self, func: Function) -> Function:
+        return function_from_dict(await self.compile_dict(function_to_dict(func)))
+
+    async def stats(self) -> dict:
+        resp = await self.request({"op": "stats"})
+        return resp["stats"]
+
+    async def close(self):
+        if self.writer.can_write_eof():
+            self.writer.write_eof()
+        await self.receiver
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
@@ -0,0 +1,46 @@
+import asyncio
+import json
+import struct
+
+# 每条消息：4 字节大端长度 + utf-8 json
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_message(obj: dict) -> bytes:
+    body = json.dumps(obj, separators=(",", ":")).encode()
+    if len(body) > MAX_MESSAGE_SIZE:
+        raise ProtocolError(f"message too large: {len(body)} bytes")
+    return HEADER.pack(len(body)) + body
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict | None:
+    """
+    读一条消息，对端正常关闭时返回 None
+    截断、超长、不是 json 对象都抛 ProtocolError
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError("connection closed in message header") from e
+
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ProtocolError(f"message too large: {size} bytes")
+    try:
+        body = await reader.readexactly(size)
+    except asyncio.IncompleteReadError as e:
+        raise ProtocolError("connection closed in message body") from e
+    try:
+        msg = json.loads(body)
+    except ValueError as e:
+        raise ProtocolError(f"malformed message: {e}") from e
+    if not isinstance(msg, dict):
+        raise ProtocolError(f"message must be a json object, got {type(msg).__name__}")
+    return msg
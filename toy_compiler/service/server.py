@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from toy_compiler.toy_ir.serialize import function_from_dict, function_to_dict
+from toy_compiler.toy_ir.pipeline import compile_function
+from toy_compiler.service.protocol import ProtocolError, encode_message, read_message
+
+
+class LatencyHistogram:
+    """
+    对数线性分桶的延迟直方图，单位微秒：每个 2 的幂区间再均分成 SUB 个桶，
+    相对误差不超过 1 / SUB；小于 SUB us 的每 1us 一个桶
+    """
+
+    SUB_BITS = 3
+    SUB = 1 << SUB_BITS
+    N_BUCKETS = 40 * SUB
+
+    def __init__(self):
+        self.buckets = [0] * self.N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def bucket(cls, us: int) -> int:
+        if us < cls.SUB:
+            return us
+        shift = us.bit_length() - cls.SUB_BITS - 1
+        return min((shift + 1) * cls.SUB + (us >> shift) - cls.SUB, cls.N_BUCKETS - 1)
+
+    @classmethod
+    def bounds(cls, i: int) -> tuple[int, int]:
+        """
+        bucket i 覆盖的 [lo, hi) us
+        """
+        if i < cls.SUB:
+            return i, i + 1
+        shift = i // cls.SUB - 1
+        m = i % cls.SUB + cls.SUB
+        return m << shift, (m + 1) << shift
+
+    def record(self, seconds: float):
+        us = int(seconds * 1e6)
+        self.buckets[self.bucket(us)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        """
+        返回第 p 百分位（秒）：在所在的桶里按样本数线性插值，不超过最大值
+        """
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lo, hi = self.bounds(i)
+                frac = max(rank - seen, 0) / n
+                return min((lo + frac * (hi - lo)) / 1e6, self.max)
+            seen += n
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets_us": {str(self.bounds(i)[0]): n for i, n in enumerate(self.buckets) if n},
+        }
+
+
+def compile_batch(payloads: list[dict]) -> list[dict]:
+    """
+    worker 里跑的函数：一批序列化的 Function 进，一批结果出
+    """
+    results = []
+    for data in payloads:
+        start = time.perf_counter()
+        try:
+            func = function_from_dict(data)
+            compile_function(func)
+            results.append({"ok": True, "function": function_to_dict(func)})
+        except Exception as e:
+            results.append({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        results[-1]["compile_time"] = time.perf_counter() - start
+    return results
+
+
+class Connection:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.inflight = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def acquire(self):
+        self.inflight += 1
+        self.idle.clear()
+
+    def release(self):
+        self.inflight -= 1
+        if not self.inflight:
+            self.idle.set()
+
+    async def send(self, msg: dict):
+        if self.writer.is_closing():
+            return
+        self.writer.write(encode_message(msg))
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+@dataclass
+class Pending:
+    req_id: int
+    payload: dict
+    conn: Connection
+    enqueued: float
+
+
+class CompileServer:
+    """
+    asyncio 编译服务
+
+      - 每个连接上的 compile 请求进一个有界队列，队列满了就不再读 socket（背压）
+      - batcher 把请求攒成 batch（最多 batch_size 个，最多等 batch_timeout 秒）
+      - batch 交给 worker 池跑，同时在跑的 batch 数不超过 workers
+      - 每个请求编译完就立刻把结果写回对应的连接
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        max_queue: int = 1024,
+        batch_size: int = 16,
+        batch_timeout: float = 0.002,
+        use_processes: bool = True,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.use_processes = use_processes
+
+        self.latency = LatencyHistogram()  # 入队到写回
+        self.queue_wait = LatencyHistogram()  # 入队到开始编译
+        self.compile_time = LatencyHistogram()  # 单个函数的编译时间
+        self.batches = 0
+        self.requests = 0
+        self.errors = 0
+
+        self.address = None
+        self.server = None
+        self.executor = None
+        self.queue = None
+        self.slots = None
+        self.batcher = None
+        self.tasks = set()
+
+    async def start_unix(self, path: str):
+        await self.setup()
+        self.server = await asyncio.start_unix_server(self.handle, path=path)
+        self.address = path
+        return self
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0):
+        await self.setup()
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.address = self.server.sockets[0].getsockname()[:2]
+        return self
+
+    async def setup(self):
+        if self.use_processes:
+            # 不用 fork：fork 出来的 worker 会继承已经 accept 的连接 fd，服务端关连接时对端收不到 EOF
+            ctx = multiprocessing.get_context("spawn")
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.slots = asyncio.Semaphore(self.workers)
+        self.batcher = asyncio.create_task(self.run_batcher())
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.batcher is not None:
+            self.batcher.cancel()
+            try:
+                await self.batcher
+            except asyncio.CancelledError:
+                pass
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "latency": self.latency.to_dict(),
+            "queue_wait": self.queue_wait.to_dict(),
+            "compile_time": self.compile_time.to_dict(),
+        }
+
+    # ---- 连接 ----
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = Connection(writer)
+        try:
+            while True:
+                msg = await read_message(reader)
+                if msg is None:
+                    break
+                op = msg.get("op", "compile")
+                if op == "compile":
+                    # 先检查再 acquire，坏请求不占 inflight
+                    if not isinstance(msg.get("function"), dict):
+                        await conn.send({"id": msg.get("id"), "ok": False, "error": "compile needs a function object"})
+                        continue
+                    conn.acquire()
+                    # 队列满时这里会阻塞，不再读这个连接，压力传回客户端
+                    await self.queue.put(Pending(msg.get("id"), msg["function"], conn, time.perf_counter()))
+                elif op == "stats":
+                    await conn.send({"id": msg.get("id"), "ok": True, "stats": self.stats()})
+                else:
+                    await conn.send({"id": msg.get("id"), "ok": False, "error": f"unknown op {op!r}"})
+            # 对端关闭写之后，把还没编译完的结果发完再关
+            await conn.idle.wait()
+        except ProtocolError as e:
+            # 流已经对不上了，回一条错误就断开
+            await conn.send({"id": None, "ok": False, "error": f"protocol error: {e}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ---- batch ----
+
+    async def run_batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_timeout
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # 同时在跑的 batch 不超过 worker 数
+            await self.slots.acquire()
+            task = asyncio.create_task(self.run_batch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def run_batch(self, batch: list[Pending]):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        for p in batch:
+            self.queue_wait.record(start - p.enqueued)
+        try:
+            results = await loop.run_in_executor(self.executor, compile_batch, [p.payload for p in batch])
+        except Exception as e:
+            results = [{"ok": False, "error": f"{type(e).__name__}: {e}"} for _ in batch]
+        finally:
+            self.slots.release()
+
+        self.batches += 1
+        for p, result in zip(batch, results):
+            result["id"] = p.req_id
+            self.requests += 1
+            if not result["ok"]:
+                self.errors += 1
+            if "compile_time" in result:
+                self.compile_time.record(result["compile_time"])
+            self.latency.record(time.perf_counter() - p.enqueued)
+            await p.conn.send(result)
+            p.conn.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="toy_ir compile service")
+    parser.add_argument("--unix", help="unix socket path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7878)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--batch-timeout", type=float, default=0.002)
+    parser.add_argument("--max-queue", type=int, default=1024)
+    args = parser.parse_args()
+
+    async def run():
+        server = CompileServer(args.workers, args.max_queue, args.batch_size, args.batch_timeout)
+        if args.unix:
+            await server.start_unix(args.unix)
+        else:
+            await server.start_tcp(args.host, args.port)
+        print(f"listening on {server.address}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+import heapq
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, Phi
+
+FORWARD = "forward"
+BACKWARD = "backward"
+
+
+class Analysis:
+    """
+    一个数据流问题，节点用 0..n-1 编号（Function 上就是 block id）
+
+    子类实现:
+      boundary(): 前向时 entry 的输入，后向时没有后继的节点的输入
+      top(): 其余节点的初值，要求是 meet 的单位元
+      meet(a, b)
+      transfer(b, x): 节点 b 的传递函数，不能原地修改 x
+    可选:
+      edge(src, dst, x): 沿 src -> dst 这条边传过去的值，返回 top 表示这条边走不到，
+        用来做条件常量传播这类和分支条件有关的分析
+
+    前向问题 transfer 的输入是 block 开头的值，输出是结尾的值；后向相反
+    """
+
+    direction = FORWARD
+
+    def boundary(self):
+        raise NotImplementedError
+
+    def top(self):
+        raise NotImplementedError
+
+    def meet(self, a, b):
+        raise NotImplementedError
+
+    def transfer(self, b: int, x):
+        raise NotImplementedError
+
+    def edge(self, src: int, dst: int, x):
+        return x
+
+
+class BitVectorAnalysis(Analysis):
+    """
+    值是当 bitset 用的 int，transfer 固定是 gen | (x & ~kill)
+      may=True: meet 是并集（liveness 之类），top 是空集
+      may=False: meet 是交集（dominators 之类），top 是全集
+    """
+
+    def __init__(self, gen, kill, width: int, may: bool = True, boundary: int = 0, direction: str = FORWARD):
+        self.gen = gen
+        self.kill = kill
+        self.may = may
+        self.full = (1 << width) - 1
+        self.boundary_value = boundary
+        self.direction = direction
+
+    def boundary(self):
+        return self.boundary_value
+
+    def top(self):
+        return 0 if self.may else self.full
+
+    def meet(self, a, b):
+        return a | b if self.may else a & b
+
+    def transfer(self, b, x):
+        return self.gen[b] | (x & ~self.kill[b])
+
+
+class SparseAnalysis:
+    """
+    稀疏的前向问题（SCCP 这类）：不给每个节点存一份完整的值，
+    整个函数共用一张 var -> 格值的表，要求每个变量只有一个定义（SSA）。
+    变量的值变了只重算用到它的节点，节点自己只记从哪些前驱能走进来
+
+    子类实现:
+      top(): 还没算到的变量的值，要求是 meet 的单位元
+      meet(a, b): 单个变量的格
+      uses(b): 节点 b 读到的、不是 b 自己前面定义的变量，不重复；phi 的 incoming 算在 phi 所在的节点
+      transfer(b, preds, value): 按表 value 和走得通的入边的来源 preds，
+        按指令顺序 yield b 里每个定义的 (var, 格值)；solver 每收到一个就 meet 进表，
+        b 后面的指令马上能看到
+      successors(b, value): 按表 value 现在走得通的后继，只能越来越多
+    """
+
+    direction = FORWARD
+
+    def top(self):
+        raise NotImplementedError
+
+    def meet(self, a, b):
+        raise NotImplementedError
+
+    def uses(self, b: int):
+        raise NotImplementedError
+
+    def transfer(self, b: int, preds, value):
+        raise NotImplementedError
+
+    def successors(self, b: int, value):
+        raise NotImplementedError
+
+
+@dataclass
+class DataflowResult:
+    """
+    ins[b] / outs[b]: block 开头 / 结尾的值，和方向无关
+    visits: transfer 被调用的次数
+    order: 求解时参与计算的节点，前向问题里就是从 entry 可达的节点
+    values: 稀疏问题的 var -> 格值；这时 ins[b] 是走得通的入边的来源
+      （frozenset，走不到的节点是 None），outs[b] 是走得通的后继
+    """
+
+    ins: list
+    outs: list
+    visits: int = 0
+    order: list = field(default_factory=list)
+    values: dict | None = None
+
+
+def reverse_postorder_ids(n: int, entry: int, succs):
+    order = []
+    visited = [False] * n
+    visited[entry] = True
+    stack = [(entry, iter(succs[entry]))]
+    while stack:
+        b, it = stack[-1]
+        for s in it:
+            if not visited[s]:
+                visited[s] = True
+                stack.append((s, iter(succs[s])))
+                break
+        else:
+            stack.pop()
+            order.append(b)
+    order.reverse()
+    return order
+
+
+def cfg_ids(func: Function):
+    """
+    返回 (succs, preds)，都是按 block id 索引的 id 列表
+    """
+    succs = [[s.id for s in bb.succs] for bb in func.blocks]
+    preds = [[p.id for p in bb.preds] for bb in func.blocks]
+    return succs, preds
+
+
+def scc_topo_ids(n: int, entry: int, succs):
+    """
+    Tarjan 求强连通分量（显式栈），返回每个节点所在分量的拓扑序编号，
+    entry 所在的分量是 0，走不到的节点是 -1
+    """
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    comp = [-1] * n
+    n_comps = 0
+
+    index[entry] = low[entry] = 0
+    counter = 1
+    stack.append(entry)
+    on_stack[entry] = True
+    work = [(entry, iter(succs[entry]))]
+    while work:
+        v, it = work[-1]
+        for w in it:
+            if index[w] == -1:
+                index[w] = low[w] = counter
+                counter += 1
+                stack.append(w)
+                on_stack[w] = True
+                work.append((w, iter(succs[w])))
+                break
+            if on_stack[w]:
+                low[v] = min(low[v], index[w])
+        else:
+            work.pop()
+            if work:
+                u = work[-1][0]
+                low[u] = min(low[u], low[v])
+            if low[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    comp[w] = n_comps
+                    if w == v:
+                        break
+                n_comps += 1
+
+    # Tarjan 按逆拓扑序产出分量
+    return [n_comps - 1 - c if c >= 0 else -1 for c in comp]
+
+
+def visit_order(analysis: Analysis, n: int, entry: int, succs):
+    """
+    前向：从 entry 出发的 RPO，但同一个强连通分量（循环）里的节点排在一起，
+    循环算稳定了再往后走；否则 DFS 先走出口时，循环后面的代码会排在循环体前面，
+    循环每迭代一次后面都要重算一遍。走不到的节点不算
+    后向：倒过来，再加上从 entry 走不到的节点
+    """
+    rpo = reverse_postorder_ids(n, entry, succs)
+    topo = scc_topo_ids(n, entry, succs)
+    rank = [0] * n
+    for i, b in enumerate(rpo):
+        rank[b] = i
+    order = sorted(rpo, key=lambda b: (topo[b], rank[b]))
+    if analysis.direction == FORWARD:
+        return order
+    seen = [False] * n
+    for b in order:
+        seen[b] = True
+    return order[::-1] + [b for b in range(n) if not seen[b]]
+
+
+def meet_sources(analysis: Analysis, b: int, forward: bool, entry: int, sources, out):
+    """
+    b 的输入：前向是所有前驱结尾的值的 meet，后向是所有后继开头的值的 meet
+    """
+    if (forward and b == entry) or not sources[b]:
+        return analysis.boundary()
+
+    ss = sources[b]
+    if type(analysis).edge is Analysis.edge:
+        x = out[ss[0]]
+        for s in ss[1:]:
+            x = analysis.meet(x, out[s])
+        return x
+
+    x = analysis.top()
+    for s in ss:
+        v = analysis.edge(s, b, out[s]) if forward else analysis.edge(b, s, out[s])
+        x = analysis.meet(x, v)
+    return x
+
+
+def solve_sparse(analysis: SparseAnalysis, n: int, entry: int, succs, worklist: bool = True) -> DataflowResult:
+    """
+    SparseAnalysis 的求解：节点第一次走得到、用到的变量变了、或者多了一条走得通的入边时重算，
+    worklist 按 visit_order 的优先级出队；worklist=False 是按编号顺序整轮整轮地扫，只用来做对比
+    """
+    order = visit_order(analysis, n, entry, succs)
+    rank = [-1] * n
+    for i, b in enumerate(order):
+        rank[b] = i
+    users = defaultdict(list)
+    for b in order:
+        for v in analysis.uses(b):
+            users[v].append(b)
+
+    top = analysis.top()
+    value = {}
+    ins = [None] * n
+    outs = [()] * n
+    ins[entry] = frozenset()
+    queued = [False] * n
+    heap = []
+
+    def push(b):
+        if worklist and not queued[b]:
+            queued[b] = True
+            heapq.heappush(heap, rank[b])
+
+    def visit(b) -> bool:
+        changed = False
+        for v, x in analysis.transfer(b, ins[b], value):
+            if x is top:
+                continue
+            old = value.get(v, top)
+            new = analysis.meet(old, x)
+            if new == old:
+                continue
+            value[v] = new
+            changed = True
+            for u in users[v]:
+                if ins[u] is not None:
+                    push(u)
+
+        feasible = tuple(analysis.successors(b, value))
+        # 走得通的边只会变多，个数没变就是没变
+        if len(feasible) != len(outs[b]):
+            for s in feasible:
+                if s not in outs[b]:
+                    ins[s] = frozenset((b,)) if ins[s] is None else ins[s] | {b}
+                    push(s)
+            outs[b] = feasible
+            changed = True
+        return changed
+
+    visits = 0
+    if worklist:
+        push(entry)
+        while heap:
+            b = order[heapq.heappop(heap)]
+            queued[b] = False
+            visits += 1
+            visit(b)
+    else:
+        nodes = sorted(order)
+        changed = True
+        while changed:
+            changed = False
+            for b in nodes:
+                if ins[b] is not None:
+                    visits += 1
+                    changed |= visit(b)
+
+    return DataflowResult(ins, outs, visits, order, value)
+
+
+def solve(analysis: Analysis, n: int, entry: int, succs, preds) -> DataflowResult:
+    """
+    worklist 按 visit_order 的优先级出队：每次取排在最前面的节点，
+    前面的值都稳定了才会往后传，无环的图上每个节点只算一次
+    """
+    if isinstance(analysis, SparseAnalysis):
+        return solve_sparse(analysis, n, entry, succs)
+    forward = analysis.direction == FORWARD
+    sources = preds if forward else succs
+    users = succs if forward else preds
+
+    order = visit_order(analysis, n, entry, succs)
+    rank = [-1] * n
+    for i, b in enumerate(order):
+        rank[b] = i
+
+    top = analysis.top()
+    inp = [top] * n
+    out = [top] * n
+    queued = [False] * n
+    for b in order:
+        queued[b] = True
+    heap = list(range(len(order)))
+
+    visits = 0
+    while heap:
+        b = order[heapq.heappop(heap)]
+        queued[b] = False
+
+        x = meet_sources(analysis, b, forward, entry, sources, out)
+        inp[b] = x
+
+        y = analysis.transfer(b, x)
+        visits += 1
+        if y == out[b]:
+            continue
+        out[b] = y
+        for u in users[b]:
+            if not queued[u] and rank[u] >= 0:
+                queued[u] = True
+                heapq.heappush(heap, rank[u])
+
+    if forward:
+        return DataflowResult(inp, out, visits, order)
+    return DataflowResult(out, inp, visits, order)
+
+
+def solve_round_robin(analysis: Analysis, n: int, entry: int, succs, preds) -> DataflowResult:
+    """
+    老的做法：按编号顺序整轮整轮地扫，直到一整轮都没有变化，只用来做对比
+    """
+    if isinstance(analysis, SparseAnalysis):
+        return solve_sparse(analysis, n, entry, succs, worklist=False)
+    forward = analysis.direction == FORWARD
+    sources = preds if forward else succs
+    nodes = sorted(visit_order(analysis, n, entry, succs))
+
+    top = analysis.top()
+    inp = [top] * n
+    out = [top] * n
+
+    visits = 0
+    changed = True
+    while changed:
+        changed = False
+        for b in nodes:
+            x = meet_sources(analysis, b, forward, entry, sources, out)
+            inp[b] = x
+            y = analysis.transfer(b, x)
+            visits += 1
+            if y != out[b]:
+                out[b] = y
+                changed = True
+
+    if forward:
+        return DataflowResult(inp, out, visits, nodes)
+    return DataflowResult(out, inp, visits, nodes)
+
+
+def solve_function(func: Function, analysis: Analysis, worklist: bool = True) -> DataflowResult:
+    if isinstance(analysis, SparseAnalysis):
+        # 稀疏问题只沿出边走，用不到 preds
+        succs = [[s.id for s in bb.succs.unique()] for bb in func.blocks]
+        return solve_sparse(analysis, len(func.blocks), func.entry.id, succs, worklist)
+    succs, preds = cfg_ids(func)
+    solver = solve if worklist else solve_round_robin
+    return solver(analysis, len(func.blocks), func.entry.id, succs, preds)
+
+
+# ---- liveness ----
+
+
+class LiveVariables(BitVectorAnalysis):
+    """
+    后向 may 问题，变量按第一次出现的顺序编号
+    phi 的 incoming 算在对应前驱的结尾，phi 的 dst 算作所在 block 的定义
+    """
+
+    def __init__(self, func: Function):
+        self.vars = []
+        self.index = {}
+
+        def bit(v):
+            if v not in self.index:
+                self.index[v] = len(self.vars)
+                self.vars.append(v)
+            return 1 << self.index[v]
+
+        n = len(func.blocks)
+        gen = [0] * n
+        kill = [0] * n
+        phi_uses = [0] * n
+        for bb in func.blocks:
+            b = bb.id
+            insts = bb.insts + [bb.terminator] if bb.terminator is not None else bb.insts
+            for inst in insts:
+                if isinstance(inst, Phi):
+                    for p, v in inst.incomings.items():
+                        if isinstance(v, str):
+                            phi_uses[p.id] |= bit(v)
+                else:
+                    for v in inst.uses():
+                        if not kill[b] & bit(v):
+                            gen[b] |= bit(v)
+                for v in inst.defs():
+                    kill[b] |= bit(v)
+
+        # live_in = use | ((live_out | phi_uses) & ~def)
+        self.phi_uses = phi_uses
+        gen = [gen[b] | (phi_uses[b] & ~kill[b]) for b in range(n)]
+        super().__init__(gen, kill, len(self.vars), may=True, direction=BACKWARD)
+
+    def names(self, bits: int) -> set[str]:
+        out = set()
+        while bits:
+            low = bits & -bits
+            out.add(self.vars[low.bit_length() - 1])
+            bits ^= low
+        return out
+
+
+def compute_liveness(func: Function):
+    """
+    返回 (live_in, live_out)，按 block id 索引的变量名集合
+    """
+    lv = LiveVariables(func)
+    result = solve_function(func, lv)
+    live_in = [lv.names(x) for x in result.ins]
+    # 结尾的值是后继 live_in 的并集，还要加上后继 phi 从这里取的值
+    live_out = [lv.names(x | lv.phi_uses[b]) for b, x in enumerate(result.outs)]
+    return live_in, live_out
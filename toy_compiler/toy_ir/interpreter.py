@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, Assign, BinaryOp, Phi, Branch, Jump, Return
+from toy_compiler.toy_ir.transformers import eval_binary
+
+
+@dataclass
+class ExecResult:
+    value: int | None
+    # 动态执行的指令数，包括 phi 和 terminator
+    steps: int
+
+
+def interpret(func: Function, args: dict[str, int] | None = None, profile=None, max_steps: int = 1_000_000):
+    """
+    直接解释执行 IR，SSA / 非 SSA 都可以
+    args: 没有定义的变量（函数入参）的初始值
+    profile: 如果给了，每走一条 CFG 边就调用 profile.record_edge(src, dst)
+    """
+    env = dict(args or {})
+    steps = 0
+
+    def value(v):
+        if isinstance(v, int):
+            return v
+        if v not in env:
+            raise ValueError(f"Use of undefined variable {v} in {func.name}")
+        return env[v]
+
+    prev = None
+    bb = func.entry
+    while True:
+        # phi 在 block 入口并行求值
+        n_phis = 0
+        phi_vals = []
+        undefs = []
+        for inst in bb.insts:
+            if not isinstance(inst, Phi):
+                break
+            n_phis += 1
+            if prev not in inst.incomings:
+                raise ValueError(f"Phi {inst.dst} in {bb.name} has no incoming from {prev.name if prev else None}")
+            v = inst.incomings[prev]
+            # insert_phi 不看活跃性，incoming 可能是这条路径上没定义过的变量，真正用到时才报错
+            if isinstance(v, str) and v not in env:
+                undefs.append(inst.dst)
+                continue
+            phi_vals.append((inst.dst, value(v)))
+        env.update(phi_vals)
+        for v in undefs:
+            env.pop(v, None)
+
+        for inst in bb.insts[n_phis:]:
+            if isinstance(inst, Assign):
+                env[inst.lhs] = value(inst.rhs)
+            elif isinstance(inst, BinaryOp):
+                env[inst.dst] = eval_binary(inst.op, value(inst.src1), value(inst.src2))
+            else:
+                raise NotImplementedError(f"cannot interpret {inst}")
+
+        steps += len(bb.insts) + 1
+        if steps > max_steps:
+            raise RuntimeError(f"Function {func.name} exceeded {max_steps} steps")
+
+        term = bb.terminator
+        if isinstance(term, Return):
+            ret = None if term.ret is None else value(term.ret)
+            return ExecResult(ret, steps)
+        if isinstance(term, Branch):
+            target = term.true_bb if value(term.cond) else term.false_bb
+        elif isinstance(term, Jump):
+            target = term.target
+        else:
+            raise ValueError(f"Block {bb.name} has no terminator")
+
+        if profile is not None:
+            profile.record_edge(bb, target)
+        prev, bb = bb, target
@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock, Phi, Branch, Jump, clone_inst, fresh_name
+from toy_compiler.toy_ir.ssa import repair_ssa_uses
+
+# 一次 thread_jumps 最多复制这么多条指令
+THREAD_BUDGET = 64
+# 超过这么多条（不算 phi）指令的 block 不复制
+THREAD_BLOCK_LIMIT = 8
+
+
+def branch_phi(bb: BasicBlock) -> Phi | None:
+    """
+    bb 以 br c 结尾、c 是 bb 自己的 phi 时返回这个 phi
+    """
+    term = bb.terminator
+    if type(term) is not Branch or not isinstance(term.cond, str) or term.true_bb is term.false_bb:
+        return None
+    for phi in bb.phis():
+        if phi.dst == term.cond:
+            return phi
+    return None
+
+
+def thread_jumps(func: Function, budget: int = THREAD_BUDGET, block_limit: int = THREAD_BLOCK_LIMIT) -> int:
+    """
+    SSA 上的 jump threading：
+
+        P: ...; jump J               P: ...; jump J'
+        J: c = phi(P: 1, Q: x)  =>   J': (J 的指令，c 换成 1); jump T
+           ...; br c, T, F           J: c = phi(Q: x); ...; br c, T, F
+
+    J 的条件只是沿某些前驱是常量，fold_constant_branches 折叠不了。
+    对这些以 jump 结尾的前驱各复制一份 J，直接跳到确定的后继：
+      - J 的 phi 在副本里换成来自 P 的值，其他定义换成新名字
+      - T 里的 phi 给副本补上和 J 一样的 incoming
+      - J 之后对 J 里定义的值的使用交给 repair_ssa_uses 插 phi
+    复制的指令总数不超过 budget。之后交给 simplify_cfg 清理
+    返回复制出来的 block 个数
+    """
+    taken = {v for bb in func.blocks for inst in bb.insts for v in inst.defs()}
+    names = {bb.name for bb in func.blocks}
+    versions = defaultdict(dict)
+    clones = set()
+    threaded = 0
+    spent = 0
+
+    for J in list(func.blocks):
+        phi = branch_phi(J)
+        if phi is None or len(J.preds.unique()) < 2:
+            continue
+        body = [inst for inst in J.insts if type(inst) is not Phi]
+        if len(body) > block_limit:
+            continue
+
+        term = J.terminator
+        # 只看这一轮之前就有的前驱，副本不再往下 thread
+        candidates = [
+            P
+            for P in J.preds.unique()
+            if P not in clones and type(P.terminator) is Jump and isinstance(phi.incomings.get(P), int)
+        ]
+        for P in candidates:
+            if spent + len(body) > budget:
+                break
+            T = term.true_bb if phi.incomings[P] else term.false_bb
+            if T is J:
+                continue
+
+            threaded += 1
+            spent += len(body)
+            clone = func.new_block(fresh_name(f"{J.name}.t{threaded}", names))
+            clones.add(clone)
+            vmap = {p.dst: p.incomings[P] for p in J.phis()}
+            for inst in body:
+                for v in inst.defs():
+                    vmap[v] = fresh_name(f"{v}_t{threaded}", taken)
+
+            def value(v):
+                return vmap.get(v, v) if isinstance(v, str) else v
+
+            clone.insts = [clone_inst(inst, value, lambda bb: bb) for inst in body]
+            clone.terminator = Jump(T)
+            func.add_edge(clone, T)
+            for p in T.phis():
+                if J in p.incomings:
+                    p.incomings[clone] = value(p.incomings[J])
+
+            # P 改跳到副本，J 里的 phi 顺带删掉来自 P 的 incoming
+            func.replace_terminator(P, Jump(clone))
+
+            for v, new in vmap.items():
+                versions[v][J] = v
+                versions[v][clone] = new
+
+    repair_ssa_uses(func, versions, taken=taken)
+    return threaded
@@ -0,0 +1,116 @@
+import heapq
+
+from toy_compiler.toy_ir.non_ssa_ir import Function
+from toy_compiler.toy_ir.dataflow import reverse_postorder_ids
+from toy_compiler.toy_ir.profiling import EdgeProfile
+
+
+def build_chains(func: Function, profile: EdgeProfile):
+    """
+    Pettis-Hansen 自底向上建链：
+    按边的权重从大到小，如果 src 是某条链的尾、dst 是另一条链的头，就把两条链接起来，
+    这样最热的边都变成 fallthrough。
+    回边（按 RPO 往回跳的边）不参与建链，否则循环会从 latch 开始排
+    """
+    n = len(func.blocks)
+    succs = [[s.id for s in bb.succs] for bb in func.blocks]
+    # 不可达的 block 排在最后
+    rpo = [n] * n
+    for i, b in enumerate(reverse_postorder_ids(n, func.entry.id, succs)):
+        rpo[b] = i
+
+    edges = []
+    for bb in func.blocks:
+        for succ in bb.succs:
+            w = profile.weight(bb, succ)
+            if w > 0 and rpo[succ.id] > rpo[bb.id]:
+                edges.append((w, bb, succ))
+    # 权重相同时按原来的顺序，保证结果确定
+    edges.sort(key=lambda e: (-e[0], e[1].id, e[2].id))
+
+    chain_of = {bb: [bb] for bb in func.blocks}
+    for _, src, dst in edges:
+        a = chain_of[src]
+        b = chain_of[dst]
+        if a is b or a[-1] is not src or b[0] is not dst or dst is func.entry:
+            continue
+        a.extend(b)
+        for bb in b:
+            chain_of[bb] = a
+
+    chains = []
+    seen = set()
+    for bb in func.blocks:
+        chain = chain_of[bb]
+        if id(chain) not in seen:
+            seen.add(id(chain))
+            chains.append(chain)
+    return chains, chain_of
+
+
+def order_chains(func: Function, profile: EdgeProfile, chains, chain_of):
+    """
+    entry 所在的链放最前面，之后每次挑和已经放好的 block 之间边权最大的链，
+    没有边相连时按原来的顺序
+    """
+    # 链之间的边权
+    links = {id(c): {} for c in chains}
+    for bb in func.blocks:
+        for succ in bb.succs:
+            w = profile.weight(bb, succ)
+            a, b = chain_of[bb], chain_of[succ]
+            if w > 0 and a is not b:
+                links[id(a)][id(b)] = links[id(a)].get(id(b), 0) + w
+                links[id(b)][id(a)] = links[id(b)].get(id(a), 0) + w
+
+    # 堆里是 (-边权, 原来的下标)，边权变了就压一个新的进去，旧的出堆时跳过；
+    # 边权相同时下标小的先出，和原来的顺序一致
+    index = {id(c): i for i, c in enumerate(chains)}
+    first = chain_of[func.entry]
+    placed = [first]
+    done = {id(first)}
+    score = {}
+    heap = [(0, i) for i, c in enumerate(chains) if c is not first]
+    heapq.heapify(heap)
+
+    def link(chain):
+        for other, w in links[id(chain)].items():
+            if other in done:
+                continue
+            score[other] = score.get(other, 0) + w
+            heapq.heappush(heap, (-score[other], index[other]))
+
+    link(first)
+    while heap:
+        neg, i = heapq.heappop(heap)
+        chain = chains[i]
+        if id(chain) in done or -neg != score.get(id(chain), 0):
+            continue
+        done.add(id(chain))
+        placed.append(chain)
+        link(chain)
+
+    return placed
+
+
+def layout_blocks(func: Function, profile: EdgeProfile) -> bool:
+    """
+    按 profile 重排 func.blocks，返回顺序是否有变化
+    """
+    chains, chain_of = build_chains(func, profile)
+    new_blocks = [bb for chain in order_chains(func, profile, chains, chain_of) for bb in chain]
+
+    changed = any(a is not b for a, b in zip(new_blocks, func.blocks))
+    func.set_blocks(new_blocks)
+    return changed
+
+
+def fallthrough_weight(func: Function, profile: EdgeProfile) -> int:
+    """
+    相邻 block 之间（可以 fallthrough）的边权之和，用来衡量 layout 的好坏
+    """
+    total = 0
+    for bb, nxt in zip(func.blocks, func.blocks[1:]):
+        if nxt in bb.succs:
+            total += profile.weight(bb, nxt)
+    return total
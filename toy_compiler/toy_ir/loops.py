@@ -0,0 +1,277 @@
+from dataclasses import dataclass, field
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock, Assign, BinaryOp, Phi, Branch, Jump, clone_inst, fresh_name
+from toy_compiler.toy_ir.ssa import compute_idom_ids, repair_ssa_uses
+from toy_compiler.toy_ir.transformers import constant_propagation, dce, eval_binary, rewrite_constants, simplify_cfg
+
+# 完全展开之后的指令数上限
+FULL_UNROLL_BUDGET = 256
+# 算 trip count 时最多模拟这么多次迭代
+MAX_TRIP_COUNT = 1024
+
+
+@dataclass
+class Loop:
+    """
+    自然循环：header 支配 latches，blocks 按 func.blocks 的顺序排列，包括 header
+    exits: 出循环的边 (src, dst)
+    """
+
+    header: BasicBlock
+    latches: list[BasicBlock]
+    blocks: list[BasicBlock]
+    exits: list[tuple[BasicBlock, BasicBlock]] = field(default_factory=list)
+
+    def size(self) -> int:
+        return sum(len(bb.insts) + 1 for bb in self.blocks)
+
+
+def find_loops(func: Function) -> list[Loop]:
+    """
+    找出所有自然循环，同一个 header 的回边合成一个循环，小的（内层的）排在前面
+    """
+    idom = compute_idom_ids(func)
+
+    def dominates(h, b):
+        while b != -1:
+            if b == h:
+                return True
+            b = idom[b]
+        return False
+
+    latches = {}
+    for bb in func.blocks:
+        if idom[bb.id] == -1 and bb is not func.entry:
+            continue  # 不可达
+        for succ in bb.succs.unique():
+            if dominates(succ.id, bb.id):
+                latches.setdefault(succ, []).append(bb)
+
+    loops = []
+    for header, ls in latches.items():
+        inside = [False] * len(func.blocks)
+        inside[header.id] = True
+        stack = list(ls)
+        while stack:
+            bb = stack.pop()
+            if inside[bb.id]:
+                continue
+            inside[bb.id] = True
+            # 走不到的 block 也可能连进循环，header 不支配的前驱都不算
+            stack.extend(p for p in bb.preds.unique() if dominates(header.id, p.id))
+
+        blocks = [bb for bb in func.blocks if inside[bb.id]]
+        exits = [(bb, s) for bb in blocks for s in bb.succs.unique() if not inside[s.id]]
+        loops.append(Loop(header, ls, blocks, exits))
+
+    loops.sort(key=lambda loop: len(loop.blocks))
+    return loops
+
+
+def innermost_loops(func: Function) -> list[Loop]:
+    loops = find_loops(func)
+    headers = {loop.header for loop in loops}
+    return [loop for loop in loops if not any(bb in headers for bb in loop.blocks if bb is not loop.header)]
+
+
+def trip_count(loop: Loop, const_env: dict, limit: int = MAX_TRIP_COUNT) -> int | None:
+    """
+    用常量模拟一遍循环，返回 header 执行的次数；
+    有 branch 条件算不出来，或者超过 limit 次，返回 None
+    """
+    members = set(loop.blocks)
+    env = {}
+
+    def value(v):
+        if isinstance(v, int):
+            return v
+        if v in env:
+            return env[v]
+        return const_env.get(v)
+
+    # 从循环外进来时 header 里 phi 的值，几个入口给的值要一样
+    for phi in loop.header.phis():
+        vals = {value(v) for p, v in phi.incomings.items() if p not in members}
+        env[phi.dst] = vals.pop() if len(vals) == 1 else None
+
+    count = 0
+    prev, bb = None, loop.header
+    while True:
+        if bb is loop.header:
+            count += 1
+            if count > limit:
+                return None
+        if prev is not None:
+            vals = [(phi.dst, value(phi.incomings.get(prev))) for phi in bb.phis()]
+            env.update(vals)
+
+        for inst in bb.insts:
+            kind = type(inst)
+            if kind is Assign:
+                env[inst.lhs] = value(inst.rhs)
+            elif kind is BinaryOp:
+                a, b = value(inst.src1), value(inst.src2)
+                env[inst.dst] = None
+                if a is not None and b is not None:
+                    try:
+                        env[inst.dst] = eval_binary(inst.op, a, b)
+                    except ZeroDivisionError:
+                        return None
+
+        term = bb.terminator
+        if type(term) is Branch:
+            c = value(term.cond)
+            if c is None:
+                return None
+            target = term.true_bb if c else term.false_bb
+        elif type(term) is Jump:
+            target = term.target
+        else:
+            return count
+        if target not in members:
+            return count
+        prev, bb = bb, target
+
+
+def can_unroll(func: Function, loop: Loop) -> bool:
+    if len(loop.latches) != 1 or loop.header is func.entry:
+        return False
+    latch = loop.latches[0]
+    return latch.succs.count(loop.header) == 1 and all(bb.terminator is not None for bb in loop.blocks)
+
+
+def unroll_loop(func: Function, loop: Loop, copies: int):
+    """
+    把循环体复制成 copies 份首尾相接：第 c 份的 latch 跳到第 c + 1 份的 header，
+    最后一份跳回原来的 header。每一份都保留原来的退出判断，所以 trip count 不用整除 copies
+
+      - 复制出来的 header 不需要 phi：phi 的值直接换成上一份 latch 传过来的值
+      - 其他定义都换成新的 SSA 名字
+      - 出口 block 里的 phi 给每一份的出口边补上 incoming
+      - 循环外直接用循环里定义的值的地方交给 repair_ssa_uses 按需插 phi
+    """
+    header = loop.header
+    latch = loop.latches[0]
+
+    taken = {v for bb in func.blocks for inst in bb.insts for v in inst.defs()}
+    names = {bb.name for bb in func.blocks}
+    loop_defs = [v for bb in loop.blocks for inst in bb.insts for v in inst.defs()]
+    header_phis = header.phis()
+
+    # vmaps[c]: 第 c 份里循环定义的变量 -> 名字或常量；bmaps[c]: block 映射
+    vmaps = [{v: v for v in loop_defs}]
+    bmaps = [{bb: bb for bb in loop.blocks}]
+    for c in range(1, copies):
+        prev = vmaps[c - 1]
+        vmap = {}
+        for phi in header_phis:
+            v = phi.incomings[latch]
+            vmap[phi.dst] = prev.get(v, v) if isinstance(v, str) else v
+        for v in loop_defs:
+            if v not in vmap:
+                vmap[v] = fresh_name(f"{v}_u{c}", taken)
+        vmaps.append(vmap)
+        bmaps.append({bb: func.new_block(fresh_name(f"{bb.name}.u{c}", names)) for bb in loop.blocks})
+
+    def lookup(vmap, v):
+        return vmap.get(v, v) if isinstance(v, str) else v
+
+    # 复制指令和 terminator
+    for c in range(1, copies):
+        vmap, bmap = vmaps[c], bmaps[c]
+        next_header = bmaps[c + 1][header] if c + 1 < copies else header
+
+        def value(v):
+            return lookup(vmap, v)
+
+        def block(bb):
+            if bb is header:
+                return next_header
+            return bmap.get(bb, bb)
+
+        def block_in_copy(bb):
+            return bmap.get(bb, bb)
+
+        for bb in loop.blocks:
+            clone = bmap[bb]
+            for inst in bb.insts:
+                if bb is header and type(inst) is Phi:
+                    continue
+                clone.insts.append(clone_inst(inst, value, block_in_copy))
+            # 只有 latch 的回边跳到下一份的 header
+            clone.terminator = clone_inst(bb.terminator, value, block if bb is latch else block_in_copy)
+
+    inside = set()
+    for bmap in bmaps:
+        inside.update(bmap.values())
+
+    # 连边。原来的 latch 改跳到第 1 份的 header，最后一份的 latch 接替它在 header 的前驱位置
+    last_latch = bmaps[-1][latch]
+    if copies > 1:
+        first = bmaps[1][header]
+        func.touch(latch)
+        func.touch(header)
+        latch.terminator.replace_successor(header, first)
+        latch.succs.replace(header, first)
+        first.preds.add(latch)
+        header.preds.replace(latch, last_latch)
+        for phi in header_phis:
+            v = phi.incomings[latch]
+            phi.replace_incoming(latch, last_latch)
+            phi.incomings[last_latch] = lookup(vmaps[-1], v)
+
+    for c in range(1, copies):
+        vmap, bmap = vmaps[c], bmaps[c]
+        for bb in loop.blocks:
+            clone = bmap[bb]
+            for succ in clone.terminator.successors():
+                if clone is last_latch and succ is header:
+                    clone.succs.add(header)
+                    continue
+                func.add_edge(clone, succ)
+                if succ not in inside:
+                    # 出口：succ 里 phi 补上来自这一份的 incoming
+                    for phi in succ.phis():
+                        if bb in phi.incomings and clone not in phi.incomings:
+                            phi.incomings[clone] = lookup(vmap, phi.incomings[bb])
+
+    # 循环里复制出来的指令已经换好了名字，只需要修循环外的使用
+    def_block = {v: bb for bb in loop.blocks for inst in bb.insts for v in inst.defs()}
+    versions = {v: {bmap[bb]: vmap[v] for bmap, vmap in zip(bmaps, vmaps)} for v, bb in def_block.items()}
+    repair_ssa_uses(func, versions, skip=inside, taken=taken)
+
+
+def unroll_loops(func: Function, factor: int = 1, budget: int = FULL_UNROLL_BUDGET):
+    """
+    SSA 上的循环展开，只处理最内层、只有一条回边的循环
+      - trip count 是常量、而且展开之后指令数不超过 budget：完全展开
+      - 否则 factor > 1 时按 factor 展开（展开之后也不能超过 budget）
+      - trip count 是 1 的循环不动，也不计数
+    展开之后交给 rewrite_constants / simplify_cfg / dce 清理。返回 (完全展开的个数, 部分展开的个数)
+    """
+    const_env = constant_propagation(func)
+    full = partial = 0
+
+    for loop in innermost_loops(func):
+        if not can_unroll(func, loop):
+            continue
+        size = loop.size()
+        trips = trip_count(loop, const_env)
+        if trips == 1:
+            # 第一次进 header 就出循环，没有可以复制的迭代
+            continue
+        if trips is not None and trips * size <= budget:
+            unroll_loop(func, loop, trips)
+            full += 1
+        elif factor > 1 and factor * size <= budget:
+            unroll_loop(func, loop, factor)
+            partial += 1
+
+    if full:
+        # 完全展开之后最后一份的退出判断是常量，回边走不到
+        rewrite_constants(func)
+    if full or partial:
+        simplify_cfg(func)
+        # 没有剪枝的 phi 化简之后会留下 h_0 = h 这种读未定义入参的赋值
+        dce(func)
+    return full, partial
@@ -103,6 +103,12 @@ class Terminator(Instruction):
         """
         raise NotImplementedError
 
+    def replace_successor(self, old, new):
+        """
+        把跳到 old 的目标都改成 new，只改 terminator 本身，不动 CFG
+        """
+        raise NotImplementedError
+
 
 class Branch(Terminator):
     def __init__(self, cond: str, true_bb, false_bb):
@@ -137,6 +143,12 @@ class Branch(Terminator):
         """
         return [self.true_bb, self.false_bb]
 
+    def replace_successor(self, old, new):
+        if self.true_bb is old:
+            self.true_bb = new
+        if self.false_bb is old:
+            self.false_bb = new
+
     def __str__(self) -> str:
         return f"br {self.cond}, {self.true_bb.name}, {self.false_bb.name}"
 
@@ -170,6 +182,10 @@ class Jump(Terminator):
         """
         return [self.target]
 
+    def replace_successor(self, old, new):
+        if self.target is old:
+            self.target = new
+
     def __str__(self) -> str:
         return f"jump {self.target.name}"
 
@@ -204,6 +220,9 @@ class Return(Terminator):
         """
         return []
 
+    def replace_successor(self, old, new):
+        pass
+
     def __str__(self) -> str:
         return f"return {self.ret}"
 
@@ -225,24 +244,193 @@ class Phi(Instruction):
         vars = [var for var in vars if isinstance(var, str)]
         return vars
 
+    def rename_def(self, old, new):
+        if self.dst == old:
+            self.dst = new
+
+    def rename_use(self, old, new):
+        for bb, v in self.incomings.items():
+            if isinstance(v, str) and v == old:
+                self.incomings[bb] = new
+
+    def replace_incoming(self, old, new):
+        """
+        把来自 old 的 incoming 改成来自 new，位置不变
+        """
+        if old in self.incomings:
+            self.incomings = {new if p is old else p: v for p, v in self.incomings.items()}
+
+    def align(self, preds):
+        """
+        按 preds 的顺序重排 incomings，不在 preds 里的排在最后
+        """
+        ordered = {p: self.incomings[p] for p in preds if p in self.incomings}
+        if len(ordered) != len(self.incomings):
+            for p, v in self.incomings.items():
+                ordered.setdefault(p, v)
+        self.incomings = ordered
+
     def __str__(self):
         args = ", ".join(f"{bb.name}: {v}" for bb, v in self.incomings.items())
         return f"{self.dst} = phi({args})"
 
 
-@dataclass
+def fresh_name(base: str, taken: set) -> str:
+    """
+    返回不在 taken 里的名字（base、base_1、base_2 ...），并加进 taken
+    """
+    name = base
+    i = 0
+    while name in taken:
+        i += 1
+        name = f"{base}_{i}"
+    taken.add(name)
+    return name
+
+
+def clone_inst(inst, value, block):
+    """
+    复制一条指令，value: 变量名 / 常量的映射，block: BasicBlock 的映射
+    """
+    kind = type(inst)
+    if kind is Assign:
+        return Assign(value(inst.lhs), value(inst.rhs))
+    if kind is BinaryOp:
+        return BinaryOp(inst.op, value(inst.dst), value(inst.src1), value(inst.src2))
+    if kind is Phi:
+        return Phi(value(inst.dst), {block(p): value(v) for p, v in inst.incomings.items()})
+    if kind is Branch:
+        return Branch(value(inst.cond), block(inst.true_bb), block(inst.false_bb))
+    if kind is Jump:
+        return Jump(block(inst.target))
+    if kind is Return:
+        return Return(None if inst.ret is None else value(inst.ret))
+    raise NotImplementedError(f"cannot clone {inst}")
+
+
+class EdgeList:
+    """
+    block 的 succs / preds
+
+    底下是按插入顺序排列的 dict: block -> 边数（br c, X, X 到 X 有两条边），
+    增删一条边都是 O(1)。遍历时每条边出现一次，顺序就是插入顺序，
+    phi 的 incomings 也是按插入顺序的 dict，两边一起增删就能保持对齐
+    """
+
+    __slots__ = ("counts", "size", "cached")
+
+    def __init__(self, blocks=()):
+        self.counts = {}
+        self.size = 0
+        # 按下标访问时展开的边列表，边一变就作废
+        self.cached = None
+        for bb in blocks:
+            self.add(bb)
+
+    def add(self, bb, n=1):
+        self.counts[bb] = self.counts.get(bb, 0) + n
+        self.size += n
+        self.cached = None
+
+    def remove(self, bb) -> int:
+        """
+        删掉一条到 bb 的边，返回到 bb 还剩几条边
+        """
+        n = self.counts.get(bb, 0)
+        if not n:
+            raise ValueError(f"no edge to {bb.name}")
+        self.size -= 1
+        self.cached = None
+        if n == 1:
+            del self.counts[bb]
+            return 0
+        self.counts[bb] = n - 1
+        return n - 1
+
+    def remove_all(self, bb) -> int:
+        """
+        删掉所有到 bb 的边，返回删了几条
+        """
+        n = self.counts.pop(bb, 0)
+        self.size -= n
+        self.cached = None
+        return n
+
+    def replace(self, old, new, n=None) -> int:
+        """
+        把到 old 的边换成到 new，位置不变；n 不为 None 时换过去之后只留 n 条
+        返回原来到 old 的边数
+        """
+        count = self.counts.get(old, 0)
+        if not count:
+            return 0
+        if n is None:
+            n = count
+        counts = {}
+        for bb, c in self.counts.items():
+            if bb is old:
+                bb, c = new, n
+            counts[bb] = counts.get(bb, 0) + c
+        self.counts = counts
+        self.size += n - count
+        self.cached = None
+        return count
+
+    def unique(self):
+        """
+        去重之后的 block，顺序和 phi 的 incomings 对齐
+        """
+        return self.counts.keys()
+
+    def count(self, bb) -> int:
+        return self.counts.get(bb, 0)
+
+    def __iter__(self):
+        for bb, n in self.counts.items():
+            if n == 1:
+                yield bb
+            else:
+                for _ in range(n):
+                    yield bb
+
+    def __getitem__(self, i):
+        if self.cached is None:
+            self.cached = list(self)
+        return self.cached[i]
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, bb):
+        return bb in self.counts
+
+    def copy(self, block=None) -> "EdgeList":
+        """
+        block: 可选的 BasicBlock 映射，复制 Function 时用来换成新的 block
+        """
+        new = EdgeList()
+        new.counts = dict(self.counts) if block is None else {block(bb): n for bb, n in self.counts.items()}
+        new.size = self.size
+        return new
+
+    def __repr__(self):
+        return f"EdgeList({[bb.name for bb in self]})"
+
+
+# block 按对象身份比较和 hash，不再 hash 名字字符串
+@dataclass(eq=False)
 class BasicBlock:
     name: str
     terminator: Terminator | None
     insts: list[Instruction]
-    succs: list["BasicBlock"] = field(default_factory=list)
-    preds: list["BasicBlock"] = field(default_factory=list)
+    succs: EdgeList = field(default_factory=EdgeList)
+    preds: EdgeList = field(default_factory=EdgeList)
+    # 在 Function.blocks 里的下标，由 Function 维护
+    # 分析可以直接用它索引 list，而不是用 block 做 dict 的 key
+    id: int = -1
 
-    def __hash__(self):
-        return hash(self.name)
-
-    def __eq__(self, other):
-        return isinstance(other, BasicBlock) and self.name == other.name
+    def phis(self) -> list[Phi]:
+        return [inst for inst in self.insts if isinstance(inst, Phi)]
 
 
 @dataclass
@@ -250,19 +438,58 @@ class Function:
     name: str
     blocks: list[BasicBlock] = field(default_factory=list)
     entry: BasicBlock | None = None
+    # 正在进行的 snapshot，见 toy_ir/snapshot.py
+    journal: object = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.renumber_blocks()
+
+    def touch(self, bb: BasicBlock):
+        """
+        原地修改 bb（指令、terminator、succs / preds）之前调用。
+        有 snapshot 时，bb 第一次被 touch 会存一份当前的状态，rollback 时还原；
+        没有 snapshot 时什么都不做
+        """
+        if self.journal is not None:
+            self.journal.save(bb)
 
     def new_block(self, name: str) -> BasicBlock:
-        bb = BasicBlock(name, None, [])
+        bb = BasicBlock(name, None, [], id=len(self.blocks))
         self.blocks.append(bb)
         if self.entry is None:
             self.entry = bb
         return bb
 
+    def renumber_blocks(self):
+        """
+        保证 blocks[i].id == i
+        """
+        for i, bb in enumerate(self.blocks):
+            bb.id = i
+
+    def set_blocks(self, blocks: list[BasicBlock]):
+        """
+        替换 / 重排 block 列表，所有对 func.blocks 的整体修改都应该走这里
+        """
+        self.blocks = blocks
+        self.renumber_blocks()
+
+    def remove_blocks(self, dead):
+        """
+        删除 dead 里的 block，剩下的 block 重新编号
+        """
+        self.set_blocks([bb for bb in self.blocks if bb not in dead])
+
     def build_cfg(self):
+        """
+        从 terminator 整个重建 CFG，只在构建 IR 之后调一次；
+        pass 里的局部修改用下面的边操作，不需要重建
+        """
         # 清空原有链接（如果重新 build）
         for bb in self.blocks:
-            bb.succs = []
-            bb.preds = []
+            self.touch(bb)
+            bb.succs = EdgeList()
+            bb.preds = EdgeList()
 
         for bb in self.blocks:
             term = bb.terminator
@@ -271,8 +498,121 @@ class Function:
 
             # 获取 successor list
             for succ in term.successors():
-                bb.succs.append(succ)
-                succ.preds.append(bb)
+                self.add_edge(bb, succ)
+
+        # preds 的顺序可能变了，phi 跟着重排
+        for bb in self.blocks:
+            for phi in bb.phis():
+                phi.align(bb.preds.unique())
+
+    # ---- CFG 边 ----
+    # 下面的操作只改动涉及的 block，都是 O(1)（不算 phi 个数和 block 的出度）
+    # 改动之前都会 touch 涉及的 block，调用方不用再 touch
+
+    def add_edge(self, src: BasicBlock, dst: BasicBlock):
+        """
+        加一条 src -> dst 的边，dst 里的 phi 需要调用方补上来自 src 的 incoming（追加在最后）
+        """
+        self.touch(src)
+        self.touch(dst)
+        src.succs.add(dst)
+        dst.preds.add(src)
+
+    def remove_edge(self, src: BasicBlock, dst: BasicBlock):
+        """
+        删掉一条 src -> dst 的边，src 不再是 dst 的前驱时顺带删掉 dst 里 phi 的 incoming
+        返回被删掉的 incoming: list[(phi, value)]
+        """
+        self.touch(src)
+        self.touch(dst)
+        src.succs.remove(dst)
+        if dst.preds.remove(src):
+            return []
+        dropped = []
+        for phi in dst.phis():
+            if src in phi.incomings:
+                dropped.append((phi, phi.incomings.pop(src)))
+        return dropped
+
+    def replace_terminator(self, bb: BasicBlock, term: Terminator):
+        """
+        换掉 bb 的 terminator，只增删前后不一样的那些边
+        新加的边同样要调用方补 phi；返回被删掉的 phi incoming
+        """
+        self.touch(bb)
+        added = list(term.successors())
+        dropped = []
+        if bb.terminator is not None:
+            for succ in bb.terminator.successors():
+                if succ in added:
+                    added.remove(succ)
+                else:
+                    dropped.extend(self.remove_edge(bb, succ))
+        bb.terminator = term
+        for succ in added:
+            self.add_edge(bb, succ)
+        return dropped
+
+    def split_edge(
+        self, src: BasicBlock, dst: BasicBlock, name: str | None = None, taken: set | None = None
+    ) -> BasicBlock:
+        """
+        在 src -> dst 中间插一个只有 jump 的新 block，dst 里 phi 的 incoming 原位改成来自新 block
+        br c, X, X 这种重复边一起拆到同一个新 block
+        没给 name 时用 src.dst，重名就加后缀；taken 是已有的 block 名字，连续拆很多条边时由调用方传进来
+        """
+        if name is None:
+            if taken is None:
+                taken = {bb.name for bb in self.blocks}
+            name = fresh_name(f"{src.name}.{dst.name}", taken)
+        mid = self.new_block(name)
+        mid.terminator = Jump(dst)
+
+        self.touch(src)
+        self.touch(dst)
+        src.terminator.replace_successor(dst, mid)
+        n = src.succs.replace(dst, mid)
+        if not n:
+            raise ValueError(f"no edge {src.name} -> {dst.name}")
+        mid.preds.add(src, n)
+        mid.succs.add(dst)
+        dst.preds.replace(src, mid, 1)
+        for phi in dst.phis():
+            phi.replace_incoming(src, mid)
+        return mid
+
+    def split_critical_edges(self) -> list[BasicBlock]:
+        """
+        拆掉所有 critical edge（源有多个后继、目标有多个前驱），返回新加的 block
+        """
+        added = []
+        taken = {bb.name for bb in self.blocks}
+        for bb in list(self.blocks):
+            if len(bb.succs.unique()) < 2:
+                continue
+            for succ in list(bb.succs.unique()):
+                if len(succ.preds.unique()) > 1:
+                    added.append(self.split_edge(bb, succ, taken=taken))
+        return added
+
+    def merge_blocks(self, A: BasicBlock, B: BasicBlock):
+        """
+        把 B 接到 A 后面，要求 A 的唯一后继是 B、B 的唯一前驱是 A、B 里没有 phi
+        B 的出边原位改成 A 的出边，B 本身留给调用方从 blocks 里删
+        """
+        self.touch(A)
+        self.touch(B)
+        for succ in B.succs.unique():
+            self.touch(succ)
+        A.insts.extend(B.insts)
+        A.terminator = B.terminator
+        A.succs = B.succs
+        for succ in B.succs.unique():
+            succ.preds.replace(B, A)
+            for phi in succ.phis():
+                phi.replace_incoming(B, A)
+        B.succs = EdgeList()
+        B.preds = EdgeList()
 
 
 class IRBuilder:
@@ -284,19 +624,16 @@ class IRBuilder:
         self.cur_bb = bb
 
     def emit(self, inst):
+        self.func.touch(self.cur_bb)
         self.cur_bb.insts.append(inst)
 
     def emit_terminator(self, term):
+        self.func.touch(self.cur_bb)
         self.cur_bb.terminator = term
 
 
 def print_function(func):
-    print(f"Function {func.name}:")
-    for bb in func.blocks:
-        print(f"  Block {bb.name}:")
-        for inst in bb.insts:
-            print(f"    {inst}")
-        if bb.terminator:
-            print(f"    {bb.terminator}")
-        print(f"    succs: {[b.name for b in bb.succs]}")
-        print(f"    preds: {[b.name for b in bb.preds]}")
+    # 实际的输出在 printer.dump_function 里，带缓冲
+    from toy_compiler.toy_ir.printer import dump_function
+
+    dump_function(func, edges=True)
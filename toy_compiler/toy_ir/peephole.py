@@ -0,0 +1,175 @@
+from collections import defaultdict
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, Assign, BinaryOp
+
+# op -> [rule]
+# rule(inst) 返回替换后的指令，不匹配时返回 None
+PEEPHOLE_RULES = defaultdict(list)
+
+# 单条指令最多连续改写的次数，保证一次 sweep 一定结束
+MAX_REWRITES_PER_INST = 8
+
+
+def register_rule(op: str):
+    """
+    注册一条 BinaryOp 的 peephole 规则，按注册顺序尝试
+
+        @register_rule("add")
+        def add_zero(inst): ...
+    """
+
+    def deco(fn):
+        PEEPHOLE_RULES[op].append(fn)
+        return fn
+
+    return deco
+
+
+def is_const(v, c) -> bool:
+    return isinstance(v, int) and v == c
+
+
+def log2_exact(v) -> int | None:
+    """
+    v 是 2 的正整数次幂时返回指数，否则返回 None
+    """
+    if isinstance(v, int) and v > 1 and v & (v - 1) == 0:
+        return v.bit_length() - 1
+    return None
+
+
+# ---- identity ----
+
+
+@register_rule("add")
+def add_zero(inst: BinaryOp):
+    # x + 0 / 0 + x
+    if is_const(inst.src2, 0):
+        return Assign(inst.dst, inst.src1)
+    if is_const(inst.src1, 0):
+        return Assign(inst.dst, inst.src2)
+    return None
+
+
+@register_rule("sub")
+def sub_zero(inst: BinaryOp):
+    # x - 0
+    if is_const(inst.src2, 0):
+        return Assign(inst.dst, inst.src1)
+    return None
+
+
+@register_rule("mul")
+def mul_one(inst: BinaryOp):
+    # x * 1 / 1 * x
+    if is_const(inst.src2, 1):
+        return Assign(inst.dst, inst.src1)
+    if is_const(inst.src1, 1):
+        return Assign(inst.dst, inst.src2)
+    return None
+
+
+@register_rule("div")
+def div_one(inst: BinaryOp):
+    # x / 1
+    if is_const(inst.src2, 1):
+        return Assign(inst.dst, inst.src1)
+    return None
+
+
+@register_rule("shl")
+@register_rule("shr")
+def shift_zero(inst: BinaryOp):
+    # x << 0 / x >> 0
+    if is_const(inst.src2, 0):
+        return Assign(inst.dst, inst.src1)
+    return None
+
+
+# ---- annihilator ----
+
+
+@register_rule("sub")
+def sub_self(inst: BinaryOp):
+    # x - x
+    if isinstance(inst.src1, str) and inst.src1 == inst.src2:
+        return Assign(inst.dst, 0)
+    return None
+
+
+@register_rule("mul")
+def mul_zero(inst: BinaryOp):
+    # x * 0 / 0 * x
+    if is_const(inst.src1, 0) or is_const(inst.src2, 0):
+        return Assign(inst.dst, 0)
+    return None
+
+
+@register_rule("shl")
+@register_rule("shr")
+def shift_of_zero(inst: BinaryOp):
+    # 0 << x / 0 >> x
+    if is_const(inst.src1, 0):
+        return Assign(inst.dst, 0)
+    return None
+
+
+# ---- strength reduction ----
+
+
+@register_rule("mul")
+def mul_pow2(inst: BinaryOp):
+    # x * 2^k -> x << k
+    k = log2_exact(inst.src2)
+    if k is not None:
+        return BinaryOp("shl", inst.dst, inst.src1, k)
+    k = log2_exact(inst.src1)
+    if k is not None:
+        return BinaryOp("shl", inst.dst, inst.src2, k)
+    return None
+
+
+@register_rule("div")
+def div_pow2(inst: BinaryOp):
+    # x / 2^k -> x >> k，div 是向下取整，和算术右移等价
+    k = log2_exact(inst.src2)
+    if k is not None:
+        return BinaryOp("shr", inst.dst, inst.src1, k)
+    return None
+
+
+def simplify_binary(inst: BinaryOp):
+    """
+    对单条 BinaryOp 反复应用规则，直到没有规则匹配或者不再是 BinaryOp
+    """
+    for _ in range(MAX_REWRITES_PER_INST):
+        if not isinstance(inst, BinaryOp):
+            break
+        for rule in PEEPHOLE_RULES.get(inst.op, ()):
+            new_inst = rule(inst)
+            if new_inst is not None:
+                inst = new_inst
+                break
+        else:
+            break
+    return inst
+
+
+def peephole(func: Function) -> bool:
+    """
+    线性扫描一遍所有 BinaryOp，做代数化简和强度削减
+    返回是否有改动
+    """
+    changed = False
+
+    for bb in func.blocks:
+        for i, inst in enumerate(bb.insts):
+            if not isinstance(inst, BinaryOp):
+                continue
+            new_inst = simplify_binary(inst)
+            if new_inst is not inst:
+                func.touch(bb)
+                bb.insts[i] = new_inst
+                changed = True
+
+    return changed
@@ -0,0 +1,408 @@
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock, Assign, BinaryOp, Phi, Jump, Branch, Return, Terminator
+from toy_compiler.toy_ir.ssa import construct_ssa
+from toy_compiler.toy_ir.transformers import eval_binary, rewrite_constants, dce, simplify_cfg, compute_reachable
+from toy_compiler.toy_ir.ranges import fold_branches_with_ranges
+from toy_compiler.toy_ir.jump_threading import thread_jumps
+from toy_compiler.toy_ir.verifier import verify_ir
+
+
+def count_insts(func: Function) -> int:
+    return sum(len(bb.insts) + (bb.terminator is not None) for bb in func.blocks)
+
+
+def run_to_fixpoint(func: Function, max_rounds: int = 1000):
+    """
+    老的做法：rewrite_constants / dce / simplify_cfg 整个函数反复跑，直到没有变化
+    返回 (rounds, visits)，visits 是三个 pass 扫过的指令总数
+    """
+    rounds = 0
+    visits = 0
+    changed = True
+
+    while changed and rounds < max_rounds:
+        visits += 3 * count_insts(func)
+        changed = rewrite_constants(func)
+        changed |= dce(func)
+        changed |= simplify_cfg(func)
+        rounds += 1
+
+    return rounds, visits
+
+
+@dataclass
+class OptimizeReport:
+    # worklist 上处理的条目数（指令 + block）
+    iterations: int = 0
+    # worklist 被排空的轮数（每轮之后可能做一次可达性检查）
+    rounds: int = 0
+    elapsed: float = 0.0
+    # 是否因为步数上限提前停止
+    hit_limit: bool = False
+    # 和整函数重跑的对比，只有传了 baseline 才填
+    rerun_rounds: int | None = None
+    rerun_visits: int | None = None
+    rerun_elapsed: float | None = None
+
+    @property
+    def time_saved(self) -> float | None:
+        if self.rerun_elapsed is None:
+            return None
+        return self.rerun_elapsed - self.elapsed
+
+    def __str__(self) -> str:
+        s = f"iterations={self.iterations} rounds={self.rounds} elapsed={self.elapsed * 1e3:.3f}ms"
+        if self.rerun_elapsed is not None:
+            s += (
+                f" | rerun: rounds={self.rerun_rounds} visits={self.rerun_visits}"
+                f" elapsed={self.rerun_elapsed * 1e3:.3f}ms saved={self.time_saved * 1e3:.3f}ms"
+            )
+        return s
+
+
+class Optimizer:
+    """
+    rewrite_constants + dce + simplify_cfg 的合并版本，输入要求是 SSA
+
+    所有 pass 共享一个 worklist：
+      - 指令被改写 / 失去 use / phi 少了 incoming，就把相关指令重新放进 worklist
+      - block 的 terminator 或 preds 变了，就把 block 放进 dirty 集合，尝试合并
+    每次入队都对应一个严格单调减少的量（指令数、非常量操作数、边数、block 数），
+    另外加一个和函数大小成正比的步数上限兜底
+    """
+
+    def __init__(self, func: Function, max_steps: int | None = None):
+        self.func = func
+
+        self.users = defaultdict(set)  # var -> {inst}
+        self.def_site = {}  # var -> inst
+        self.inst_block = {}  # inst -> bb
+
+        self.worklist = deque()
+        # 按函数里的顺序处理，从前往后合并，避免大 block 被反复搬运
+        self.dirty_blocks = deque()
+        self.suspects = set()  # 失去前驱但还有前驱的 block，可能是不可达的环
+
+        self.dead = set()
+        self.replaced = {}  # old inst -> new inst
+        self.sweep_blocks = set()
+        self.removed = [False] * len(func.blocks)  # 按 block id 索引
+
+        n_uses = 0
+        n_edges = 0
+        for bb in func.blocks:
+            n_edges += len(bb.succs)
+            for inst in self.block_insts(bb):
+                self.add_inst(inst, bb)
+                n_uses += len(inst.uses())
+                self.worklist.append(inst)
+            self.dirty_blocks.append(bb)
+
+        if max_steps is None:
+            max_steps = 4 * (len(self.inst_block) + n_uses + n_edges + len(func.blocks)) + 64
+        self.max_steps = max_steps
+
+    @staticmethod
+    def block_insts(bb: BasicBlock):
+        if bb.terminator is not None:
+            return bb.insts + [bb.terminator]
+        return list(bb.insts)
+
+    # ---- 维护 def-use ----
+
+    def add_inst(self, inst, bb):
+        self.inst_block[inst] = bb
+        for v in inst.uses():
+            self.users[v].add(inst)
+        for v in inst.defs():
+            self.def_site[v] = inst
+
+    def release_uses(self, inst):
+        for v in set(inst.uses()):
+            users = self.users[v]
+            users.discard(inst)
+            if not users and v in self.def_site:
+                self.worklist.append(self.def_site[v])
+
+    def kill(self, inst):
+        bb = self.inst_block[inst]
+        self.dead.add(inst)
+        self.sweep_blocks.add(bb)
+        self.release_uses(inst)
+        if isinstance(inst, Phi):
+            # 没有 phi 之后 bb 可能可以和前驱合并
+            self.dirty_blocks.extend(bb.preds)
+        for v in inst.defs():
+            if self.def_site.get(v) is inst:
+                del self.def_site[v]
+
+    def replace(self, old, new):
+        bb = self.inst_block[old]
+        self.replaced[old] = new
+        self.sweep_blocks.add(bb)
+        for v in set(old.uses()):
+            self.users[v].discard(old)
+        self.add_inst(new, bb)
+        self.worklist.append(new)
+
+    def is_dead(self, inst) -> bool:
+        return all(not self.users.get(v) for v in inst.defs())
+
+    # ---- CFG 编辑 ----
+
+    def remove_edge(self, src: BasicBlock, dst: BasicBlock):
+        for inst, v in self.func.remove_edge(src, dst):
+            if isinstance(v, str) and v not in inst.incomings.values():
+                self.users[v].discard(inst)
+                if not self.users[v] and v in self.def_site:
+                    self.worklist.append(self.def_site[v])
+            self.worklist.append(inst)
+
+        if src in dst.preds:
+            # br c, X, X 这种重复边，phi 的 incoming 还要保留
+            return
+        if dst is self.func.entry or self.removed[dst.id]:
+            return
+        if not dst.preds:
+            self.remove_block(dst)
+        else:
+            self.suspects.add(dst)
+            self.dirty_blocks.append(dst)
+
+    def remove_block(self, bb: BasicBlock):
+        self.removed[bb.id] = True
+        for inst in self.block_insts(bb):
+            if inst not in self.dead:
+                self.kill(inst)
+        for succ in list(bb.succs):
+            self.remove_edge(bb, succ)
+
+    def fold_branch(self, bb: BasicBlock, term: Branch):
+        target = term.true_bb if term.cond else term.false_bb
+        jump = Jump(target)
+        self.func.touch(bb)
+        bb.terminator = jump
+        self.inst_block[jump] = bb
+
+        # 保留一条到 target 的边，其余的都删掉
+        kept = False
+        for succ in term.successors():
+            if succ is target and not kept:
+                kept = True
+                continue
+            self.remove_edge(bb, succ)
+
+        self.dirty_blocks.append(bb)
+        self.dirty_blocks.append(target)
+
+    def has_live_phi(self, bb: BasicBlock) -> bool:
+        # phi 都在 block 开头，只看前缀
+        for inst in bb.insts:
+            if not isinstance(inst, Phi):
+                return False
+            if inst not in self.dead and inst not in self.replaced:
+                return True
+        return False
+
+    def try_merge(self, A: BasicBlock) -> bool:
+        if self.removed[A.id] or not isinstance(A.terminator, Jump):
+            return False
+        B = A.terminator.target
+        if B is A or B is self.func.entry or len(A.succs) != 1 or len(B.preds) != 1 or self.has_live_phi(B):
+            return False
+
+        # replace 换上去的新指令还登记在 B 上，要顺着 replaced 链一起改到 A
+        for inst in self.block_insts(B):
+            self.inst_block[inst] = A
+            while inst in self.replaced:
+                inst = self.replaced[inst]
+                self.inst_block[inst] = A
+        self.sweep_blocks.add(A)
+        self.func.merge_blocks(A, B)
+
+        self.removed[B.id] = True
+        # 合并进来的 terminator 可能是常量 branch
+        self.worklist.append(A.terminator)
+        return True
+
+    def remove_unreachable_suspects(self):
+        # 删掉的 block 在 sweep 之前 id 都还有效
+        reachable = compute_reachable(self.func)
+
+        for bb in self.func.blocks:
+            if not reachable[bb.id] and not self.removed[bb.id]:
+                # 入边都来自同样不可达的 block，删它们的时候会一起断掉
+                self.remove_block(bb)
+        self.suspects.clear()
+
+    # ---- 指令 ----
+
+    def fold(self, inst):
+        # 指令类都继承自 ABC，isinstance 比较慢，热路径上直接比 type
+        kind = type(inst)
+        if kind is BinaryOp:
+            if isinstance(inst.src1, int) and isinstance(inst.src2, int):
+                return Assign(inst.dst, eval_binary(inst.op, inst.src1, inst.src2))
+        elif kind is Phi:
+            values = list(inst.incomings.values())
+            if values and len(set(values)) == 1:
+                return Assign(inst.dst, values[0])
+        return None
+
+    def visit(self, inst):
+        if inst in self.dead or inst in self.replaced:
+            return
+        bb = self.inst_block[inst]
+        if self.removed[bb.id]:
+            return
+
+        kind = type(inst)
+        if kind is Branch:
+            if isinstance(inst.cond, int) and bb.terminator is inst:
+                self.fold_branch(bb, inst)
+            return
+        if kind is Jump or kind is Return:
+            return
+
+        if self.is_dead(inst):
+            self.kill(inst)
+            return
+
+        new_inst = self.fold(inst)
+        if new_inst is not None:
+            self.replace(inst, new_inst)
+            return
+
+        # 常量传播：把 lhs 的所有 use 直接换成常量
+        if kind is Assign and isinstance(inst.rhs, int):
+            users = self.users.pop(inst.lhs, set())
+            for user in users:
+                self.func.touch(self.inst_block[user])
+                user.rename_use(inst.lhs, inst.rhs)
+                self.worklist.append(user)
+            self.worklist.append(inst)
+
+    def remove_dead_cycles(self):
+        """
+        只靠 use 计数删不掉互相引用的死代码（比如没人用的循环变量），
+        所以 worklist 排空之后从 terminator 出发做一次标记
+        """
+        live = set()
+        stack = []
+        for bb in self.func.blocks:
+            if not self.removed[bb.id] and bb.terminator is not None:
+                stack.append(bb.terminator)
+        while stack:
+            inst = stack.pop()
+            for v in inst.uses():
+                def_inst = self.def_site.get(v)
+                if def_inst is not None and def_inst not in live:
+                    live.add(def_inst)
+                    stack.append(def_inst)
+
+        for inst, bb in list(self.inst_block.items()):
+            if (
+                isinstance(inst, Terminator)
+                or inst in live
+                or inst in self.dead
+                or inst in self.replaced
+                or self.removed[bb.id]
+            ):
+                continue
+            self.kill(inst)
+
+    def sweep(self):
+        for bb in self.sweep_blocks:
+            if self.removed[bb.id]:
+                continue
+            # phi 被原地换成了赋值的话，挪到剩下的 phi 后面，保证 phi 都在 block 开头
+            phis = []
+            new_insts = []
+            for inst in bb.insts:
+                while inst in self.replaced:
+                    inst = self.replaced[inst]
+                if inst not in self.dead:
+                    (phis if type(inst) is Phi else new_insts).append(inst)
+            self.func.touch(bb)
+            bb.insts = phis + new_insts
+        self.sweep_blocks.clear()
+
+        if any(self.removed):
+            self.func.remove_blocks({bb for bb in self.func.blocks if self.removed[bb.id]})
+
+    def run(self, report: OptimizeReport):
+        steps = 0
+        while True:
+            report.rounds += 1
+
+            while self.worklist or self.dirty_blocks:
+                if steps >= self.max_steps:
+                    report.hit_limit = True
+                    break
+                steps += 1
+                if self.worklist:
+                    self.visit(self.worklist.popleft())
+                else:
+                    bb = self.dirty_blocks.popleft()
+                    while self.try_merge(bb):
+                        pass
+
+            if report.hit_limit:
+                break
+            if self.suspects:
+                self.remove_unreachable_suspects()
+            if not (self.worklist or self.dirty_blocks):
+                self.remove_dead_cycles()
+            if not (self.worklist or self.dirty_blocks):
+                break
+
+        report.iterations = steps
+        self.sweep()
+
+
+def optimize(func: Function, max_steps: int | None = None, baseline: Function | None = None) -> OptimizeReport:
+    """
+    基于 worklist 的 rewrite_constants + dce + simplify_cfg 不动点
+    baseline 是和 func 相同的另一份 IR，给了的话会在上面跑 run_to_fixpoint 作为对比
+    """
+    report = OptimizeReport()
+
+    if baseline is not None:
+        start = time.perf_counter()
+        report.rerun_rounds, report.rerun_visits = run_to_fixpoint(baseline)
+        report.rerun_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Optimizer(func, max_steps).run(report)
+    report.elapsed = time.perf_counter() - start
+
+    return report
+
+
+def compile_function(func: Function, verify: str | None = None) -> OptimizeReport:
+    """
+    完整的编译流程：非 SSA -> SSA，然后跑到 rewrite_constants / dce / simplify_cfg 的不动点；
+    区间分析能再折叠掉 branch，或者 jump threading 复制了 block 的话，再跑一遍
+    verify: 给了校验级别（verifier.STRUCTURAL / FULL）的话，每一步之后都校验一遍
+    """
+
+    def check():
+        if verify is not None:
+            verify_ir(func, verify)
+
+    construct_ssa(func)
+    check()
+    report = optimize(func)
+    check()
+    if fold_branches_with_ranges(func):
+        check()
+        report = optimize(func)
+        check()
+    if thread_jumps(func):
+        check()
+        report = optimize(func)
+        check()
+    return report
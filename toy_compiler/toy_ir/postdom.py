@@ -0,0 +1,130 @@
+from dataclasses import dataclass, field
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock, Return
+from toy_compiler.toy_ir.ssa import (
+    bits_to_blocks,
+    build_dominator_tree,
+    dominance_frontier_ids,
+    dominator_bitsets,
+    idom_from_bitsets,
+    immediate_dominators_ids,
+)
+
+
+@dataclass
+class ReverseCFG:
+    """
+    反向 CFG，加一个虚拟 exit 作为入口：
+      - 所有 Return block 连到 exit
+      - 走不到 exit 的死循环，挑一个 block 也连到 exit（fake_exits）
+    节点编号沿用 block id，exit 的 id 是 len(func.blocks)
+    preds[b] 是反向图里的前驱，也就是原图的后继
+    """
+
+    exit: BasicBlock
+    nodes: list[BasicBlock]
+    preds: list[list[int]]
+    fake_exits: list[BasicBlock] = field(default_factory=list)
+
+
+def build_reverse_cfg(func: Function) -> ReverseCFG:
+    n = len(func.blocks)
+    exit = BasicBlock("__exit__", None, [], id=n)
+    preds = []
+    for bb in func.blocks:
+        preds.append([s.id for s in bb.succs])
+        if isinstance(bb.terminator, Return):
+            preds[-1].append(n)
+    preds.append([])
+
+    rcfg = ReverseCFG(exit, func.blocks + [exit], preds)
+
+    # 原图里能走到 exit 的 block，也就是反向图里从 exit 可达的
+    rsuccs = [[] for _ in range(n + 1)]
+    for b, ps in enumerate(preds):
+        for p in ps:
+            rsuccs[p].append(b)
+
+    reached = [False] * (n + 1)
+
+    def walk(root):
+        stack = [root]
+        while stack:
+            b = stack.pop()
+            if reached[b]:
+                continue
+            reached[b] = True
+            stack.extend(rsuccs[b])
+
+    walk(n)
+    # 死循环：按逆序挑 block 连到 exit，这样选中的通常是循环里靠后的 block
+    for bb in reversed(func.blocks):
+        if not reached[bb.id]:
+            preds[bb.id].append(n)
+            rsuccs[n].append(bb.id)
+            rcfg.fake_exits.append(bb)
+            walk(bb.id)
+
+    return rcfg
+
+
+def compute_post_dominator_sets(func: Function, rcfg: ReverseCFG):
+    """
+    返回:
+        pdom: dict[BasicBlock, set[BasicBlock]]，包含虚拟 exit
+    """
+    pdom = dominator_bitsets(len(rcfg.nodes), rcfg.exit.id, rcfg.preds)
+    return {bb: bits_to_blocks(pdom[bb.id], rcfg.nodes) for bb in rcfg.nodes}
+
+
+def compute_ipdom(func: Function, rcfg: ReverseCFG, pdom: dict):
+    """
+    返回:
+        ipdom: dict[BasicBlock, BasicBlock | None]，ipdom[exit] = None
+    """
+    bitsets = []
+    for bb in rcfg.nodes:
+        bits = 0
+        for d in pdom[bb]:
+            bits |= 1 << d.id
+        bitsets.append(bits)
+
+    ipdom = idom_from_bitsets(len(rcfg.nodes), rcfg.exit.id, bitsets)
+    return {bb: rcfg.nodes[ipdom[bb.id]] if ipdom[bb.id] >= 0 else None for bb in rcfg.nodes}
+
+
+def compute_ipdom_ids(rcfg: ReverseCFG):
+    """
+    直接在反向图上跑 Cooper-Harvey-Kennedy，按 id 索引，exit 为 -1
+    """
+    return immediate_dominators_ids(len(rcfg.nodes), rcfg.exit.id, rcfg.preds)
+
+
+def build_post_dominator_tree(func: Function, ipdom: dict):
+    return build_dominator_tree(func, ipdom)
+
+
+def control_dependence_ids(rcfg: ReverseCFG, ipdom):
+    """
+    反向图上的 dominance frontier，ipdom 是按 id 索引的 list
+    cdeps[b] 是 b 控制依赖的 block id，也就是决定 b 会不会执行的那些 branch 所在的 block
+    """
+    return dominance_frontier_ids(len(rcfg.nodes), rcfg.preds, ipdom)
+
+
+def build_control_dependence(func: Function, rcfg: ReverseCFG, ipdom: dict):
+    """
+    返回:
+        cdeps: dict[BasicBlock, set[BasicBlock]]
+    """
+    ipdom_ids = [ipdom[bb].id if ipdom.get(bb) is not None else -1 for bb in rcfg.nodes]
+    cdeps = control_dependence_ids(rcfg, ipdom_ids)
+    return {bb: {rcfg.nodes[i] for i in cdeps[bb.id]} for bb in func.blocks}
+
+
+def print_control_dependence(cdeps):
+    for b, ds in cdeps.items():
+        if ds:
+            print(f"cd({b.name}) = {sorted(d.name for d in ds)}")
+        else:
+            print(f"cd({b.name}) = None")
@@ -0,0 +1,166 @@
+import sys
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock
+
+
+class TextBuffer:
+    """
+    先把文本攒在 list 里，攒够 limit 个字符再一次性写到 out，
+    避免每行一次 print / write
+    """
+
+    def __init__(self, out=None, limit: int = 1 << 16):
+        self.out = out if out is not None else sys.stdout
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+
+    def write(self, s: str):
+        self.parts.append(s)
+        self.size += len(s)
+        if self.size >= self.limit:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.out.write("".join(self.parts))
+            self.parts = []
+            self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+def select_blocks(func: Function, blocks=None):
+    """
+    blocks: None 表示全部；也可以是 block 名字的集合，或者 BasicBlock -> bool 的函数
+    """
+    if blocks is None:
+        return func.blocks
+    if callable(blocks):
+        return [bb for bb in func.blocks if blocks(bb)]
+    names = set(blocks)
+    return [bb for bb in func.blocks if bb.name in names]
+
+
+def write_function(buf: TextBuffer, func: Function, blocks=None, edges: bool = False, compact: bool = False):
+    w = buf.write
+    if compact:
+        # 一个 block 一行: name: inst; inst; term
+        w(f"function {func.name}\n")
+        for bb in select_blocks(func, blocks):
+            items = [str(inst) for inst in bb.insts]
+            if bb.terminator:
+                items.append(str(bb.terminator))
+            w(f"{bb.name}: {'; '.join(items)}")
+            if edges:
+                w(f"  -> {' '.join(s.name for s in bb.succs)}")
+            w("\n")
+        return
+
+    w(f"Function {func.name}:\n")
+    for bb in select_blocks(func, blocks):
+        w(f"  Block {bb.name}:\n")
+        for inst in bb.insts:
+            w(f"    {inst}\n")
+        if bb.terminator:
+            w(f"    {bb.terminator}\n")
+        if edges:
+            w(f"    succs: {[b.name for b in bb.succs]}\n")
+            w(f"    preds: {[b.name for b in bb.preds]}\n")
+
+
+def dump_function(func: Function, out=None, blocks=None, edges: bool = False, compact: bool = False):
+    """
+    把 func 写到文本流 out（默认 stdout）
+      blocks: 只输出选中的 block，见 select_blocks
+      edges: 是否输出 succs / preds
+      compact: 一个 block 一行
+    """
+    with TextBuffer(out) as buf:
+        write_function(buf, func, blocks, edges, compact)
+
+
+def dump_functions(funcs, out=None, functions=None, blocks=None, edges: bool = False, compact: bool = False):
+    """
+    functions: 只输出这些名字的函数，None 表示全部
+    """
+    names = set(functions) if functions is not None else None
+    with TextBuffer(out) as buf:
+        for func in funcs:
+            if names is None or func.name in names:
+                write_function(buf, func, blocks, edges, compact)
+
+
+# ---- Graphviz ----
+
+
+def dot_quote(s: str) -> str:
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def dot_label(bb: BasicBlock) -> str:
+    # \l 表示左对齐换行
+    lines = [f"{bb.name}:"] + [str(inst) for inst in bb.insts]
+    if bb.terminator:
+        lines.append(str(bb.terminator))
+    return "".join(line.replace("\\", "\\\\").replace('"', '\\"') + "\\l" for line in lines)
+
+
+def cfg_to_dot(func: Function, out=None, blocks=None, insts: bool = True):
+    """
+    CFG 输出成 DOT，insts=False 时节点只写 block 名字
+    Branch 的 true / false 边分别标 T / F
+    """
+    selected = select_blocks(func, blocks)
+    chosen = None if blocks is None else {bb.id for bb in selected}
+
+    with TextBuffer(out) as buf:
+        w = buf.write
+        w(f"digraph {dot_quote(func.name)} {{\n")
+        w("  node [shape=box, fontname=monospace];\n")
+        for bb in selected:
+            label = f'"{dot_label(bb)}"' if insts else dot_quote(bb.name)
+            w(f"  b{bb.id} [label={label}];\n")
+        for bb in selected:
+            term = bb.terminator
+            succs = term.successors() if term is not None else []
+            for i, succ in enumerate(succs):
+                if chosen is not None and succ.id not in chosen:
+                    continue
+                attr = ""
+                if len(succs) == 2:
+                    attr = ' [label="T"]' if i == 0 else ' [label="F"]'
+                w(f"  b{bb.id} -> b{succ.id}{attr};\n")
+        w("}\n")
+
+
+def dom_tree_to_dot(func: Function, dom_tree: dict, df: dict | None = None, out=None):
+    """
+    dominator tree 输出成 DOT
+      dom_tree: build_dominator_tree 的结果
+      df: build_dominance_frontier 的结果，给了就额外画成虚线
+    从 entry 开始用显式栈遍历，10 万个 block 的深链也不会爆栈
+    """
+    with TextBuffer(out) as buf:
+        w = buf.write
+        w(f"digraph {dot_quote(func.name + '.domtree')} {{\n")
+        w("  node [shape=box, fontname=monospace];\n")
+
+        stack = [func.entry]
+        while stack:
+            bb = stack.pop()
+            w(f"  b{bb.id} [label={dot_quote(bb.name)}];\n")
+            children = dom_tree.get(bb, [])
+            for child in children:
+                w(f"  b{bb.id} -> b{child.id};\n")
+            stack.extend(reversed(children))
+
+        if df:
+            for bb in func.blocks:
+                for d in sorted(df.get(bb, ()), key=lambda d: d.id):
+                    w(f"  b{bb.id} -> b{d.id} [style=dashed, color=gray, constraint=false];\n")
+        w("}\n")
@@ -0,0 +1,117 @@
+import hashlib
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock
+from toy_compiler.toy_ir.interpreter import interpret
+
+PROFILE_FORMAT_VERSION = 1
+
+
+def function_hash(func: Function) -> str:
+    """
+    函数的结构 hash：只和 block 名字、指令、terminator 有关，和 block 顺序无关，
+    所以重新编译出同样的 IR、或者 layout 之后 hash 都不变
+    """
+    h = hashlib.sha256()
+    h.update(func.name.encode())
+    h.update(f"\0entry={func.entry.name}".encode())
+    for bb in sorted(func.blocks, key=lambda b: b.name):
+        h.update(f"\0{bb.name}:".encode())
+        for inst in bb.insts:
+            h.update(f"\n{inst}".encode())
+        h.update(f"\n{bb.terminator}".encode())
+    return h.hexdigest()[:16]
+
+
+@dataclass
+class EdgeProfile:
+    """
+    一个函数的边执行次数，key 是 (src.name, dst.name)
+    """
+
+    func_name: str
+    func_hash: str
+    edges: dict[tuple[str, str], int] = field(default_factory=lambda: defaultdict(int))
+    runs: int = 0
+
+    @classmethod
+    def for_function(cls, func: Function):
+        return cls(func.name, function_hash(func))
+
+    def record_edge(self, src: BasicBlock, dst: BasicBlock):
+        self.edges[(src.name, dst.name)] += 1
+
+    def weight(self, src: BasicBlock, dst: BasicBlock) -> int:
+        return self.edges.get((src.name, dst.name), 0)
+
+    def merge(self, other: "EdgeProfile"):
+        for edge, count in other.edges.items():
+            self.edges[edge] += count
+        self.runs += other.runs
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.func_name,
+            "runs": self.runs,
+            "edges": [[src, dst, count] for (src, dst), count in sorted(self.edges.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, func_hash: str, d: dict):
+        profile = cls(d["name"], func_hash, runs=d.get("runs", 0))
+        for src, dst, count in d["edges"]:
+            profile.edges[(src, dst)] += count
+        return profile
+
+
+def profile_function(func: Function, inputs: list[dict[str, int]], profile: EdgeProfile | None = None) -> EdgeProfile:
+    """
+    在 inputs 上逐个解释执行 func，累计边的执行次数
+    """
+    if profile is None:
+        profile = EdgeProfile.for_function(func)
+    for args in inputs:
+        interpret(func, args, profile=profile)
+        profile.runs += 1
+    return profile
+
+
+class ProfileDB:
+    """
+    持久化的 profile，按 function_hash 索引，存成 json：
+
+        {"version": 1, "functions": {hash: {"name": ..., "runs": ..., "edges": [[src, dst, count], ...]}}}
+    """
+
+    def __init__(self):
+        self.profiles: dict[str, EdgeProfile] = {}
+
+    def add(self, profile: EdgeProfile):
+        if profile.func_hash in self.profiles:
+            self.profiles[profile.func_hash].merge(profile)
+        else:
+            self.profiles[profile.func_hash] = profile
+
+    def lookup(self, func: Function) -> EdgeProfile | None:
+        return self.profiles.get(function_hash(func))
+
+    def save(self, path):
+        data = {
+            "version": PROFILE_FORMAT_VERSION,
+            "functions": {h: p.to_dict() for h, p in sorted(self.profiles.items())},
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != PROFILE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported profile version {data.get('version')}")
+        db = cls()
+        for h, d in data["functions"].items():
+            db.add(EdgeProfile.from_dict(h, d))
+        return db
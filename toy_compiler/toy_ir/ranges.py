@@ -0,0 +1,231 @@
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, Assign, BinaryOp, Phi, Branch, Jump
+from toy_compiler.toy_ir.dataflow import reverse_postorder_ids
+from toy_compiler.toy_ir.transformers import remove_unreachable_blocks
+
+# 区间用 (lo, hi) 表示，两端可以是 ±inf；None 表示还没有值（bottom）
+TOP = (-math.inf, math.inf)
+
+# loop header 上的 phi 更新超过这么多次就 widening
+WIDEN_DELAY = 2
+# 不在 loop header 上的 phi 也设一个上限，防止不可归约的 CFG 不收敛
+WIDEN_FALLBACK = 8
+# 移位量超过这个就不算了
+MAX_SHIFT = 64
+
+
+def join(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+
+def widen(old, new):
+    """
+    往外长的那一端直接推到无穷
+    """
+    lo = old[0] if new[0] >= old[0] else -math.inf
+    hi = old[1] if new[1] <= old[1] else math.inf
+    return (lo, hi)
+
+
+def corners(f, a, b):
+    """
+    单调（或分段单调）运算的结果在四个角上取到极值
+    inf * 0 之类算不出来的情况退化成 TOP
+    """
+    values = []
+    for x in a:
+        for y in b:
+            try:
+                v = f(x, y)
+            except (OverflowError, ValueError, ZeroDivisionError):
+                return TOP
+            if isinstance(v, float) and math.isnan(v):
+                return TOP
+            values.append(v)
+    return (min(values), max(values))
+
+
+def mul(x, y):
+    # 区间端点里 0 * inf 按 0 算
+    if x == 0 or y == 0:
+        return 0
+    return x * y
+
+
+def floordiv(x, y):
+    if math.isinf(x) and math.isinf(y):
+        return math.nan
+    if math.isinf(y):
+        return 0 if (x >= 0) == (y > 0) else -1
+    if math.isinf(x):
+        return x if y > 0 else -x
+    return x // y
+
+
+def eval_range(op, a, b):
+    if op == "add":
+        return (a[0] + b[0], a[1] + b[1])
+    if op == "sub":
+        return (a[0] - b[1], a[1] - b[0])
+    if op == "mul":
+        return corners(mul, a, b)
+    if op == "div":
+        # 除数区间跨过 0 就不知道了
+        if b[0] <= 0 <= b[1]:
+            return TOP
+        return corners(floordiv, a, b)
+    if op in ("shl", "shr"):
+        # 移位量要在 [0, MAX_SHIFT] 里，这时候等价于乘 / 除 2^k
+        if b[0] < 0 or b[1] > MAX_SHIFT:
+            return TOP
+        powers = (1 << int(b[0]), 1 << int(b[1]))
+        return corners(mul if op == "shl" else floordiv, a, powers)
+    return TOP
+
+
+@dataclass
+class ValueRanges:
+    """
+    ranges: var -> (lo, hi)
+    executable: 可能走到的边 (src.id, dst.id)
+    reached: 按 block id 索引，block 是否可能执行
+    """
+
+    ranges: dict
+    executable: set
+    reached: list[bool]
+    defined: set = field(default_factory=set)
+    rounds: int = 0
+
+    def get(self, v):
+        if isinstance(v, int):
+            return (v, v)
+        if v in self.ranges:
+            return self.ranges[v]
+        # 没有定义的变量（函数入参）什么值都可能
+        return None if v in self.defined else TOP
+
+
+def compute_value_ranges(func: Function) -> ValueRanges:
+    """
+    SSA 上的区间分析，输入要求是 SSA
+
+    和 SCCP 一样只沿可能执行的边传播：branch 条件的区间不含 0 就只走 true 边，
+    恒为 0 就只走 false 边；phi 只合并可执行的入边。
+    按 RPO 反复扫到不动点，loop header 上的 phi 反复变大时做 widening
+    """
+    blocks = func.blocks
+    n = len(blocks)
+    succs = [[s.id for s in bb.succs] for bb in blocks]
+    rpo = reverse_postorder_ids(n, func.entry.id, succs)
+    order = [n] * n
+    for i, b in enumerate(rpo):
+        order[b] = i
+
+    # RPO 里的回边指向的就是 loop header
+    headers = [False] * n
+    for b in rpo:
+        for s in succs[b]:
+            if order[s] <= order[b]:
+                headers[s] = True
+
+    defined = {v for bb in blocks for inst in bb.insts for v in inst.defs()}
+    info = ValueRanges({}, set(), [False] * n, defined)
+    info.reached[func.entry.id] = True
+    ranges = info.ranges
+    updates = defaultdict(int)
+
+    def mark_edge(src, dst) -> bool:
+        if (src.id, dst.id) in info.executable:
+            return False
+        info.executable.add((src.id, dst.id))
+        info.reached[dst.id] = True
+        return True
+
+    changed = True
+    while changed:
+        changed = False
+        info.rounds += 1
+        for b in rpo:
+            if not info.reached[b]:
+                continue
+            bb = blocks[b]
+
+            for inst in bb.insts:
+                kind = type(inst)
+                if kind is Assign:
+                    dst, new = inst.lhs, info.get(inst.rhs)
+                elif kind is BinaryOp:
+                    a, c = info.get(inst.src1), info.get(inst.src2)
+                    if a is None or c is None:
+                        continue
+                    dst, new = inst.dst, eval_range(inst.op, a, c)
+                elif kind is Phi:
+                    dst, new = inst.dst, None
+                    for p, v in inst.incomings.items():
+                        if (p.id, b) in info.executable:
+                            new = join(new, info.get(v))
+                else:
+                    continue
+                if new is None:
+                    continue
+
+                old = ranges.get(dst)
+                new = join(old, new)
+                if new == old:
+                    continue
+                if kind is Phi and old is not None:
+                    updates[dst] += 1
+                    limit = WIDEN_DELAY if headers[b] else WIDEN_FALLBACK
+                    if updates[dst] > limit:
+                        new = widen(old, new)
+                ranges[dst] = new
+                changed = True
+
+            term = bb.terminator
+            if type(term) is Branch:
+                r = info.get(term.cond)
+                if r is None:
+                    continue
+                if r[0] > 0 or r[1] < 0:
+                    changed |= mark_edge(bb, term.true_bb)
+                elif r == (0, 0):
+                    changed |= mark_edge(bb, term.false_bb)
+                else:
+                    changed |= mark_edge(bb, term.true_bb)
+                    changed |= mark_edge(bb, term.false_bb)
+            elif type(term) is Jump:
+                changed |= mark_edge(bb, term.target)
+
+    return info
+
+
+def fold_branches_with_ranges(func: Function) -> int:
+    """
+    用区间分析折叠条件确定的 branch，并删掉因此不可达的 block
+    返回折叠的 branch 个数
+    """
+    info = compute_value_ranges(func)
+
+    folded = 0
+    for bb in func.blocks:
+        term = bb.terminator
+        if not info.reached[bb.id] or type(term) is not Branch:
+            continue
+        taken_true = (bb.id, term.true_bb.id) in info.executable
+        taken_false = (bb.id, term.false_bb.id) in info.executable
+        if term.true_bb is term.false_bb or taken_true == taken_false:
+            continue
+        func.replace_terminator(bb, Jump(term.true_bb if taken_true else term.false_bb))
+        folded += 1
+
+    if folded:
+        remove_unreachable_blocks(func)
+    return folded
@@ -0,0 +1,83 @@
+import json
+
+from toy_compiler.toy_ir.non_ssa_ir import Function, Assign, BinaryOp, Phi, Branch, Jump, Return
+
+
+def inst_to_list(inst) -> list:
+    if isinstance(inst, Assign):
+        return ["assign", inst.lhs, inst.rhs]
+    if isinstance(inst, BinaryOp):
+        return ["binop", inst.op, inst.dst, inst.src1, inst.src2]
+    if isinstance(inst, Phi):
+        return ["phi", inst.dst, [[bb.name, v] for bb, v in inst.incomings.items()]]
+    if isinstance(inst, Branch):
+        return ["br", inst.cond, inst.true_bb.name, inst.false_bb.name]
+    if isinstance(inst, Jump):
+        return ["jump", inst.target.name]
+    if isinstance(inst, Return):
+        return ["ret", inst.ret]
+    raise NotImplementedError(f"cannot serialize {inst}")
+
+
+def inst_from_list(data: list, blocks: dict):
+    kind = data[0]
+    if kind == "assign":
+        return Assign(data[1], data[2])
+    if kind == "binop":
+        return BinaryOp(data[1], data[2], data[3], data[4])
+    if kind == "phi":
+        return Phi(data[1], {blocks[name]: v for name, v in data[2]})
+    if kind == "br":
+        return Branch(data[1], blocks[data[2]], blocks[data[3]])
+    if kind == "jump":
+        return Jump(blocks[data[1]])
+    if kind == "ret":
+        return Return(data[1])
+    raise ValueError(f"Unknown instruction kind {kind!r}")
+
+
+def function_to_dict(func: Function) -> dict:
+    """
+    {"name": ..., "entry": ..., "blocks": [{"name": ..., "insts": [...], "term": [...]}]}
+    block 之间用名字引用
+    """
+    return {
+        "name": func.name,
+        "entry": func.entry.name if func.entry else None,
+        "blocks": [
+            {
+                "name": bb.name,
+                "insts": [inst_to_list(inst) for inst in bb.insts],
+                "term": inst_to_list(bb.terminator) if bb.terminator else None,
+            }
+            for bb in func.blocks
+        ],
+    }
+
+
+def function_from_dict(data: dict) -> Function:
+    func = Function(data["name"])
+    blocks = {}
+    for b in data["blocks"]:
+        if b["name"] in blocks:
+            raise ValueError(f"Duplicate block {b['name']} in {func.name}")
+        blocks[b["name"]] = func.new_block(b["name"])
+    if data.get("entry") is not None:
+        func.entry = blocks[data["entry"]]
+
+    for b in data["blocks"]:
+        bb = blocks[b["name"]]
+        bb.insts = [inst_from_list(inst, blocks) for inst in b["insts"]]
+        if b["term"] is not None:
+            bb.terminator = inst_from_list(b["term"], blocks)
+
+    func.build_cfg()
+    return func
+
+
+def dumps(func: Function) -> str:
+    return json.dumps(function_to_dict(func), separators=(",", ":"))
+
+
+def loads(s: str) -> Function:
+    return function_from_dict(json.loads(s))
@@ -0,0 +1,134 @@
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock, clone_inst
+
+
+def same(x):
+    return x
+
+
+def clone_function(func: Function, name: str | None = None) -> Function:
+    """
+    结构化地复制一份 Function，比 deepcopy 快得多：
+    先建好所有新 block，再一遍扫过去复制指令，terminator 和 phi 里的 block 引用
+    以及 succs / preds 都换成新 block；变量名和常量是不可变的，直接共享
+    """
+    bmap = {bb: BasicBlock(bb.name, None, [], id=bb.id) for bb in func.blocks}
+    block = bmap.__getitem__
+
+    for bb, new in bmap.items():
+        new.insts = [clone_inst(inst, same, block) for inst in bb.insts]
+        if bb.terminator is not None:
+            new.terminator = clone_inst(bb.terminator, same, block)
+        new.succs = bb.succs.copy(block)
+        new.preds = bb.preds.copy(block)
+
+    return Function(name or func.name, list(bmap.values()), bmap.get(func.entry))
+
+
+class Snapshot:
+    """
+    copy-on-write 的 snapshot：只记下 block 列表，
+    block 第一次被 func.touch 时才复制它的指令、terminator 和边，
+    rollback 把这些 block 原样换回去，一个 pass 只改了几个 block 时开销也只有这几个 block
+
+    要求 snapshot 期间所有原地修改 block 的地方都先调用 func.touch(bb)，
+    Function 上的边操作和仓库里的 pass 都已经这么做了
+    """
+
+    def __init__(self, func: Function):
+        if func.journal is not None:
+            raise ValueError(f"{func.name} already has an active snapshot")
+        self.func = func
+        self.blocks = list(func.blocks)
+        self.entry = func.entry
+        self.members = set(self.blocks)
+        self.saved = {}  # bb -> (insts, terminator, succs, preds)
+        func.journal = self
+
+    def save(self, bb: BasicBlock):
+        # snapshot 之后新建的 block rollback 时整个丢掉，不用存
+        if bb in self.saved or bb not in self.members:
+            return
+        term = bb.terminator
+        self.saved[bb] = (
+            [clone_inst(inst, same, same) for inst in bb.insts],
+            clone_inst(term, same, same) if term is not None else None,
+            bb.succs.copy(),
+            bb.preds.copy(),
+        )
+
+    @property
+    def touched(self) -> int:
+        return len(self.saved)
+
+    def modified(self) -> list[BasicBlock]:
+        """
+        被 touch 过、还在函数里的 block，加上 snapshot 之后新建的 block，
+        entry 换了的话新的 entry 也算，可以交给 verifier 做增量校验
+        """
+        entry = self.func.entry if self.func.entry is not self.entry else None
+        return [bb for bb in self.func.blocks if bb in self.saved or bb not in self.members or bb is entry]
+
+    def removed_defs(self) -> set[str]:
+        """
+        snapshot 之后从函数里消失的定义：改过的 block 里原来有、现在没有的，
+        加上整个被删掉的 block 里的；交给 collect_errors 的 removed 参数
+        """
+        func = self.func
+
+        def alive(bb):
+            return 0 <= bb.id < len(func.blocks) and func.blocks[bb.id] is bb
+
+        old = set()
+        for bb, (insts, _, _, _) in self.saved.items():
+            old.update(v for inst in insts for v in inst.defs())
+        for bb in self.blocks:
+            if bb not in self.saved and not alive(bb):
+                old.update(v for inst in bb.insts for v in inst.defs())
+        new = {v for bb in self.modified() for inst in bb.insts for v in inst.defs()}
+        return old - new
+
+    def rollback(self):
+        """
+        还原到 snapshot 时的状态，snapshot 随之结束
+        """
+        for bb, (insts, term, succs, preds) in self.saved.items():
+            bb.insts = insts
+            bb.terminator = term
+            bb.succs = succs
+            bb.preds = preds
+        self.func.set_blocks(self.blocks)
+        self.func.entry = self.entry
+        self.close()
+
+    def commit(self):
+        """
+        保留改动，丢掉存下来的副本
+        """
+        self.close()
+
+    def close(self):
+        self.saved = {}
+        if self.func.journal is self:
+            self.func.journal = None
+
+
+def speculate(func: Function, transform, keep) -> bool:
+    """
+    在 snapshot 下跑 transform(func)，keep(func) 为真就保留，否则回滚
+    transform 抛异常时也回滚。返回是否保留
+
+        base = count_insts(func)
+        speculate(func, aggressive, lambda f: count_insts(f) < base)
+    """
+    snap = Snapshot(func)
+    try:
+        transform(func)
+        accepted = bool(keep(func))
+    except BaseException:
+        snap.rollback()
+        raise
+    if accepted:
+        snap.commit()
+    else:
+        snap.rollback()
+    return accepted
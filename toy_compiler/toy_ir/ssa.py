@@ -1,6 +1,23 @@
+import sys
 from collections import defaultdict
-from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock, Phi, Jump, Branch
-from collections import defaultdict
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock, Phi, fresh_name
+from toy_compiler.toy_ir.dataflow import BitVectorAnalysis, reverse_postorder_ids, solve
+
+
+def block_preds(func: Function):
+    """
+    按 block id 索引的前驱表: preds[b.id] = [p.id, ...]
+    """
+    return [[p.id for p in bb.preds] for bb in func.blocks]
+
+
+def bits_to_blocks(bits: int, blocks):
+    out = set()
+    while bits:
+        low = bits & -bits
+        out.add(blocks[low.bit_length() - 1])
+        bits ^= low
+    return out
 
 
 def compute_dominator_sets(func: Function):
@@ -8,38 +25,38 @@ def compute_dominator_sets(func: Function):
     返回:
         dom: dict[BasicBlock, set[BasicBlock]]
     """
-    blocks = func.blocks
-    entry = func.entry
+    dom = dominator_bitsets(len(func.blocks), func.entry.id, block_preds(func))
+    return {bb: bits_to_blocks(dom[bb.id], func.blocks) for bb in func.blocks}
 
-    # 初始化
-    dom = {}
-    for b in blocks:
-        if b is entry:
-            dom[b] = {b}
-        else:
-            dom[b] = set(blocks)
 
-    changed = True
-    while changed:
-        changed = False
-        for b in blocks:
-            if b is entry:
-                continue
+def dominator_bitsets(n: int, entry: int, preds):
+    """
+    在 0..n-1 编号的任意有向图上求 dominator 集合，post-dominator 也复用这里（反向图）
+    preds: 按节点编号索引的前驱表
+    返回 dom: list[int]，dom[b] 的第 d 位为 1 表示 d 支配 b
+    """
+    succs = [[] for _ in range(n)]
+    for b, ps in enumerate(preds):
+        for p in ps:
+            succs[p].append(b)
+
+    result = solve(dominator_analysis(n, entry), n, entry, succs, preds)
+    dom = result.outs
+    # 走不到的节点只有自己；求解器只算了可达的节点，其余的还是初值
+    reached = [False] * n
+    for b in result.order:
+        reached[b] = True
+    for b in range(n):
+        if not reached[b]:
+            dom[b] = 1 << b
+    return dom
 
-            if not b.preds:
-                new_dom = {b}
-            else:
-                # 交集所有前驱的 dom
-                new_dom = set(dom[b.preds[0]])
-                for p in b.preds[1:]:
-                    new_dom &= dom[p]
-                new_dom.add(b)
-
-            if new_dom != dom[b]:
-                dom[b] = new_dom
-                changed = True
 
-    return dom
+def dominator_analysis(n: int, entry: int):
+    """
+    前向 must 问题：dom(b) = {b} ∪ ∩ dom(p)
+    """
+    return BitVectorAnalysis([1 << b for b in range(n)], [0] * n, n, may=False)
 
 
 def print_dominators(dom):
@@ -55,37 +72,97 @@ def compute_idom(func: Function, dom: dict):
     返回:
         idom: dict[BasicBlock, BasicBlock | None]
     """
-    idom = {}
-    entry = func.entry
+    bitsets = []
+    for bb in func.blocks:
+        bits = 0
+        for d in dom[bb]:
+            bits |= 1 << d.id
+        bitsets.append(bits)
+
+    idom = idom_from_bitsets(len(func.blocks), func.entry.id, bitsets)
+    return {bb: func.blocks[idom[bb.id]] if idom[bb.id] >= 0 else None for bb in func.blocks}
 
-    idom[entry] = None
 
-    for b in func.blocks:
-        if b is entry:
+def idom_from_bitsets(n: int, entry: int, dom):
+    """
+    idom(b) 是 b 的严格支配者里最“深”的那个，也就是 dom 集合最大的那个
+    返回 idom: list[int]，entry 为 -1
+    """
+    idom = [-1] * n
+
+    for b in range(n):
+        if b == entry:
             continue
 
-        candidates = dom[b] - {b}
-        assert candidates, f"Block {b.name} has no dominators?"
+        candidates = dom[b] & ~(1 << b)
+        assert candidates, f"Block #{b} has no dominators?"
 
-        # 找那个“不被其他候选支配”的
-        for d in candidates:
-            is_idom = True
-            for other in candidates:
-                if other is d:
-                    continue
-                # 如果 other 支配 d，那么 d 不是最近的
-                if d in dom[other]:
-                    is_idom = False
-                    break
-            if is_idom:
-                idom[b] = d
-                break
+        best = -1
+        best_size = -1
+        while candidates:
+            low = candidates & -candidates
+            d = low.bit_length() - 1
+            size = dom[d].bit_count()
+            if size > best_size:
+                best, best_size = d, size
+            candidates ^= low
+        idom[b] = best
 
-        assert b in idom, f"idom not found for {b.name}"
+    return idom
+
+
+def immediate_dominators_ids(n: int, entry: int, preds):
+    """
+    Cooper-Harvey-Kennedy：按 RPO 迭代，不需要 dominator 集合
+    返回 idom: list[int]，entry 和不可达节点为 -1
+    """
+    succs = [[] for _ in range(n)]
+    for b, ps in enumerate(preds):
+        for p in ps:
+            succs[p].append(b)
+
+    rpo = reverse_postorder_ids(n, entry, succs)
+    order = [-1] * n
+    for i, b in enumerate(rpo):
+        order[b] = i
+
+    idom = [-1] * n
+    idom[entry] = entry
+
+    changed = True
+    while changed:
+        changed = False
+        for b in rpo[1:]:
+            new_idom = -1
+            for p in preds[b]:
+                if idom[p] == -1:
+                    continue
+                if new_idom == -1:
+                    new_idom = p
+                    continue
+                # 沿 idom 链往上走到公共祖先
+                f1, f2 = p, new_idom
+                while f1 != f2:
+                    while order[f1] > order[f2]:
+                        f1 = idom[f1]
+                    while order[f2] > order[f1]:
+                        f2 = idom[f2]
+                new_idom = f1
+            if idom[b] != new_idom:
+                idom[b] = new_idom
+                changed = True
 
+    idom[entry] = -1
     return idom
 
 
+def compute_idom_ids(func: Function):
+    """
+    直接算 idom，按 block id 索引，不经过 dominator 集合
+    """
+    return immediate_dominators_ids(len(func.blocks), func.entry.id, block_preds(func))
+
+
 def print_idom(idom):
     for b, d in idom.items():
         if d is None:
@@ -108,24 +185,34 @@ def build_dominator_tree(func: Function, idom: dict):
     return dom_tree
 
 
-def print_dom_tree(dom_tree, root, indent=0):
-    print(" " * indent + root.name)
-    for child in dom_tree.get(root, []):
-        print_dom_tree(dom_tree, child, indent + 1 + len(root.name))
+def print_dom_tree(dom_tree, root, indent=0, out=None):
+    # 用显式栈，很深的 dominator tree 也不会爆栈
+    lines = []
+    stack = [(root, indent)]
+    while stack:
+        bb, ind = stack.pop()
+        lines.append(" " * ind + bb.name + "\n")
+        for child in reversed(dom_tree.get(bb, [])):
+            stack.append((child, ind + 1 + len(bb.name)))
+    (out or sys.stdout).write("".join(lines))
 
 
 def build_dominance_frontier(func: Function, idom: dict):
+    blocks = func.blocks
+    idom_ids = [idom[bb].id if idom.get(bb) is not None else -1 for bb in blocks]
+    df = dominance_frontier_ids(len(blocks), block_preds(func), idom_ids)
+    return {bb: {blocks[i] for i in df[bb.id]} for bb in blocks}
+
+
+def dominance_frontier_ids(n: int, preds, idom):
     # Cytron 算法
-    df = {}
-    # init
-    for b in func.blocks:
-        df[b] = set()
+    df = [set() for _ in range(n)]
 
-    for b in func.blocks:
-        for p in b.preds:
+    for b in range(n):
+        for p in preds[b]:
             runner = p
 
-            while runner != idom[b]:
+            while runner != idom[b] and runner != -1:
                 df[runner].add(b)
                 runner = idom[runner]
     return df
@@ -160,6 +247,7 @@ def insert_phi(func: Function, df: dict):
                     # 在y的开头插入PHI
                     incomings = {pred: var for pred in y.preds}
                     phi = Phi(var, incomings)
+                    func.touch(y)
                     y.insts.insert(0, phi)
                     has_phi.add(y)
                     # phi 本身也是def
@@ -180,10 +268,14 @@ def rename_ssa(func: Function, dom_tree: dict):
         return name
 
     def cur_name(var):
+        # 没有任何定义的变量（比如函数入参）保持原名
+        if not stack[var]:
+            return var
         return stack[var][-1]
 
     def rename_block(bb: BasicBlock):
         pushed = []  # 记录block新定义了哪些变量，用于回溯
+        func.touch(bb)
         # 1. phi的defs
         for inst in bb.insts:
             if isinstance(inst, Phi):
@@ -212,6 +304,7 @@ def rename_ssa(func: Function, dom_tree: dict):
 
         # 3. 处理succs中phi的incomings
         for succ in bb.succs:
+            func.touch(succ)
             for inst in succ.insts:
                 if isinstance(inst, Phi):
                     orig = inst.incomings[bb]
@@ -227,57 +320,111 @@ def rename_ssa(func: Function, dom_tree: dict):
     rename_block(func.entry)
 
 
-def verify_function(func: Function):
-    """Verify IR correctness"""
-    errors = []
+def construct_ssa(func: Function):
+    """
+    非 SSA -> SSA：dominator -> dominance frontier -> 插 phi -> rename
+    要求 func.build_cfg() 已经调用过
+    """
+    blocks = func.blocks
+    preds = block_preds(func)
+    idom_ids = immediate_dominators_ids(len(blocks), func.entry.id, preds)
+    df_ids = dominance_frontier_ids(len(blocks), preds, idom_ids)
 
-    # 1️⃣ CFG 检查
-    for bb in func.blocks:
-        if bb.terminator is None:
-            errors.append(f"Block {bb.name} has no terminator")
+    idom = {bb: blocks[idom_ids[bb.id]] for bb in blocks if idom_ids[bb.id] >= 0}
+    dom_tree = build_dominator_tree(func, idom)
+    df = {bb: {blocks[i] for i in df_ids[bb.id]} for bb in blocks}
+    insert_phi(func, df)
+    rename_ssa(func, dom_tree)
 
-        for succ in bb.succs:
-            if bb not in succ.preds:
-                errors.append(f"CFG inconsistency: {bb.name} -> {succ.name} missing back-edge")
 
-    # 2️⃣ SSA 检查：每个 lhs 唯一
-    seen_vars = set()
-    for bb in func.blocks:
-        for inst in bb.insts:
-            for v in inst.defs():
-                if v in seen_vars:
-                    errors.append(f"Variable {v} redefined in {bb.name}")
-                else:
-                    seen_vars.add(v)
+def repair_ssa_uses(func: Function, versions: dict, skip=(), taken: set | None = None):
+    """
+    复制 block 之后，同一个变量在不同 block 结尾有了不同的版本，
+    versions: var -> {block: 这个 block 结尾的值（变量名或常量）}
+
+    把其余地方对这些变量的使用改成沿前驱找到的最近版本，在汇合点按需插 phi：
+      - phi 的 incoming 取对应前驱结尾的值
+      - 普通指令取所在 block 开头的值；定义了某个版本的 block 里的使用是局部的，不用改
+    skip 里的 block 只修 phi，普通指令已经是对的名字
+    taken: 已经用掉的变量名，插 phi 时用来取新名字
+    """
+    if not versions:
+        return
+    if taken is None:
+        taken = {v for bb in func.blocks for inst in bb.insts for v in inst.defs()}
+    skip = set(skip)
+    cache = {}  # (var, block) -> block 开头的值
+
+    def at_end(v, bb):
+        defs = versions[v]
+        if bb in defs:
+            return defs[bb]
+        return at_start(v, bb)
+
+    def at_start(v, bb):
+        # 显式栈：沿单前驱的链往上走，碰到定义或者汇合点为止
+        chain = []
+        seen = set()
+        while True:
+            key = (v, bb)
+            if key in cache:
+                value = cache[key]
+                break
+            preds = list(bb.preds.unique())
+            if len(preds) == 1 and bb in seen:
+                # 绕回来了：走不到的单前驱环，上面没有定义，保持原名
+                value = v
+                break
+            if len(preds) == 1:
+                seen.add(bb)
+                chain.append(key)
+                bb = preds[0]
+                if bb in versions[v]:
+                    value = versions[v][bb]
+                    break
+                continue
+            if not preds:
+                # 走到 entry 都没有定义：保持原名
+                value = cache[key] = v
+                break
+            # 汇合点：先登记 phi 再填 incoming，回边绕回来时直接用这个 phi
+            value = cache[key] = fresh_name(f"{v}_m", taken)
+            phi = Phi(value, {})
+            func.touch(bb)
+            bb.insts.insert(0, phi)
+            for p in preds:
+                phi.incomings[p] = at_end(v, p)
+            break
+        for key in chain:
+            cache[key] = value
+        return value
+
+    for bb in list(func.blocks):
+        insts = bb.insts + [bb.terminator] if bb.terminator is not None else list(bb.insts)
+        for inst in insts:
+            if type(inst) is Phi:
+                for p, v in list(inst.incomings.items()):
+                    if isinstance(v, str) and v in versions:
+                        value = at_end(v, p)
+                        func.touch(bb)
+                        inst.incomings[p] = value
+                continue
+            if bb in skip:
+                continue
+            for v in set(inst.uses()):
+                if v in versions and bb not in versions[v]:
+                    value = at_start(v, bb)
+                    func.touch(bb)
+                    inst.rename_use(v, value)
 
-    # 3️⃣ Phi correctness
-    for bb in func.blocks:
-        for inst in bb.insts:
-            if isinstance(inst, Phi):
-                for pred_bb in inst.incomings:
-                    if pred_bb not in bb.preds:
-                        errors.append(f"Phi {inst.dst} in {bb.name} has incoming from non-pred {pred_bb}")
 
-    # 4️⃣ Uses check
-    defined_vars = set()
-    for bb in func.blocks:
-        for inst in bb.insts:
-            for v in inst.uses():
-                if v not in defined_vars:
-                    errors.append(f"Use of undefined variable {v} in {bb.name}")
-            defined_vars.update(inst.defs())
+def verify_function(func: Function, verbose: bool = True):
+    """
+    完整校验（CFG + SSA 支配关系），失败抛 ValueError
+    实际的检查在 verifier.py 里；pass 之间要快而且不输出的话直接用 verifier.verify_ir
+    """
+    from toy_compiler.toy_ir.verifier import FULL, verify_ir
 
-    # 5️⃣ Terminator targets exist
-    for bb in func.blocks:
-        term = bb.terminator
-        if isinstance(term, Jump) and term.target not in func.blocks:
-            errors.append(f"Jump to non-existent block {term.target}")
-        if isinstance(term, Branch):
-            for target in [term.true_bb, term.false_bb]:
-                if target not in func.blocks:
-                    errors.append(f"Branch to non-existent block {target}")
-
-    if errors:
-        raise ValueError("IR Verification Failed:\n" + "\n".join(errors))
-    else:
+    verify_ir(func, FULL)
+    if verbose:
         print(f"Function {func.name} passed verification ✅")
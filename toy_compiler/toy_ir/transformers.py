@@ -1,4 +1,6 @@
 from toy_compiler.toy_ir.non_ssa_ir import Function, Assign, BinaryOp, Phi, Return, Branch, Jump, BasicBlock
+from toy_compiler.toy_ir.dataflow import SparseAnalysis, solve_function
+from toy_compiler.toy_ir.postdom import build_reverse_cfg, compute_ipdom_ids, control_dependence_ids
 
 
 def eval_binary(op, a, b):
@@ -10,57 +12,121 @@ def eval_binary(op, a, b):
         return a * b
     if op == "div":
         return a // b  # toy
+    if op == "shl":
+        return a << b
+    if op == "shr":
+        return a >> b  # 算术右移，和 div 2^k 的向下取整一致
     raise NotImplementedError(op)
 
 
-def constant_propagation(func: Function):
-    const_env = {}
-
-    for bb in func.blocks:
-        for inst in bb.insts:
-            # ---- Assign ----
-            if isinstance(inst, Assign):
-                rhs = inst.rhs
-                if isinstance(rhs, int):
-                    const_env[inst.lhs] = rhs
-                elif rhs in const_env:
-                    const_env[inst.lhs] = const_env[rhs]
-
-            # ---- BinaryOp ----
-            elif isinstance(inst, BinaryOp):
-                v1 = inst.src1
-                v2 = inst.src2
-
-                if isinstance(v1, int):
-                    c1 = v1
-                elif v1 in const_env:
-                    c1 = const_env[v1]
-                else:
-                    continue
-
-                if isinstance(v2, int):
-                    c2 = v2
-                elif v2 in const_env:
-                    c2 = const_env[v2]
-                else:
-                    continue
+class ConstantPropagation(SparseAnalysis):
+    """
+    SCCP，dataflow 里的稀疏问题：整个函数一张 var -> 格值的表
+      - TOP：还没算到
+      - None：不是常量
+      - int：常量
+    函数里没有定义的变量（入参）一律不是常量
+    branch 条件是常量时只有一条出边能走到，phi 只看走得通的入边传进来的值
+
+    要求是 SSA：每个变量只有一个定义，表里的值只会往下走（TOP -> 常量 -> None），
+    变量的值变了只需要重算用到它的 block，不用像每个 block 一份 env 那样整张表地复制
+    """
+
+    TOP = object()
+
+    def __init__(self, func: Function):
+        self.blocks = func.blocks
+        self.defined = set()
+        # 每个 block 读到的、不是它自己前面定义的变量
+        self.block_uses = []
+        for bb in func.blocks:
+            seen = set()
+            uses = []
+            insts = bb.insts + [bb.terminator] if bb.terminator is not None else bb.insts
+            for inst in insts:
+                for v in inst.uses():
+                    if v not in seen:
+                        seen.add(v)
+                        uses.append(v)
+                # phi 沿回边用到 b 自己后面的定义时，那个定义这时还不在 seen 里
+                defs = inst.defs()
+                self.defined.update(defs)
+                seen.update(defs)
+            self.block_uses.append(uses)
+
+    def top(self):
+        return self.TOP
+
+    def meet(self, a, b):
+        if a is self.TOP or a == b:
+            return b
+        if b is self.TOP:
+            return a
+        return None
+
+    def uses(self, b):
+        return self.block_uses[b]
+
+    def lookup(self, value, v):
+        if isinstance(v, int):
+            return v
+        if v in value:
+            return value[v]
+        return self.TOP if v in self.defined else None
+
+    def transfer(self, b, preds, value):
+        TOP = self.TOP
+        lookup = self.lookup
+        for inst in self.blocks[b].insts:
+            kind = type(inst)
+            if kind is Assign:
+                yield inst.lhs, lookup(value, inst.rhs)
+            elif kind is BinaryOp:
+                c1 = lookup(value, inst.src1)
+                c2 = lookup(value, inst.src2)
+                if c1 is None or c2 is None:
+                    # 有一个不是常量，结果就不是常量；否则是有操作数还没算到，先不管
+                    yield inst.dst, None
+                elif c1 is not TOP and c2 is not TOP:
+                    yield inst.dst, eval_binary(inst.op, c1, c2)
+            elif kind is Phi:
+                # 走不通的入边和还没算到的值都不算
+                c = TOP
+                for p, v in inst.incomings.items():
+                    if p.id not in preds:
+                        continue
+                    cv = lookup(value, v)
+                    if cv is TOP or cv == c:
+                        continue
+                    if c is not TOP or cv is None:
+                        c = None
+                        break
+                    c = cv
+                yield inst.dst, c
 
-                res = eval_binary(inst.op, c1, c2)
-                const_env[inst.dst] = res
+    def successors(self, b, value):
+        bb = self.blocks[b]
+        term = bb.terminator
+        if term is None:
+            return ()
+        if type(term) is not Branch or term.true_bb is term.false_bb:
+            return [s.id for s in bb.succs.unique()]
+        c = self.lookup(value, term.cond)
+        if c is self.TOP:
+            # 条件还没算出来，先当两条边都走不到
+            return ()
+        if c is None:
+            return (term.true_bb.id, term.false_bb.id)
+        return ((term.true_bb if c else term.false_bb).id,)
 
-            # ---- Phi ----
-            elif isinstance(inst, Phi):
-                incoming_vals = []
-                for v in inst.incomings.values():
-                    if v in const_env:
-                        incoming_vals.append(const_env[v])
-                    else:
-                        break
-                else:
-                    if len(set(incoming_vals)) == 1:
-                        const_env[inst.dst] = incoming_vals[0]
 
-    return const_env
+def constant_propagation(func: Function):
+    """
+    SCCP，返回常量变量的 var -> int
+    要求是 SSA
+    """
+    result = solve_function(func, ConstantPropagation(func))
+    return {v: c for v, c in result.values.items() if c is not None}
 
 
 def rewrite_value(v, const_env):
@@ -69,34 +135,58 @@ def rewrite_value(v, const_env):
     return v
 
 
-def rewrite_constants(func):
+def needs_rewrite(bb: BasicBlock, const_env) -> bool:
+    # 有 use 能换成常量，或者有两个操作数都是常量、可以折叠的 BinaryOp
+    insts = bb.insts + [bb.terminator] if bb.terminator is not None else bb.insts
+    for inst in insts:
+        if type(inst) is BinaryOp and isinstance(inst.src1, int) and isinstance(inst.src2, int):
+            return True
+        for v in inst.uses():
+            if v in const_env:
+                return True
+    return False
+
+
+def rewrite_constants(func) -> bool:
     const_env = constant_propagation(func)
-    constant_propagation
+    changed = False
     for bb in func.blocks:
+        if not needs_rewrite(bb, const_env):
+            continue
+        func.touch(bb)
+
         # rewrite instructions
         new_insts = []
 
         for inst in bb.insts:
             # ---- Assign ----
             if isinstance(inst, Assign):
-                inst.rhs = rewrite_value(inst.rhs, const_env)
+                rhs = rewrite_value(inst.rhs, const_env)
+                changed |= rhs is not inst.rhs
+                inst.rhs = rhs
                 new_insts.append(inst)
 
             # ---- BinaryOp ----
             elif isinstance(inst, BinaryOp):
-                inst.src1 = rewrite_value(inst.src1, const_env)
-                inst.src2 = rewrite_value(inst.src2, const_env)
+                src1 = rewrite_value(inst.src1, const_env)
+                src2 = rewrite_value(inst.src2, const_env)
+                changed |= src1 is not inst.src1 or src2 is not inst.src2
+                inst.src1 = src1
+                inst.src2 = src2
 
                 # constant folding
                 if isinstance(inst.src1, int) and isinstance(inst.src2, int):
                     val = eval_binary(inst.op, inst.src1, inst.src2)
                     new_insts.append(Assign(inst.dst, val))
+                    changed = True
                 else:
                     new_insts.append(inst)
 
             # ---- Phi ----
             elif isinstance(inst, Phi):
-                inst.incomings = {pred: rewrite_value(v, const_env) for pred, v in inst.incomings.items()}
+                incomings = {pred: rewrite_value(v, const_env) for pred, v in inst.incomings.items()}
+                changed |= incomings != inst.incomings
+                inst.incomings = incomings
                 new_insts.append(inst)
 
             else:
@@ -107,9 +197,15 @@ def rewrite_constants(func):
         # ---- rewrite terminator ----
         term = bb.terminator
         if isinstance(term, Return):
-            term.ret = rewrite_value(term.ret, const_env)
+            ret = rewrite_value(term.ret, const_env)
+            changed |= ret is not term.ret
+            term.ret = ret
         elif isinstance(term, Branch):
-            term.cond = rewrite_value(term.cond, const_env)
+            cond = rewrite_value(term.cond, const_env)
+            changed |= cond is not term.cond
+            term.cond = cond
+
+    return changed
 
 
 def build_def_map(func):
@@ -121,7 +217,10 @@ def build_def_map(func):
     return def_map
 
 
-def dce(func):
+def dce(func, aggressive: bool = False) -> bool:
+    if aggressive:
+        return aggressive_dce(func)
+
     def_map = build_def_map(func)
 
     from collections import deque
@@ -147,8 +246,103 @@ def dce(func):
                     worklist.append(def_inst)
 
     # sweep
+    changed = False
     for bb in func.blocks:
-        bb.insts = [inst for inst in bb.insts if inst in live_insts]
+        new_insts = [inst for inst in bb.insts if inst in live_insts]
+        if len(new_insts) != len(bb.insts):
+            func.touch(bb)
+            bb.insts = new_insts
+            changed = True
+
+    return changed
+
+
+def aggressive_dce(func: Function) -> bool:
+    """
+    基于控制依赖的 DCE（ADCE）
+    和 dce 不同，branch 默认是死的，只有活的代码控制依赖它时才是活的。
+    死掉的 branch 直接跳到最近的活的 post-dominator，中间的 block 变成不可达后删掉，
+    所以没有副作用的空循环也能被删掉。
+    """
+    rcfg = build_reverse_cfg(func)
+    ipdom = compute_ipdom_ids(rcfg)
+    cdeps = control_dependence_ids(rcfg, ipdom)
+    blocks = func.blocks
+    exit_id = rcfg.exit.id
+
+    def_map = {}
+    inst_block = {}
+    for bb in func.blocks:
+        for inst in bb.insts:
+            inst_block[inst] = bb
+            for v in inst.defs():
+                def_map[v] = inst
+        inst_block[bb.terminator] = bb
+
+    worklist = []
+    live_insts = set()
+    live_blocks = [False] * len(blocks)
+
+    def mark_block(bb):
+        if live_blocks[bb.id]:
+            return
+        live_blocks[bb.id] = True
+        # bb 会不会执行取决于这些 branch
+        for c in cdeps[bb.id]:
+            mark(blocks[c].terminator)
+
+    def mark(inst):
+        if inst in live_insts:
+            return
+        live_insts.add(inst)
+        worklist.append(inst)
+        mark_block(inst_block[inst])
+
+    # roots: return，以及死循环（保守起见不删）
+    for bb in func.blocks:
+        if isinstance(bb.terminator, Return):
+            mark(bb.terminator)
+    for bb in rcfg.fake_exits:
+        mark(bb.terminator)
+
+    # propagate
+    while worklist:
+        inst = worklist.pop()
+        for v in inst.uses():
+            if v in def_map:
+                mark(def_map[v])
+        if isinstance(inst, Phi):
+            # phi 的值取决于从哪条边进来
+            for pred in inst.incomings:
+                mark_block(pred)
+
+    changed = False
+
+    # 死 branch 改成跳到最近的活的 post-dominator
+    for bb in func.blocks:
+        term = bb.terminator
+        if not isinstance(term, Branch) or term in live_insts:
+            continue
+        target = ipdom[bb.id]
+        while target != exit_id and not live_blocks[target]:
+            target = ipdom[target]
+        if target == exit_id:
+            continue
+        func.replace_terminator(bb, Jump(blocks[target]))
+        changed = True
+
+    # sweep
+    for bb in func.blocks:
+        new_insts = [inst for inst in bb.insts if inst in live_insts]
+        if len(new_insts) != len(bb.insts):
+            func.touch(bb)
+            bb.insts = new_insts
+            changed = True
+
+    if changed:
+        remove_unreachable_blocks(func)
+
+    return changed
 
 
 def fold_constant_branches(func: Function) -> bool:
@@ -159,47 +353,45 @@ def fold_constant_branches(func: Function) -> bool:
         if isinstance(term, Branch) and isinstance(term.cond, int):
             target = term.true_bb if term.cond else term.false_bb
 
-            # 替换 terminator
-            bb.terminator = Jump(target)
-
-            # 修 CFG
-            for succ in bb.succs:
-                succ.preds.remove(bb)
-            bb.succs = [target]
-            target.preds.append(bb)
+            # 替换 terminator，CFG 和 phi 一起修
+            func.replace_terminator(bb, Jump(target))
 
             changed = True
 
     return changed
 
 
-def remove_unreachable_blocks(func: Function) -> bool:
-    reachable = set()
+def compute_reachable(func: Function):
+    """
+    返回按 block id 索引的 list[bool]
+    """
+    reachable = [False] * len(func.blocks)
     worklist = [func.entry]
 
     while worklist:
         bb = worklist.pop()
-        if bb in reachable:
+        if reachable[bb.id]:
             continue
-        reachable.add(bb)
+        reachable[bb.id] = True
         worklist.extend(bb.succs)
 
-    removed = False
-    new_blocks = []
+    return reachable
+
 
+def remove_unreachable_blocks(func: Function) -> bool:
+    reachable = compute_reachable(func)
+
+    dead = set()
     for bb in func.blocks:
-        if bb in reachable:
-            new_blocks.append(bb)
-        else:
-            # 从 preds / succs 里清掉
-            for p in bb.preds:
-                p.succs.remove(bb)
-            for s in bb.succs:
-                s.preds.remove(bb)
-            removed = True
+        if not reachable[bb.id]:
+            # 断掉出边；入边只可能来自同样不可达的 block，它们的出边也会被断掉
+            for s in list(bb.succs):
+                func.remove_edge(bb, s)
+            dead.add(bb)
 
-    func.blocks = new_blocks
-    return removed
+    if dead:
+        func.remove_blocks(dead)
+    return bool(dead)
 
 
 def has_phi(bb: BasicBlock) -> bool:
@@ -225,36 +417,37 @@ def merge_trivial_blocks(func: Function) -> bool:
         if not can_merge(A, B):
             continue
 
-        # 1. 删除 A 的 terminator
-        A.terminator = None
-
-        # 2. 拼接 B 的指令
-        for inst in B.insts:
-            A.insts.append(inst)
-        A.terminator = B.terminator
+        # 把 B 的指令、terminator 和出边都接到 A 上，succ 里 phi 的 incoming 也从 B 改成 A
+        func.merge_blocks(A, B)
 
-        # 3. 修 CFG
-        A.succs = B.succs
-        for succ in B.succs:
-            succ.preds.remove(B)
-            succ.preds.append(A)
-
-        # 4. 删除 B
-        func.blocks.remove(B)
+        # 删除 B
+        func.remove_blocks({B})
 
         return True  # 一次只合并一个，回到外层循环
 
     return False
 
 
+def phi_needs_cleanup(bb: BasicBlock, phi: Phi) -> bool:
+    values = [v for p, v in phi.incomings.items() if p in bb.preds]
+    return len(values) != len(phi.incomings) or len(set(values)) == 1
+
+
 def cleanup_phi_nodes(func: Function) -> bool:
     changed = False
 
     for bb in func.blocks:
+        if not any(phi_needs_cleanup(bb, phi) for phi in bb.phis()):
+            continue
+        func.touch(bb)
+
+        # phi 化简成的赋值放到剩下的 phi 后面，保证 phi 都在 block 开头
         new_insts = []
+        copies = []
+        rest = []
         for inst in bb.insts:
             if not isinstance(inst, Phi):
-                new_insts.append(inst)
+                rest.append(inst)
                 continue
 
             # 1. 删除来自不存在 predecessor 的 incoming
@@ -263,25 +456,26 @@ def cleanup_phi_nodes(func: Function) -> bool:
             # 2. 只有一个 incoming
             values = list(inst.incomings.values())
             if len(values) == 1:
-                new_insts.append(Assign(inst.dst, values[0]))
+                copies.append(Assign(inst.dst, values[0]))
                 changed = True
                 continue
 
             # 3. 所有 incoming 值相同
             if len(set(values)) == 1:
-                new_insts.append(Assign(inst.dst, values[0]))
+                copies.append(Assign(inst.dst, values[0]))
                 changed = True
                 continue
 
             new_insts.append(inst)
 
-        bb.insts = new_insts
+        bb.insts = new_insts + copies + rest
 
     return changed
 
 
-def simplify_cfg(func: Function):
+def simplify_cfg(func: Function) -> bool:
 
+    any_changed = False
     changed = True
 
     while changed:
@@ -292,3 +486,7 @@ def simplify_cfg(func: Function):
         changed |= remove_unreachable_blocks(func)
         changed |= merge_trivial_blocks(func)
         changed |= cleanup_phi_nodes(func)
+
+        any_changed |= changed
+
+    return any_changed
@@ -0,0 +1,209 @@
+from toy_compiler.toy_ir.non_ssa_ir import Function, BasicBlock, Phi, Terminator
+from toy_compiler.toy_ir.ssa import compute_idom_ids
+
+# 只查 CFG 和指令的形状，线性时间，适合每个 pass 之后都跑
+STRUCTURAL = "structural"
+# 再加上 SSA：定义唯一、定义支配使用、phi 和 preds 对齐
+FULL = "full"
+
+
+def in_function(func: Function, bb: BasicBlock) -> bool:
+    # block id 就是下标，不用在 func.blocks 里线性查找
+    return 0 <= bb.id < len(func.blocks) and func.blocks[bb.id] is bb
+
+
+def check_structure(func: Function, bb: BasicBlock, errors: list[str]):
+    term = bb.terminator
+    if term is None:
+        errors.append(f"Block {bb.name} has no terminator")
+    else:
+        expected = {}
+        for succ in term.successors():
+            if not in_function(func, succ):
+                errors.append(f"{bb.name} jumps to non-existent block {succ.name}")
+            expected[succ] = expected.get(succ, 0) + 1
+        if expected != bb.succs.counts:
+            errors.append(f"Block {bb.name} succs {[s.name for s in bb.succs]} do not match its terminator")
+
+    for succ, n in bb.succs.counts.items():
+        if succ.preds.count(bb) != n:
+            errors.append(f"CFG inconsistency: {bb.name} -> {succ.name} missing back-edge")
+    for pred, n in bb.preds.counts.items():
+        if not in_function(func, pred):
+            errors.append(f"Block {bb.name} has non-existent pred {pred.name}")
+        elif pred.succs.count(bb) != n:
+            errors.append(f"CFG inconsistency: {pred.name} -> {bb.name} missing forward edge")
+
+    body = False
+    for inst in bb.insts:
+        if isinstance(inst, Terminator):
+            errors.append(f"Terminator {inst} in the middle of {bb.name}")
+        elif isinstance(inst, Phi):
+            if body:
+                errors.append(f"Phi {inst.dst} in {bb.name} is not at the start of the block")
+            for pred in inst.incomings:
+                if pred not in bb.preds:
+                    errors.append(f"Phi {inst.dst} in {bb.name} has incoming from non-pred {pred.name}")
+        else:
+            body = True
+
+
+def dominator_intervals(func: Function):
+    """
+    dominator tree 上 DFS 的进出编号，a 支配 b 当且仅当 pre[a] <= pre[b] 且 post[b] <= post[a]
+    走不到的 block 两个编号都是 -1
+    """
+    n = len(func.blocks)
+    idom = compute_idom_ids(func)
+    children = [[] for _ in range(n)]
+    for b, d in enumerate(idom):
+        if d >= 0:
+            children[d].append(b)
+
+    pre = [-1] * n
+    post = [-1] * n
+    counter = 0
+    stack = [(func.entry.id, iter(children[func.entry.id]))]
+    pre[func.entry.id] = counter
+    while stack:
+        b, it = stack[-1]
+        for c in it:
+            counter += 1
+            pre[c] = counter
+            stack.append((c, iter(children[c])))
+            break
+        else:
+            stack.pop()
+            counter += 1
+            post[b] = counter
+    return pre, post
+
+
+def check_ssa(func: Function, blocks, errors: list[str], removed=()):
+    """
+    blocks 里每条指令的使用都要被定义支配：
+      - 同一个 block 里定义要在使用前面
+      - 不同 block 的话定义所在的 block 要支配使用所在的 block
+      - phi 的 incoming 算作在对应前驱的结尾使用
+    没有定义的变量是函数入参，不检查；
+    removed 里的变量原来有定义，现在没了的话，整个函数里对它的使用都算错
+    """
+    def_site = {}  # var -> (block id, 下标)
+    for bb in func.blocks:
+        for i, inst in enumerate(bb.insts):
+            for v in inst.defs():
+                if v in def_site:
+                    errors.append(f"Variable {v} redefined in {bb.name}")
+                else:
+                    def_site[v] = (bb.id, i)
+
+    dropped = {v for v in removed if v not in def_site}
+    if dropped:
+        for bb in func.blocks:
+            insts = bb.insts + [bb.terminator] if bb.terminator is not None else bb.insts
+            for inst in insts:
+                for v in inst.uses():
+                    if v in dropped:
+                        errors.append(f"Use of {v} in {bb.name} after its definition was removed")
+
+    pre, post = dominator_intervals(func)
+
+    def dominates(a, b):
+        return pre[a] <= pre[b] and post[b] <= post[a]
+
+    for bb in blocks:
+        b = bb.id
+        if pre[b] < 0:
+            # 走不到的 block 没有支配关系可言
+            continue
+        preds = list(bb.preds.unique())
+        insts = bb.insts + [bb.terminator] if bb.terminator is not None else bb.insts
+        for i, inst in enumerate(insts):
+            if isinstance(inst, Phi):
+                if list(inst.incomings) != preds:
+                    errors.append(f"Phi {inst.dst} in {bb.name} is not aligned with preds {[p.name for p in preds]}")
+                for p, v in inst.incomings.items():
+                    site = def_site.get(v) if isinstance(v, str) else None
+                    if site is not None and pre[p.id] >= 0 and not dominates(site[0], p.id):
+                        errors.append(
+                            f"Phi {inst.dst} in {bb.name} uses {v} from {p.name}, "
+                            f"not dominated by its definition in {func.blocks[site[0]].name}"
+                        )
+                continue
+
+            for v in inst.uses():
+                site = def_site.get(v)
+                if site is None:
+                    continue
+                d, j = site
+                if d == b:
+                    if j >= i:
+                        errors.append(f"Use of {v} before its definition in {bb.name}")
+                elif not dominates(d, b):
+                    errors.append(
+                        f"Use of {v} in {bb.name} is not dominated by its definition in {func.blocks[d].name}"
+                    )
+
+
+def reachable_from(func: Function, blocks) -> list[BasicBlock]:
+    """
+    从 blocks 出发沿 succs 走得到的 block（包括 blocks 自己），按 func.blocks 的顺序
+    """
+    seen = [False] * len(func.blocks)
+    stack = list(blocks)
+    for bb in stack:
+        seen[bb.id] = True
+    while stack:
+        for succ in stack.pop().succs.unique():
+            if not seen[succ.id]:
+                seen[succ.id] = True
+                stack.append(succ)
+    return [bb for bb in func.blocks if seen[bb.id]]
+
+
+def collect_errors(func: Function, level: str = STRUCTURAL, blocks=None, removed=()) -> list[str]:
+    """
+    返回错误列表，不输出任何东西
+      level: STRUCTURAL 或 FULL
+      blocks: 只检查这些 block（比如 Snapshot.modified() 给出的、pass 改过的 block）；
+        None 表示全部。FULL 的定义表和 dominator tree 还是按整个函数算，所以增量的 FULL 省不了多少。
+        只查 blocks 本身对 FULL 是不够的：pass 加了一条边，没改过的 block 的支配关系也可能变，
+        原来合法的使用就不再被定义支配了。删边、删 block 只会让支配关系变多，
+        加的边一定从改过的 block 出发，所以 FULL 会把从 blocks 出发走得到的 block 都查一遍
+      removed: 被删掉的定义（Snapshot.removed_defs()），只对 FULL 有用。
+        没有定义的名字会被当成入参，不给的话 pass 删掉了某个定义、
+        没改过的 block 却还在用它，增量校验是发现不了的
+    """
+    errors = []
+    if func.entry is None or not in_function(func, func.entry):
+        return [f"Function {func.name} has no valid entry block"]
+
+    if blocks is None:
+        selected = func.blocks
+    else:
+        # 已经被删掉的 block 不用查
+        selected = [bb for bb in blocks if in_function(func, bb)]
+
+    for i, bb in enumerate(func.blocks):
+        if bb.id != i:
+            errors.append(f"Block {bb.name} has id {bb.id} but is at index {i}")
+            return errors
+
+    for bb in selected:
+        check_structure(func, bb, errors)
+    if level == FULL and not errors:
+        if blocks is not None:
+            selected = reachable_from(func, selected)
+        check_ssa(func, selected, errors, removed)
+    elif level not in (STRUCTURAL, FULL):
+        raise ValueError(f"unknown verify level {level}")
+    return errors
+
+
+def verify_ir(func: Function, level: str = STRUCTURAL, blocks=None, removed=()):
+    """
+    和 collect_errors 一样，有错误时抛 ValueError
+    """
+    errors = collect_errors(func, level, blocks, removed)
+    if errors:
+        raise ValueError("IR Verification Failed:\n" + "\n".join(errors))